@@ -0,0 +1 @@
+# Shared SQL execution helpers used by the Streamlit pages.
@@ -0,0 +1,232 @@
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import time
+import pyarrow as pa
+import pyarrow.parquet as pq
+from mimic_sql.data_store import ARROW_EXTENSION, CODE_SET_SUFFIX, discover_tables
+from mimic_sql.engine import SQLEngine
+from mimic_sql.examples import EXAMPLE_PIPELINES
+from mimic_sql.pipeline import pipeline_tables, step_tables
+from mimic_sql.sql_parse import apply_alias_map
+from mimic_sql.steps import run_step
+from mimic_sql.streaming import stream_steps, streaming_problem
+
+# Output file formats and their file extensions
+OUTPUT_FORMATS = {"parquet": ".parquet", "arrow": ARROW_EXTENSION}
+
+# Code sets that define a cohort, in the order --cohort takes them
+COHORT_ROLES = ["exposure", "exclusion", "outcome"]
+
+# --- Batch Runs ---
+
+# A session engine on a pipeline's base tables, with the map from file table names to engine names
+def open_engine(pipeline, data_dir=None):
+    spec = EXAMPLE_PIPELINES[pipeline]
+    table_files = discover_tables(data_dir or spec["data_dir"])
+    if not table_files:
+        raise FileNotFoundError(f"no .pkl or {ARROW_EXTENSION} tables found in {data_dir or spec['data_dir']}")
+    store = spec["build_store"](list(table_files.items()))
+    if store.errors:
+        raise RuntimeError("; ".join(store.errors))
+    alias_map = {table_name: spec["alias"](table_name) for table_name in table_files}
+    return SQLEngine(base=store), alias_map
+
+# The (label, SQL) steps to run: the pipeline's default steps, or a whole SQL script as one step
+def batch_steps(pipeline, script=None):
+    if script is not None:
+        return [("SQL script", script)]
+    spec = EXAMPLE_PIPELINES[pipeline]
+    return [(spec["names"][i], spec["queries"][i]) for i in spec["steps"]]
+
+# Log a finished step: its timing summary (the last message) and any warnings
+def log_step(label, messages, log=print):
+    log(f"{label}: {messages[-1]}")
+    for message in messages[:-1]:
+        if message.startswith(("Warning", "🌊")):
+            log(f"  {message}")
+
+# Run the steps by streaming the pipeline's large table (prescriptions for drug) a chunk at a time
+def stream_batch_steps(pipeline, engine, steps, alias_map, chunk_rows=None, log=print):
+    stream_table = EXAMPLE_PIPELINES[pipeline]["stream_table"]
+    if stream_table is None:
+        raise ValueError(f"the {pipeline} pipeline has no table to stream")
+    source = engine.base.arrow_sources.get(stream_table)
+    if source is None:
+        raise ValueError(f"streaming needs {stream_table} as an {ARROW_EXTENSION} file (see python -m mimic_sql.ingest)")
+    step_sql = {k: apply_alias_map(sql_query, alias_map) for k, (_, sql_query) in enumerate(steps)}
+    problem = streaming_problem(step_sql, stream_table)
+    if problem is not None:
+        raise ValueError(f"the steps cannot be streamed: {problem}")
+    outputs = stream_steps(step_sql, stream_table, source, engine, chunk_rows)
+    for k, (label, _) in enumerate(steps):
+        log_step(label, outputs[k][0], log)
+
+# --- Cohort Runs ---
+
+# A cohort's code sets from "psychosis,all_psychiatric_disorders,ischemic_stroke" (exposure, exclusion,
+# outcome); the _icd_codes suffix may be left out
+def parse_cohort(text):
+    names = [name.strip() for name in text.split(",")]
+    if len(names) != len(COHORT_ROLES) or not all(names):
+        raise ValueError(f"a cohort is {len(COHORT_ROLES)} comma-separated code sets ({', '.join(COHORT_ROLES)}), not {text!r}")
+    names = [name if name.lower().endswith(CODE_SET_SUFFIX) else name + CODE_SET_SUFFIX for name in names]
+    return dict(zip(COHORT_ROLES, names))
+
+# Name of the directory a cohort's tables are written to, e.g. psychosis__ischemic_stroke
+def cohort_name(cohort):
+    return "__".join(cohort[role][:-len(CODE_SET_SUFFIX)] for role in ("exposure", "outcome"))
+
+# A step's SQL with the pipeline's default code sets replaced by the cohort's
+def cohort_sql(sql_query, defaults, cohort):
+    replacements = {defaults[role].lower(): cohort[role] for role in COHORT_ROLES}
+    pattern = re.compile(r"\b(" + "|".join(map(re.escape, replacements)) + r")\b", re.IGNORECASE)
+    return pattern.sub(lambda match: replacements[match.group(1).lower()], sql_query)
+
+# Split the (label, SQL) steps into those that are the same for every cohort, run once, and those
+# run per cohort: steps that read a swapped code set or touch a table a per-cohort step writes. A step
+# writing a table an earlier per-cohort step reads also runs per cohort, so running the shared steps
+# first never changes what a per-cohort step sees.
+def split_cohort_steps(steps, code_sets, known_tables=None):
+    shared, per_cohort = [], []
+    cohort_reads, cohort_writes = set(), set()
+    for label, sql_query in steps:
+        tables = step_tables(sql_query, known_tables)
+        reads = {name.lower() for name in tables["reads"]}
+        writes = {name.lower() for name in tables["writes"]}
+        if (reads | writes) & (code_sets | cohort_writes) or writes & cohort_reads:
+            per_cohort.append((label, sql_query))
+            cohort_reads |= reads
+            cohort_writes |= writes
+        else:
+            shared.append((label, sql_query))
+    return shared, per_cohort
+
+# Run the steps once per cohort, with the pipeline's exposure, exclusion and outcome code sets
+# replaced by the cohort's. Steps no cohort changes (the base joins and per-subject summaries of the
+# disease pipeline) run once and their tables are reused by every cohort. Each cohort's output tables
+# are written to a directory of its own under out_dir. Returns {cohort name: {table: (path, rows)}}.
+def run_cohorts(pipeline, engine, steps, alias_map, cohorts, outputs, out_dir, output_format="parquet", log=print):
+    defaults = EXAMPLE_PIPELINES[pipeline]["code_sets"]
+    if defaults is None:
+        raise ValueError(f"the {pipeline} pipeline has no code sets to vary")
+    names = [cohort_name(cohort) for cohort in cohorts]
+    if len(set(names)) < len(names):
+        raise ValueError("every cohort needs its own exposure and outcome pair")
+    missing = sorted({name for cohort in cohorts for name in cohort.values() if not engine.base.has_table(name)})
+    if missing:
+        raise ValueError(f"unknown code sets: {', '.join(missing)}")
+    steps = [(label, apply_alias_map(sql_query, alias_map)) for label, sql_query in steps]
+    step_sql = {k: sql_query for k, (_, sql_query) in enumerate(steps)}
+    code_sets = {name.lower() for name in defaults.values()}
+    shared, per_cohort = split_cohort_steps(steps, code_sets, pipeline_tables(step_sql, engine))
+    log(f"🧩 {len(shared)} shared steps run once, {len(per_cohort)} steps run for each of {len(cohorts)} cohorts")
+    for label, sql_query in shared:
+        messages, _, _ = run_step(sql_query, engine)
+        log_step(label, messages, log)
+    written = {}
+    for name, cohort in zip(names, cohorts):
+        log(f"👥 Cohort {name}: " + ", ".join(f"{role} {cohort[role]}" for role in COHORT_ROLES))
+        for label, sql_query in per_cohort:
+            messages, _, _ = run_step(cohort_sql(sql_query, defaults, cohort), engine)
+            log_step(f"{name} {label}", messages, log)
+        written[name] = write_outputs(engine, outputs, os.path.join(out_dir, name), output_format, log)
+    return written
+
+# Write a session table to a Parquet or Arrow file, one record batch at a time. The file is written
+# under a temporary name and moved into place, so readers never see a partial file.
+def write_table_file(engine, name, path, output_format="parquet"):
+    tmp_path = path + ".tmp"
+    schema = engine.arrow_schema(name)
+    num_rows = 0
+    if output_format == "parquet":
+        with pq.ParquetWriter(tmp_path, schema) as writer:
+            for batch in engine.arrow_batches(name):
+                writer.write_batch(batch)
+                num_rows += batch.num_rows
+    else:
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                for batch in engine.arrow_batches(name):
+                    writer.write_batch(batch)
+                    num_rows += batch.num_rows
+    os.replace(tmp_path, path)
+    return num_rows
+
+# Write the named session tables to out_dir, returning {table: (path, rows)}
+def write_outputs(engine, outputs, out_dir, output_format="parquet", log=print):
+    missing = [name for name in outputs if not engine.has_session_table(name)]
+    if missing:
+        raise ValueError(f"the run did not create {', '.join(missing)}")
+    os.makedirs(out_dir, exist_ok=True)
+    written = {}
+    for name in outputs:
+        path = os.path.join(out_dir, name + OUTPUT_FORMATS[output_format])
+        written[name] = (path, write_table_file(engine, name, path, output_format))
+        log(f"✅ {name}: {written[name][1]:,} rows → {path}")
+    return written
+
+# Run a pipeline's default steps (or a SQL script using the pipeline's tables) over a data directory
+# and write the named tables (default: the pipeline's final table) to out_dir.
+# Table names in the SQL may use the file names (mimiciv_hosp.admissions) as on the pages.
+# With stream, the pipeline's large table is read a chunk of chunk_rows rows at a time (see streaming.py).
+# With cohorts (see parse_cohort), the steps run once per cohort (see run_cohorts).
+# Returns {table: (path, rows)}, or {cohort name: {table: (path, rows)}} for cohorts;
+# a failing statement raises its sqlite3 error.
+def run_batch(pipeline, data_dir=None, script=None, outputs=None, out_dir=".", output_format="parquet", log=print,
+              stream=False, chunk_rows=None, cohorts=None):
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"unknown output format {output_format!r}; choose from {', '.join(OUTPUT_FORMATS)}")
+    if stream and cohorts:
+        raise ValueError("cohort runs cannot be streamed")
+    outputs = outputs or [EXAMPLE_PIPELINES[pipeline]["output"]]
+    start = time.perf_counter()
+    engine, alias_map = open_engine(pipeline, data_dir)
+    log(f"📂 Base tables loaded in {time.perf_counter() - start:.1f} s ({len(alias_map)} files)")
+    try:
+        steps = batch_steps(pipeline, script)
+        if cohorts:
+            return run_cohorts(pipeline, engine, steps, alias_map, cohorts, outputs, out_dir, output_format, log)
+        if stream:
+            stream_batch_steps(pipeline, engine, steps, alias_map, chunk_rows, log)
+        else:
+            for label, sql_query in steps:
+                messages, _, _ = run_step(apply_alias_map(sql_query, alias_map), engine)
+                log_step(label, messages, log)
+        return write_outputs(engine, outputs, out_dir, output_format, log)
+    finally:
+        engine.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the disease or drug pipeline (or a SQL script) without the web UI and write tables to disk.")
+    parser.add_argument("pipeline", choices=list(EXAMPLE_PIPELINES), help="whose base tables to load (and default steps to run)")
+    parser.add_argument("--data-dir", help="directory of the base tables (default: the bundled MIMIC_IV_data directory)")
+    parser.add_argument("--script", help="SQL file to run instead of the default steps")
+    parser.add_argument("--output", action="append", dest="outputs",
+                        help="table to write (repeatable; default: temp_twenty_three for disease, temp_seven for drug)")
+    parser.add_argument("--output-dir", default=".", help="directory the tables are written to")
+    parser.add_argument("--format", choices=list(OUTPUT_FORMATS), default="parquet", help="output file format")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream the prescriptions Arrow file through the drug steps in chunks instead of loading it whole")
+    parser.add_argument("--chunk-rows", type=int, help="rows per streamed chunk (default: MIMIC_SQL_STREAM_CHUNK_ROWS or 250000)")
+    parser.add_argument("--cohort", action="append", dest="cohorts",
+                        help="EXPOSURE,EXCLUSION,OUTCOME code sets to run the disease steps with, e.g. "
+                             "psychosis,all_psychiatric_disorders,hemorrhagic_stroke (repeatable; one output directory each)")
+    args = parser.parse_args(argv)
+    script = None
+    if args.script:
+        with open(args.script) as f:
+            script = f.read()
+    try:
+        cohorts = [parse_cohort(text) for text in args.cohorts or []]
+        run_batch(args.pipeline, args.data_dir, script, args.outputs, args.output_dir, args.format,
+                  stream=args.stream, chunk_rows=args.chunk_rows, cohorts=cohorts)
+    except (sqlite3.Error, OSError, RuntimeError, ValueError) as e:
+        print(f"❌ {type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from mimic_sql.data_store import ARROW_EXTENSION, discover_tables, open_arrow_table
+from mimic_sql.engine import SQLEngine
+from mimic_sql.examples import DISEASE_DATA_DIR, DISEASE_QUERIES, DRUG_DATA_DIR, EXAMPLE_PIPELINES
+from mimic_sql.jobs import PipelineJob, step_worker_count
+from mimic_sql.pipeline import pipeline_tables, step_schedule
+from mimic_sql.profiling import peak_rss_bytes
+from mimic_sql.sql_parse import apply_alias_map, split_statements, sqlite_dialect
+from mimic_sql.steps import run_step
+
+# Cohort sizes timed when none are given on the command line
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+# The quadratic reference is only timed up to this many rows
+REFERENCE_LIMIT = 10_000
+
+# Disease Step 18's DELETE, which drops controls whose gender and age match no case
+MATCH_EXCLUSION_SQL = next(q for q in split_statements(DISEASE_QUERIES[30]) if q.upper().startswith("DELETE"))
+
+# Data scales the pipelines are timed at when none are given (1 = the tables as shipped)
+DEFAULT_SCALES = [1]
+
+# Each extra copy of a table at a larger scale shifts subject_id by this much, so copies are new patients
+SUBJECT_ID_STRIDE = 100_000_000
+
+# A step is flagged as a regression when it takes this many times its baseline time...
+REGRESSION_RATIO = 1.25
+
+# ...and at least this many seconds longer, so millisecond steps do not flag on timing noise
+REGRESSION_MIN_SECONDS = 0.05
+
+# --- Synthetic Inputs ---
+
+# A temp_eighteen-like cohort: gender, age and a with_psychosis flag stored as SQLite strings
+def synthetic_matched_cohort(num_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "subject_id": np.arange(10_000_000, 10_000_000 + num_rows),
+        "gender": rng.choice(["F", "M"], num_rows),
+        "age": rng.integers(18, 100, num_rows),
+        "with_psychosis": np.where(rng.random(num_rows) < 0.02, "TRUE", "FALSE"),
+    })
+
+# --- Timing ---
+
+# Best time of a few runs of Step 18's DELETE on a fresh engine holding the cohort as temp_eighteen,
+# with the rows left afterwards. Loading the cohort is not timed. By default the statement runs as the
+# pipeline runs it (run_step, with the engine's rewrites and indexes); with correlated it goes to SQLite
+# as written (after dialect translation), as the reference.
+def time_match_exclusion(df, correlated=False, repeat=3):
+    best, remaining = None, None
+    for _ in range(repeat):
+        engine = SQLEngine()
+        try:
+            engine.register("temp_eighteen", df)
+            start = time.perf_counter()
+            if correlated:
+                with engine.lock:
+                    engine.conn.execute(sqlite_dialect(MATCH_EXCLUSION_SQL))
+                    engine.conn.commit()
+            else:
+                run_step(MATCH_EXCLUSION_SQL, engine)
+            elapsed = time.perf_counter() - start
+            remaining = engine.read_table("temp_eighteen")
+        finally:
+            engine.close()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, remaining
+
+# Time the age/gender match exclusion at each cohort size
+def benchmark_match_exclusion(sizes=DEFAULT_SIZES, reference_limit=REFERENCE_LIMIT):
+    rows = []
+    for num_rows in sizes:
+        df = synthetic_matched_cohort(num_rows)
+        engine_secs, remaining = time_match_exclusion(df)
+        reference_secs = None
+        if num_rows <= reference_limit:
+            reference_secs, expected = time_match_exclusion(df, correlated=True, repeat=1)
+            if not remaining.equals(expected):
+                raise AssertionError(f"the engine and the correlated DELETE leave different rows at {num_rows} rows")
+        rows.append({
+            "rows": num_rows,
+            "deleted": num_rows - len(remaining),
+            "engine_s": engine_secs,
+            "correlated_s": reference_secs,
+            "speedup": reference_secs / engine_secs if reference_secs else None,
+        })
+    return pd.DataFrame(rows)
+
+# --- Pipeline Benchmark ---
+
+# Read a table file (.pkl or ingested Arrow file) into a DataFrame
+def read_table_file(path):
+    if path.endswith(ARROW_EXTENSION):
+        return open_arrow_table(path).to_pandas()
+    return pd.read_pickle(path)
+
+# The (table name, source) pairs of a data directory at a scale. At scale 1 the files are loaded as the
+# pages load them; at scale n every table with a subject_id column is repeated n times, each copy with
+# its subject_ids shifted, so joins, cohorts and row counts all grow n-fold. Code sets are not repeated.
+def scaled_tables(data_dir, scale=1):
+    table_files = discover_tables(data_dir)
+    if scale == 1:
+        return list(table_files.items())
+    tables = []
+    for table_name, path in table_files.items():
+        df = read_table_file(path)
+        if "subject_id" in df.columns:
+            copies = []
+            for copy_index in range(scale):
+                copy = df.copy()
+                # Shifted ids leave the int32 range the ingest schema narrows subject_id to
+                copy["subject_id"] = copy["subject_id"].astype("int64") + copy_index * SUBJECT_ID_STRIDE
+                copies.append(copy)
+            df = pd.concat(copies, ignore_index=True)
+        tables.append((table_name, df))
+    return tables
+
+# Run a pipeline's default steps on a fresh session engine and time each one. With repeat > 1 the
+# steps run again on new engines and each step keeps its fastest run: all of that step's figures come
+# from the same run. peak_rss_mb is the process's peak resident memory once the step finished, so it
+# only grows during a benchmark run.
+def benchmark_pipeline(pipeline, scale=1, data_dir=None, repeat=1):
+    spec = EXAMPLE_PIPELINES[pipeline]
+    data_dir = data_dir or spec["data_dir"]
+    start = time.perf_counter()
+    store = spec["build_store"](scaled_tables(data_dir, scale))
+    load_secs = time.perf_counter() - start
+    if store.errors:
+        raise RuntimeError("; ".join(store.errors))
+    alias_map = {table_name: spec["alias"](table_name) for table_name in discover_tables(data_dir)}
+    rows = {}
+    for _ in range(repeat):
+        engine = SQLEngine(base=store)
+        for i in spec["steps"]:
+            sql_query = apply_alias_map(spec["queries"][i], alias_map)
+            start = time.perf_counter()
+            _, step_result, profile = run_step(sql_query, engine)
+            elapsed = time.perf_counter() - start
+            if i in rows and rows[i]["seconds"] <= elapsed:
+                continue
+            rows[i] = {
+                "pipeline": pipeline,
+                "scale": scale,
+                "step": i,
+                "label": spec["names"][i],
+                "seconds": round(elapsed, 4),
+                "engine_seconds": round(sum(entry["engine_seconds"] for entry in profile), 4),
+                "rows_out": step_result.num_rows if step_result is not None else None,
+                "peak_rss_mb": None if peak_rss_bytes() is None else round(peak_rss_bytes() / 2**20, 1),
+            }
+        engine.close()
+    store.close()
+    print(f"{pipeline} x{scale}: base tables loaded in {load_secs:.2f} s, "
+          f"{sum(row['seconds'] for row in rows.values()):.2f} s for {len(rows)} steps", file=sys.stderr)
+    return list(rows.values())
+
+# Compare step timings with a saved baseline: each step gets its baseline time, the ratio and whether
+# it regressed (much slower than the baseline, or a different number of output rows)
+def compare_to_baseline(df, baseline_rows):
+    keys = ["pipeline", "scale", "step"]
+    baseline = pd.DataFrame(baseline_rows, columns=keys + ["seconds", "rows_out"])
+    baseline = baseline.rename(columns={"seconds": "baseline_seconds", "rows_out": "baseline_rows_out"})
+    df = df.merge(baseline, on=keys, how="left")
+    df["ratio"] = (df["seconds"] / df["baseline_seconds"]).round(2)
+    slower = (df["seconds"] > df["baseline_seconds"] * REGRESSION_RATIO) & \
+        (df["seconds"] - df["baseline_seconds"] > REGRESSION_MIN_SECONDS)
+    rows_changed = df["baseline_seconds"].notna() & (df["rows_out"].fillna(-1) != df["baseline_rows_out"].fillna(-1))
+    df["regressed"] = slower | rows_changed
+    return df.drop(columns=["baseline_rows_out"])
+
+# Time the pipelines at every scale, smallest scale first
+def benchmark_pipelines(pipelines=tuple(EXAMPLE_PIPELINES), scales=DEFAULT_SCALES, data_dirs=None, repeat=1):
+    data_dirs = data_dirs or {}
+    rows = []
+    for scale in sorted(scales):
+        for pipeline in pipelines:
+            rows.extend(benchmark_pipeline(pipeline, scale, data_dirs.get(pipeline), repeat))
+    return pd.DataFrame(rows)
+
+# --- Concurrency Benchmark ---
+
+# Run a pipeline's default steps the way "Execute All" does, on a fresh session engine over a loaded
+# store: one after another, or with independent steps at the same time. Returns the wall time and the
+# rows of every table the run leaves in the session, to check both ways build the same tables.
+def time_pipeline_run(pipeline, store, alias_map, concurrent):
+    spec = EXAMPLE_PIPELINES[pipeline]
+    engine = SQLEngine(base=store)
+    try:
+        step_sql = {i: apply_alias_map(spec["queries"][i], alias_map) for i in spec["steps"]}
+        schedule = step_schedule(step_sql, pipeline_tables(step_sql, engine)) if concurrent else None
+        job = PipelineJob(list(step_sql), lambda i, step_engine: run_step(step_sql[i], step_engine), engine, schedule=schedule)
+        start = time.perf_counter()
+        job.run()
+        elapsed = time.perf_counter() - start
+        if job.error is not None:
+            raise RuntimeError(job.error)
+        with engine.lock:
+            tables = {
+                name.lower(): sorted(engine.conn.execute(f'SELECT * FROM "{name}"').fetchall(), key=repr)
+                for name in engine.session_tables()
+            }
+    finally:
+        engine.close()
+    return elapsed, tables
+
+# Wall time of each pipeline run sequentially and with up to step_worker_count() steps at once, best
+# of repeat runs each. An untimed sequential run first loads the base columns, joins and indexes the
+# steps use, so both ways start from the same warm store.
+def benchmark_concurrency(pipelines=tuple(EXAMPLE_PIPELINES), scale=1, data_dirs=None, repeat=1):
+    data_dirs = data_dirs or {}
+    rows = []
+    for pipeline in pipelines:
+        spec = EXAMPLE_PIPELINES[pipeline]
+        data_dir = data_dirs.get(pipeline) or spec["data_dir"]
+        store = spec["build_store"](scaled_tables(data_dir, scale))
+        if store.errors:
+            raise RuntimeError("; ".join(store.errors))
+        alias_map = {table_name: spec["alias"](table_name) for table_name in discover_tables(data_dir)}
+        _, expected = time_pipeline_run(pipeline, store, alias_map, concurrent=False)
+        best = {}
+        for _ in range(repeat):
+            for concurrent in (False, True):
+                elapsed, tables = time_pipeline_run(pipeline, store, alias_map, concurrent)
+                if tables != expected:
+                    raise AssertionError(f"{pipeline}: the {'concurrent' if concurrent else 'sequential'} run built different tables")
+                best[concurrent] = min(elapsed, best.get(concurrent, elapsed))
+        store.close()
+        rows.append({
+            "pipeline": pipeline,
+            "scale": scale,
+            "workers": step_worker_count(),
+            "sequential_s": round(best[False], 2),
+            "concurrent_s": round(best[True], 2),
+            "speedup": round(best[False] / best[True], 2),
+        })
+    return pd.DataFrame(rows)
+
+# python -m mimic_sql.benchmark match-exclusion [--sizes ...]
+def run_match_exclusion(args):
+    print(benchmark_match_exclusion(args.sizes, args.reference_limit).to_string(index=False))
+    return 0
+
+# python -m mimic_sql.benchmark pipelines [--scales ...] [--baseline FILE] [--save-baseline FILE]
+def run_pipelines(args):
+    data_dirs = {"disease": args.disease_data_dir, "drug": args.drug_data_dir}
+    df = benchmark_pipelines(args.pipelines, args.scales, data_dirs, args.repeat)
+    regressed = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            df = compare_to_baseline(df, json.load(f)["steps"])
+        regressed = bool(df["regressed"].any())
+    print(df.to_string(index=False))
+    totals = df.groupby(["pipeline", "scale"], sort=False)[["seconds", "peak_rss_mb"]].agg({"seconds": "sum", "peak_rss_mb": "max"})
+    print()
+    print(totals.round(2).to_string())
+    if args.save_baseline:
+        steps = df[["pipeline", "scale", "step", "label", "seconds", "engine_seconds", "rows_out", "peak_rss_mb"]]
+        with open(args.save_baseline, "w") as f:
+            json.dump({"steps": json.loads(steps.to_json(orient="records"))}, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+    if regressed:
+        print(f"❌ {int(df['regressed'].sum())} step(s) regressed against {args.baseline}")
+        return 1
+    return 0
+
+# python -m mimic_sql.benchmark concurrency [--workers N] [--scale n]
+def run_concurrency(args):
+    # The shared step pool is sized from the environment when it is first used
+    os.environ["MIMIC_SQL_STEP_WORKERS"] = str(args.workers)
+    data_dirs = {"disease": args.disease_data_dir, "drug": args.drug_data_dir}
+    print(benchmark_concurrency(args.pipelines, args.scale, data_dirs, args.repeat).to_string(index=False))
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the MIMIC SQL examples.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    match_parser = commands.add_parser("match-exclusion", help="time Step 18's age/gender match exclusion DELETE in the engine")
+    match_parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="cohort sizes to time")
+    match_parser.add_argument("--reference-limit", type=int, default=REFERENCE_LIMIT,
+                              help="largest size at which the row-wise reference is also timed")
+    match_parser.set_defaults(run=run_match_exclusion)
+
+    pipeline_parser = commands.add_parser("pipelines", help="time the default disease and drug pipeline steps without the UI")
+    pipeline_parser.add_argument("--pipelines", nargs="+", choices=list(EXAMPLE_PIPELINES), default=list(EXAMPLE_PIPELINES),
+                                 help="pipelines to run")
+    pipeline_parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES,
+                                 help="data scales to run at (n = every patient table repeated n times)")
+    pipeline_parser.add_argument("--repeat", type=int, default=1, help="runs per scale; each step keeps its fastest")
+    pipeline_parser.add_argument("--disease-data-dir", default=DISEASE_DATA_DIR, help="directory of the disease tables")
+    pipeline_parser.add_argument("--drug-data-dir", default=DRUG_DATA_DIR, help="directory of the drug tables")
+    pipeline_parser.add_argument("--baseline", help="JSON file saved by --save-baseline to compare against")
+    pipeline_parser.add_argument("--save-baseline", help="write this run's step timings and row counts to a JSON file")
+    pipeline_parser.set_defaults(run=run_pipelines)
+
+    concurrency_parser = commands.add_parser(
+        "concurrency", help="compare Execute All run sequentially and with independent steps at the same time"
+    )
+    concurrency_parser.add_argument("--pipelines", nargs="+", choices=list(EXAMPLE_PIPELINES), default=list(EXAMPLE_PIPELINES),
+                                    help="pipelines to run")
+    concurrency_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="steps that may run at once")
+    concurrency_parser.add_argument("--scale", type=int, default=1, help="data scale (n = every patient table repeated n times)")
+    concurrency_parser.add_argument("--repeat", type=int, default=1, help="timed runs of each kind; the fastest is kept")
+    concurrency_parser.add_argument("--disease-data-dir", default=DISEASE_DATA_DIR, help="directory of the disease tables")
+    concurrency_parser.add_argument("--drug-data-dir", default=DRUG_DATA_DIR, help="directory of the drug tables")
+    concurrency_parser.set_defaults(run=run_concurrency)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
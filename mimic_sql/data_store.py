@@ -0,0 +1,350 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from mimic_sql.search_index import PrefixIndex
+
+# Schema name under which every session engine attaches the shared base tables
+BASE_SCHEMA = "base"
+
+# File extension of the columnar tables written by `python -m mimic_sql.ingest`
+ARROW_EXTENSION = ".arrow"
+
+# Arrow schema metadata marking tables that were already cleaned and typed at ingest
+PREPARED_METADATA_KEY = b"mimic_sql.prepared"
+
+# RE2 pattern matching exactly the characters Python's re treats as \s
+WHITESPACE_PATTERN = r"[\s\x{0b}\x{1c}-\x{1f}\x{85}\p{Z}]+"
+
+# Base tables named like this are ICD code sets (icd_code, icd_version), e.g. hypertension_icd_codes
+CODE_SET_SUFFIX = "_icd_codes"
+
+# Base table tagging every (icd_version, icd_code) pair with a bitmask of the code sets that contain it
+CODE_SET_INDEX = "icd_code_categories"
+
+# SQLite integers are signed 64-bit, so at most this many code sets get a bit
+MAX_CODE_SETS = 62
+
+# Prefix of the tables holding a NATURAL JOIN of two base tables, shared by the steps repeating it
+NATURAL_JOIN_PREFIX = "natural_"
+
+# Keywords marking date/time columns that are parsed into datetimes
+TIME_KEYWORDS = ['time', 'date', 'datetime']
+
+# --- Table Preparation ---
+
+# Remove every whitespace character from the string values of object columns.
+# Each column is cleaned by one Arrow compute call instead of a Python regex call per cell.
+def remove_whitespace(df):
+    for col in df.select_dtypes(include=['object', 'category']).columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            # Categories can coincide once cleaned, so they are cleaned as plain values
+            df[col] = df[col].astype(object)
+        try:
+            values = pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Mixed value types: clean only the string values and leave the others untouched
+            is_str = df[col].map(type) == str
+            df[col] = df[col].where(~is_str, df[col][is_str].str.replace(r'\s+', '', regex=True))
+            continue
+        if pa.types.is_string(values.type) or pa.types.is_large_string(values.type):
+            cleaned = pc.replace_substring_regex(values, pattern=WHITESPACE_PATTERN, replacement="")
+            df[col] = cleaned.to_numpy(zero_copy_only=False)
+    return df
+
+# Parse every column whose name mentions a date or time into datetime64[ns]
+def parse_time_columns(df):
+    for col in df.columns:
+        if any(keyword in col.lower() for keyword in TIME_KEYWORDS):
+            df[col] = pd.to_datetime(df[col], errors='coerce').astype("datetime64[ns]")
+    return df
+
+# --- Data Directory Helpers ---
+
+# Map each table name in a data directory to its file, preferring an ingested Arrow file
+# over the original pickle unless the pickle has changed since it was ingested
+def discover_tables(data_dir):
+    tables = {}
+    for file_name in sorted(os.listdir(data_dir)):
+        table_name, extension = os.path.splitext(file_name)
+        if extension not in (".pkl", ARROW_EXTENSION):
+            continue
+        path = os.path.join(data_dir, file_name)
+        current = tables.get(table_name)
+        if current is None:
+            tables[table_name] = path
+        else:
+            arrow_path, pkl_path = (path, current) if extension == ARROW_EXTENSION else (current, path)
+            fresh = os.path.getmtime(arrow_path) >= os.path.getmtime(pkl_path)
+            tables[table_name] = arrow_path if fresh else pkl_path
+    return tables
+
+# Memory-map an Arrow IPC file; selecting columns from the result does not copy data
+def open_arrow_table(path):
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+# --- Shared Base Table Store ---
+
+class BaseTableStore:
+    """
+    Process-wide, read-only SQLite database holding the base MIMIC tables of one data directory.
+    It is built once per server process (behind st.cache_resource) and attached by every session's
+    SQLEngine, so sessions only hold a reference to it plus their own temp_* tables.
+    The database lives in memory only, as a named shared-cache database: every engine attaches it
+    through a connection of its own, and nothing is written to disk.
+    Tables backed by Arrow files are loaded lazily: only the columns statements reference are copied in.
+    The optional transform is skipped for Arrow files that were already prepared at ingest.
+    """
+
+    def __init__(self, transform=None):
+        # A named shared-cache in-memory database can be opened by several connections in this process.
+        self.uri = f"file:mimic_base_{uuid.uuid4().hex}?mode=memory&cache=shared"
+        self.conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        self.lock = threading.Lock()
+        # Optional per-table preparation (e.g. whitespace cleanup) applied to every loaded column batch
+        self.transform = transform
+        self.row_counts = {}
+        self.available_columns = {}
+        self.loaded_columns = {}
+        self.arrow_sources = {}
+        self.prepared_tables = set()
+        # Source identity of each table (file, size, modification time), used to key cached results
+        self.fingerprints = {}
+        # Bit assigned to each code set in the CODE_SET_INDEX table (empty until it is built)
+        self.code_set_bits = {}
+        # PrefixIndex per (table, column), for case-insensitive prefix searches without a table scan
+        self.prefix_indexes = {}
+        # (table, columns) of the SQLite indexes created on join and filter keys
+        self.key_indexes = set()
+        # Per (left, right) base table pair: the table holding its natural join
+        self.natural_tables = {}
+        self.errors = []
+
+    # Add a table from a .pkl file (loaded whole) or an Arrow file (loaded on demand)
+    def add_table(self, name, path):
+        try:
+            if path.endswith(ARROW_EXTENSION):
+                source = open_arrow_table(path)
+                self.arrow_sources[name] = source
+                if (source.schema.metadata or {}).get(PREPARED_METADATA_KEY) == b"true":
+                    self.prepared_tables.add(name)
+                self.available_columns[name] = list(source.column_names)
+                self.loaded_columns[name] = []
+                self.row_counts[name] = source.num_rows
+            else:
+                df = pd.read_pickle(path)
+                if isinstance(df, pd.DataFrame):
+                    self.register(name, df)
+            stat = os.stat(path)
+            transform_name = getattr(self.transform, "__qualname__", "")
+            self.fingerprints[name.lower()] = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}:{transform_name}"
+        except Exception as e:
+            self.errors.append(f"❌ Unable to read {os.path.basename(path)}: {e}")
+
+    # Load a DataFrame as a base table
+    def register(self, name, df):
+        if self.transform is not None:
+            df = self.transform(df)
+        with self.lock:
+            self.conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+            df.to_sql(name, self.conn, index=False)
+            self.conn.commit()
+            self.row_counts[name] = len(df)
+            self.available_columns[name] = list(df.columns)
+            self.loaded_columns[name] = list(df.columns)
+
+    # Make sure the given columns of a table are loaded (all columns when None)
+    def ensure_columns(self, name, columns=None):
+        name = self.table_name(name)
+        if name not in self.arrow_sources:
+            return
+        with self.lock:
+            available = self.available_columns[name]
+            wanted = available if columns is None else [col for col in available if col in columns]
+            if not wanted and not self.loaded_columns[name]:
+                wanted = available[:1]
+            missing = [col for col in wanted if col not in self.loaded_columns[name]]
+            if not missing:
+                return
+            df = self.arrow_sources[name].select(missing).to_pandas()
+            if self.transform is not None and name not in self.prepared_tables:
+                df = self.transform(df)
+            if not self.loaded_columns[name]:
+                df.to_sql(name, self.conn, index=False)
+            else:
+                self.add_columns(name, df)
+            self.conn.commit()
+            self.loaded_columns[name] += missing
+
+    # Append columns to an existing base table, matching rows by rowid so existing indexes survive
+    def add_columns(self, name, df):
+        staging = f"_staging_{name}"
+        self.conn.execute(f'DROP TABLE IF EXISTS "{staging}"')
+        df.to_sql(staging, self.conn, index=False)
+        column_types = {row[1]: row[2] for row in self.conn.execute(f'PRAGMA table_info("{staging}")')}
+        for col in df.columns:
+            self.retry_locked(f'ALTER TABLE "{name}" ADD COLUMN "{col}" {column_types[col]}')
+        assignments = ", ".join(f'"{col}" = s."{col}"' for col in df.columns)
+        self.retry_locked(f'UPDATE "{name}" SET {assignments} FROM "{staging}" AS s WHERE s.rowid = "{name}".rowid')
+        self.conn.execute(f'DROP TABLE "{staging}"')
+
+    # Schema changes can briefly collide with readers in other sessions; retry until they finish
+    def retry_locked(self, q, attempts=50):
+        for attempt in range(attempts):
+            try:
+                return self.conn.execute(q)
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or attempt == attempts - 1:
+                    raise
+                time.sleep(0.1)
+
+    # Build the CODE_SET_INDEX table once per data load: one row per distinct (icd_version, icd_code)
+    # with the OR of the bits of every code set containing it, so membership tests become bit tests.
+    # Code sets holding a NULL icd_code are left out: IN gives NULL rather than FALSE for their non-members.
+    def build_code_set_index(self):
+        code_sets = sorted(
+            name for name, columns in self.available_columns.items()
+            if name.lower().endswith(CODE_SET_SUFFIX) and {"icd_code", "icd_version"} <= set(columns)
+        )
+        for name in code_sets:
+            self.ensure_columns(name, ["icd_code", "icd_version"])
+        with self.lock:
+            code_sets = [
+                name for name in code_sets
+                if not self.conn.execute(f'SELECT 1 FROM "{name}" WHERE icd_code IS NULL LIMIT 1').fetchone()
+            ][:MAX_CODE_SETS]
+        if not code_sets:
+            return
+        bits = {name.lower(): 1 << k for k, name in enumerate(code_sets)}
+        tagged = " UNION ALL ".join(
+            f'SELECT DISTINCT icd_version, icd_code, {bits[name.lower()]} AS bit FROM "{name}"' for name in code_sets
+        )
+        with self.lock:
+            self.conn.execute(f'DROP TABLE IF EXISTS "{CODE_SET_INDEX}"')
+            self.conn.execute(
+                f'CREATE TABLE "{CODE_SET_INDEX}" AS SELECT icd_version, icd_code, SUM(bit) AS category_mask '
+                f'FROM ({tagged}) GROUP BY icd_version, icd_code'
+            )
+            self.conn.execute(f'CREATE UNIQUE INDEX "{CODE_SET_INDEX}_key" ON "{CODE_SET_INDEX}" (icd_version, icd_code)')
+            self.conn.commit()
+            count = self.conn.execute(f'SELECT COUNT(*) FROM "{CODE_SET_INDEX}"').fetchone()[0]
+        self.row_counts[CODE_SET_INDEX] = count
+        self.available_columns[CODE_SET_INDEX] = ["icd_version", "icd_code", "category_mask"]
+        self.loaded_columns[CODE_SET_INDEX] = list(self.available_columns[CODE_SET_INDEX])
+        self.fingerprints[CODE_SET_INDEX] = ":".join(self.fingerprints.get(name.lower(), name) for name in code_sets)
+        self.code_set_bits = bits
+
+    # Build a PrefixIndex over a text column once per data load
+    def build_prefix_index(self, name, column):
+        if column not in self.available_columns.get(name, []):
+            return
+        self.ensure_columns(name, [column])
+        with self.lock:
+            rows = self.conn.execute(f'SELECT rowid, "{column}" FROM "{name}"').fetchall()
+        rowids = [row[0] for row in rows]
+        values = [row[1] for row in rows]
+        self.prefix_indexes[(name.lower(), column.lower())] = PrefixIndex(rowids, values)
+
+    # Index key columns of a base table for every session, once per data load. Tables with fewer than
+    # min_rows rows are left unindexed. Returns whether an index was created.
+    def create_index(self, name, columns, min_rows=0):
+        name = self.table_name(name)
+        available = {col.lower(): col for col in self.available_columns.get(name, [])}
+        if not all(col.lower() in available for col in columns) or self.row_counts[name] < min_rows:
+            return False
+        columns = [available[col.lower()] for col in columns]
+        self.ensure_columns(name, columns)
+        with self.lock:
+            key = (name.lower(), tuple(col.lower() for col in columns))
+            if key in self.key_indexes:
+                return False
+            column_list = ", ".join(f'"{col}"' for col in columns)
+            self.retry_locked(f'CREATE INDEX IF NOT EXISTS "auto_{"_".join(key[:1] + key[1])}" ON "{name}" ({column_list})')
+            self.conn.commit()
+            self.key_indexes.add(key)
+        return True
+
+    # Materialize "left NATURAL JOIN right" once per data load, so steps repeating the join read its
+    # rows instead of joining again. The first statement's columns (plus the join keys) are kept and the
+    # table is never changed afterwards, so sessions can read it at any time. Returns the table's name,
+    # or None when it lacks some of the columns, in which case the statement joins as written.
+    def natural_join(self, left, right, columns):
+        left, right = self.table_name(left), self.table_name(right)
+        key = (left.lower(), right.lower())
+        common = {col.lower() for col in self.available_columns[left]} & {col.lower() for col in self.available_columns[right]}
+        wanted = {col.lower() for col in columns} | common
+        if key not in self.natural_tables:
+            self.ensure_columns(left, [col for col in self.available_columns[left] if col.lower() in wanted])
+            self.ensure_columns(right, [col for col in self.available_columns[right] if col.lower() in wanted])
+        with self.lock:
+            if key not in self.natural_tables:
+                # Columns in the order SELECT * over the join gives them: left's, then right's other columns
+                left_columns = [row[1] for row in self.conn.execute(f'PRAGMA table_info("{left}")')]
+                right_columns = [row[1] for row in self.conn.execute(f'PRAGMA table_info("{right}")')
+                                 if row[1].lower() not in {col.lower() for col in left_columns}]
+                selected = [col for col in left_columns + right_columns if col.lower() in wanted]
+                column_list = ", ".join(f'"{col}"' for col in selected)
+                name = f"{NATURAL_JOIN_PREFIX}{left}__{right}".lower()
+                self.retry_locked(f'CREATE TABLE "{name}" AS SELECT {column_list} FROM "{left}" NATURAL JOIN "{right}"')
+                self.conn.commit()
+                self.row_counts[name] = self.conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+                self.available_columns[name] = selected
+                self.loaded_columns[name] = list(selected)
+                self.fingerprints[name] = ":".join(self.fingerprints.get(table.lower(), table) for table in (left, right))
+                self.natural_tables[key] = name
+            name = self.natural_tables[key]
+            return name if wanted <= {col.lower() for col in self.available_columns[name]} else None
+
+    # Release the store's connection; the in-memory database goes once no engine has it attached
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # Columns a table can provide (loaded or not), for working out what a statement needs
+    def table_columns(self):
+        return self.available_columns
+
+    # Name a base table is stored under, for a name written in any case (None if there is no such table).
+    # SQL table names are case-insensitive, so every lookup by a name from a statement goes through here.
+    def table_name(self, name):
+        if name in self.row_counts:
+            return name
+        return next((stored for stored in self.row_counts if stored.lower() == name.lower()), None)
+
+    # Check whether a base table is available
+    def has_table(self, name):
+        return self.table_name(name) is not None
+
+    # Source fingerprint of a base table
+    def fingerprint(self, name):
+        return self.fingerprints.get(name.lower())
+
+    # Number of rows in a base table
+    def row_count(self, name):
+        return self.row_counts[self.table_name(name)]
+
+    # Bytes held by the shared database (counted once per server process)
+    def shared_bytes(self):
+        with self.lock:
+            page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        return page_count * page_size
+
+# Human-readable byte count for the memory reports
+def format_bytes(num_bytes):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(num_bytes) < 1024 or unit == "GB":
+            return f"{num_bytes:,.1f} {unit}" if unit != "B" else f"{num_bytes} B"
+        num_bytes /= 1024
+
+# Bytes held by the DataFrames a session keeps in st.session_state
+def dataframes_bytes(values):
+    total = 0
+    for value in values:
+        if hasattr(value, "memory_usage") and hasattr(value, "columns"):
+            total += int(value.memory_usage(deep=True).sum())
+    return total
@@ -0,0 +1,836 @@
+import itertools
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+import pandas as pd
+import pyarrow as pa
+from mimic_sql.data_store import BASE_SCHEMA, CODE_SET_INDEX
+from mimic_sql.result_cache import combine_fingerprints, content_fingerprint
+from mimic_sql.results import ResultHandle
+from mimic_sql.sql_parse import (
+    UNTOKENIZED_PATTERN, create_select, date_difference_columns, decorrelate_not_exists, derived_columns, equality_keys,
+    is_atomic_expression, mask_literals, natural_joins, normalize_sql, prefix_filter, referenced_base_columns, rewrite_code_set_membership, rewrite_natural_joins,
+    select_query_start, sql_tokens, sqlite_dialect, statement_tables, table_aliases, table_projection
+)
+
+# Statement types that would modify the shared base tables
+BASE_WRITE_ACTIONS = {
+    sqlite3.SQLITE_INSERT,
+    sqlite3.SQLITE_UPDATE,
+    sqlite3.SQLITE_DELETE,
+    sqlite3.SQLITE_DROP_TABLE,
+    sqlite3.SQLITE_CREATE_TABLE,
+    sqlite3.SQLITE_CREATE_INDEX,
+    sqlite3.SQLITE_DROP_INDEX,
+}
+
+# Statements whose result can change between runs on the same inputs are never cached
+NONDETERMINISTIC_PATTERN = re.compile(r"\brandom(blob)?\b|'now'|\bcurrent_(date|time|timestamp)\b", re.IGNORECASE)
+
+# Text of a date or timestamp as session tables store them
+ISO_DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+# Name prefix of the temp tables holding the rowids matched by an indexed prefix search, one per statement
+PREFIX_MATCHES_PREFIX = "_prefix_matches_"
+
+# Tables with fewer rows are scanned rather than indexed
+INDEX_MIN_ROWS = 1_000
+
+# Query plan steps that look rows up by key without a lasting index: an automatic index SQLite builds
+# for one statement and throws away, and a full scan (run once per outer row when it is correlated)
+AUTOMATIC_INDEX_PATTERN = re.compile(r"^SEARCH (\S+) USING AUTOMATIC (?:PARTIAL )?(?:COVERING )?INDEX \((.*?)\)")
+TABLE_SCAN_PATTERN = re.compile(r"^SCAN (\S+)$")
+
+# Rows per record batch when a table is exported
+EXPORT_BATCH_ROWS = 100_000
+
+# Schema a cached CREATE TABLE result is attached under while it is saved or restored
+SNAPSHOT_SCHEMA = "result_snapshot"
+
+# Schema holding a worker engine's private copies of the session tables its step reads
+INPUTS_SCHEMA = "step_inputs"
+
+# Schema holding the rows of SELECT results that are not simply a session table
+RESULTS_SCHEMA = "step_results"
+
+# Whether statements' final query plans are recorded for the Messages tab (MIMIC_SQL_QUERY_PLANS=1).
+# Off by default: explaining a statement again once its keys are indexed costs a second planning pass.
+def query_plans_enabled():
+    return os.environ.get("MIMIC_SQL_QUERY_PLANS", "0") == "1"
+
+# Reject any statement that writes to the attached base schema
+def protect_base_schema(action, arg1, arg2, db_name, trigger_name):
+    if action in BASE_WRITE_ACTIONS and db_name == BASE_SCHEMA:
+        return sqlite3.SQLITE_DENY
+    if action == sqlite3.SQLITE_ALTER_TABLE and arg1 == BASE_SCHEMA:
+        return sqlite3.SQLITE_DENY
+    return sqlite3.SQLITE_OK
+
+# --- Persistent SQL Engine ---
+
+class SQLEngine:
+    """
+    Long-lived in-memory SQLite database for one browser session.
+    Base tables are registered once and every temp_* table created by the SQL steps stays
+    inside the engine between statements; only results that are displayed come back as DataFrames.
+    When a BaseTableStore is given, its read-only tables are attached instead of copied per session.
+    """
+
+    def __init__(self, base=None):
+        # Streamlit reruns the script on different threads, so the connection is shared under a lock.
+        self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.lock = threading.RLock()
+        self.base = base
+        # Temp tables of the prepared statement's prefix matches (see load_prefix_matches)
+        self.prefix_matches = []
+        if base is not None:
+            self.conn.execute(f"ATTACH DATABASE ? AS {BASE_SCHEMA}", (base.uri,))
+            # Reading without shared-cache table locks keeps sessions from blocking each other.
+            self.conn.execute("PRAGMA read_uncommitted = 1")
+            self.conn.set_authorizer(protect_base_schema)
+        # Fingerprint of every session table's contents, derived from how it was built
+        self.fingerprints = {}
+        # Row count of each session table, as reported by the statement that last changed it (see record_rows)
+        self.table_rows = {}
+        # Per table built by CREATE TABLE ... AS SELECT: the cache key of that SELECT and the table's
+        # fingerprint, so the same SELECT can be answered from the table while it is unchanged
+        self.created_from = {}
+        # Per such table: its fingerprint and the (expression tokens, column) of its derived columns
+        self.derived_columns = {}
+        # last_from_cache, last_stats and last_plan of the calls made on each thread
+        self.call_state = threading.local()
+        # Schemas holding this session's own tables, in name-resolution order
+        self.schemas = ["temp", "main"]
+        # Live ResultHandles reading from this engine, and names for the result tables they need
+        self.conn.execute(f"ATTACH DATABASE ':memory:' AS {RESULTS_SCHEMA}")
+        self.result_handles = weakref.WeakSet()
+        self.result_ids = itertools.count(1)
+
+    # Whether the current thread's last execute()/query() call was answered from the result cache.
+    # These are kept per thread, so a search on the script thread does not overwrite what a step
+    # running on a worker is about to record.
+    @property
+    def last_from_cache(self):
+        return getattr(self.call_state, "from_cache", False)
+
+    @last_from_cache.setter
+    def last_from_cache(self, value):
+        self.call_state.from_cache = value
+
+    # Cost of the current thread's last execute()/query()/result() call: engine_seconds, convert_seconds
+    # and rows_out, plus the statement's query plan and the indexes created for it
+    @property
+    def last_stats(self):
+        return getattr(self.call_state, "stats", {})
+
+    @last_stats.setter
+    def last_stats(self, value):
+        self.call_state.stats = value
+
+    @property
+    def last_plan(self):
+        return getattr(self.call_state, "plan", {})
+
+    @last_plan.setter
+    def last_plan(self, value):
+        self.call_state.plan = value
+
+    # Register a DataFrame as a table (replacing any existing table with the same name)
+    def register(self, name, df):
+        with self.lock:
+            self.preserve_results([name])
+            self.conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+            df.to_sql(name, self.conn, index=False)
+            self.conn.commit()
+            self.fingerprints[name.lower()] = content_fingerprint(df)
+            self.table_rows[name.lower()] = len(df)
+
+    # Check whether a table is one of the shared read-only base tables
+    def is_base_table(self, name):
+        return self.base is not None and self.base.has_table(name) and not self.has_session_table(name)
+
+    # Check whether a table exists in the session (main or temp schema) or the attached base tables
+    def has_table(self, name):
+        return self.has_session_table(name) or (self.base is not None and self.base.has_table(name))
+
+    # Check whether a table exists in the session's own schemas (main, temp and any copied step inputs)
+    def has_session_table(self, name):
+        return self.table_schema(name) is not None
+
+    # Schema a session table resolves to (None if the session has no such table)
+    def table_schema(self, name):
+        with self.lock:
+            for schema in self.schemas:
+                row = self.conn.execute(
+                    f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ? COLLATE NOCASE", (name,)
+                ).fetchone()
+                if row is not None:
+                    return schema
+        return None
+
+    # Names of the session's own tables
+    def session_tables(self):
+        with self.lock:
+            rows = self.conn.execute(
+                " UNION ALL ".join(f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table'" for schema in self.schemas)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    # Ask the shared store to load every base column the statement references
+    def load_base_columns(self, q):
+        if self.base is None:
+            return
+        wanted = referenced_base_columns(q, self.base.table_columns(), self.session_tables())
+        for name, columns in wanted.items():
+            self.base.ensure_columns(name, columns)
+
+    # Column names of a table, in table order
+    def columns(self, name, schema=None):
+        pragma = f"{schema}.table_info" if schema else "table_info"
+        with self.lock:
+            return [row[1] for row in self.conn.execute(f'PRAGMA {pragma}("{name}")')]
+
+    # Rows in the tables a statement reads (tables it names that are not tables, e.g. CTEs, are skipped).
+    # Session tables are not counted again: their counts come from the statements that built or changed
+    # them (see record_rows). None when one of them has no recorded count.
+    def input_rows(self, q):
+        total = 0
+        for name in statement_tables(q)["reads"]:
+            if self.has_session_table(name):
+                count = self.table_rows.get(name.lower())
+                if count is None:
+                    return None
+                total += count
+            elif self.base is not None and self.base.has_table(name):
+                total += self.base.row_count(name)
+        return total
+
+    # Keep the row counts of the tables a statement wrote: the count of a table it created, the old
+    # count adjusted by the rows a DELETE or INSERT reported, and the old count after UPDATE or ALTER
+    def record_rows(self, q, tables, created, rows_out, rowcount):
+        previous = {name.lower(): self.table_rows.pop(name.lower(), None) for name in tables["writes"]}
+        if created is not None and rows_out is not None:
+            self.table_rows[created.lower()] = rows_out
+        kind = q.split()[0].upper()
+        dropped = {name.lower() for name in tables["drops"]} | {(created or "").lower()}
+        for name, count in previous.items():
+            if count is None or name in dropped:
+                continue
+            if kind in ("UPDATE", "ALTER"):
+                self.table_rows[name] = count
+            elif kind in ("DELETE", "INSERT") and rowcount >= 0:
+                self.table_rows[name] = count - rowcount if kind == "DELETE" else count + rowcount
+
+    # Number of rows in a table given as quoted SQL (e.g. a ResultHandle source)
+    def count_rows(self, source):
+        with self.lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM {source}").fetchone()[0]
+
+    # Rows of a SELECT as a DataFrame, read directly (no dialect translation, indexes or caching)
+    def read_rows(self, q):
+        with self.lock:
+            return pd.read_sql_query(q, self.conn)
+
+    # Number of rows in a table
+    def row_count(self, name):
+        if self.is_base_table(name):
+            return self.base.row_count(name)
+        with self.lock:
+            return self.conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+
+    # Fingerprint of a table's current contents (None if unknown)
+    def table_fingerprint(self, name):
+        if self.has_session_table(name):
+            return self.fingerprints.get(name.lower())
+        if self.base is not None and self.base.has_table(name):
+            return self.base.fingerprint(name)
+        return None
+
+    # Cache key of a statement: its normalized text plus the fingerprint of every table it mentions.
+    # None when the statement cannot be cached (nondeterministic, or an input has no fingerprint).
+    def statement_key(self, q):
+        if NONDETERMINISTIC_PATTERN.search(q):
+            return None
+        known = {name.lower() for name in self.session_tables()}
+        if self.base is not None:
+            known |= {name.lower() for name in self.base.table_columns()}
+        parts = [normalize_sql(q)]
+        for name in sorted({token.lower() for token in sql_tokens(q)} & known):
+            fingerprint = self.table_fingerprint(name)
+            if fingerprint is None:
+                return None
+            parts.append(f"{name}={fingerprint}")
+        return combine_fingerprints(*parts)
+
+    # Execute a statement that returns no rows (DROP, CREATE, ALTER, UPDATE, DELETE).
+    # PostgreSQL-only expressions are translated to SQLite first.
+    # With a ResultCache, CREATE TABLE ... AS results are restored from or saved to it.
+    def execute(self, q, cache=None):
+        q = sqlite_dialect(q, self.date_columns(q))
+        key = self.statement_key(q)
+        tables = statement_tables(q)
+        is_create_as = len(tables["creates"]) == 1 and "select" in {token.lower() for token in sql_tokens(q)}
+        cacheable = cache is not None and key is not None and is_create_as
+        self.last_from_cache = False
+        self.last_plan = {}
+        start = time.perf_counter()
+        with self.lock:
+            self.preserve_results(tables["writes"])
+            created = next(iter(tables["creates"]), None)
+            snapshot = cache.get(key) if cacheable else None
+            if snapshot is not None:
+                self.restore_table(created, snapshot, temp=self.is_temp_create(q))
+                self.last_from_cache = True
+                rowcount = -1
+            else:
+                try:
+                    cursor = self.conn.execute(self.prepare(q))
+                    self.conn.commit()
+                finally:
+                    self.drop_prefix_matches()
+                rowcount = cursor.rowcount
+                if cacheable:
+                    snapshot = self.snapshot_table(created)
+                    cache.put(key, snapshot, len(snapshot))
+            # Whatever the statement changed now has contents determined by the statement and its inputs
+            statement_id = key if key is not None else uuid.uuid4().hex
+            for name in tables["writes"]:
+                if name in tables["drops"]:
+                    self.fingerprints.pop(name, None)
+                else:
+                    self.fingerprints[name] = combine_fingerprints(statement_id, name)
+            engine_seconds = time.perf_counter() - start
+            rows_out = rowcount if rowcount >= 0 else None
+            if created is not None and self.has_session_table(created):
+                rows_out = self.count_rows(f'"{created}"')
+                if is_create_as:
+                    self.record_created(created, create_select(q))
+            self.record_rows(q, tables, created, rows_out, rowcount)
+            self.last_stats = {"engine_seconds": engine_seconds, "rows_out": rows_out, **self.last_plan}
+            return rowcount
+
+    # Run a SELECT and return its result as a DataFrame, served from the ResultCache when given
+    def query(self, q, cache=None):
+        q = sqlite_dialect(q, self.date_columns(q))
+        key = self.statement_key(q) if cache is not None else None
+        self.last_from_cache = False
+        self.last_plan = {}
+        start = time.perf_counter()
+        if key is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                self.last_from_cache = True
+                self.last_stats = {"convert_seconds": time.perf_counter() - start, "rows_out": len(cached)}
+                return cached.copy()
+        # The rewrite may refill the session's prefix-match table, so it is held until the rows are read
+        with self.lock:
+            try:
+                df = pd.read_sql_query(self.prepare(q), self.conn)
+            finally:
+                self.drop_prefix_matches()
+        # pandas reads and converts rows together, so all of it counts as engine time
+        self.last_stats = {"engine_seconds": time.perf_counter() - start, "rows_out": len(df), **self.last_plan}
+        if key is not None:
+            cache.put(key, df.copy(), int(df.memory_usage(deep=True).sum()))
+        return df
+
+    # Run a SELECT and keep its result in the engine, returning a ResultHandle instead of a DataFrame.
+    # A SELECT that only picks columns of a session table refers to that table without copying it;
+    # any other SELECT is stored in the result schema. transform prepares fetched rows for display.
+    def result(self, q, transform=None):
+        q = sqlite_dialect(q, self.date_columns(q)).strip().rstrip(";")
+        self.last_from_cache = False
+        self.last_plan = {}
+        start = time.perf_counter()
+        handle = None
+        # As in execute(), everything from the rewrite to registering the handle runs under one hold of
+        # the lock: the rewrite may refill the session's prefix-match table, and another thread's
+        # prune_results() would drop a result table no handle reads yet
+        with self.lock:
+            self.prune_results()
+            projection = table_projection(q)
+            served_from = self.served_table(q)
+            if served_from is not None:
+                # The same SELECT just built this table, so its rows are shown from the table
+                projection = (served_from, None)
+                self.last_plan = {"served_from": served_from}
+            if projection is not None and self.has_session_table(projection[0]):
+                table_name, columns = projection
+                table_columns = {col.lower() for col in self.columns(table_name)}
+                if columns is None or all(col.lower() in table_columns for col in columns):
+                    engine_done = time.perf_counter()
+                    handle = ResultHandle(self, None, table_name, columns or self.columns(table_name), transform)
+            if handle is None:
+                name = f"result_{next(self.result_ids)}"
+                try:
+                    self.conn.execute(f'CREATE TABLE {RESULTS_SCHEMA}."{name}" AS {self.prepare(q)}')
+                    self.conn.commit()
+                finally:
+                    self.drop_prefix_matches()
+                engine_done = time.perf_counter()
+                handle = ResultHandle(self, RESULTS_SCHEMA, name, self.columns(name, RESULTS_SCHEMA), transform)
+            self.result_handles.add(handle)
+        self.last_stats = {
+            "engine_seconds": engine_done - start,
+            "convert_seconds": time.perf_counter() - engine_done,
+            "rows_out": handle.num_rows,
+            **self.last_plan,
+        }
+        return handle
+
+    # Before tables are changed or dropped, copy aside the ones live result handles still show
+    def preserve_results(self, names):
+        names = {name.lower() for name in names}
+        shown = {}
+        for handle in list(self.result_handles):
+            if handle.schema is None and handle.table.lower() in names:
+                shown.setdefault(handle.table.lower(), []).append(handle)
+        for handles in shown.values():
+            name = f"result_{next(self.result_ids)}"
+            with self.lock:
+                self.conn.execute(f'CREATE TABLE {RESULTS_SCHEMA}."{name}" AS SELECT * FROM {handles[0].source()}')
+                self.conn.commit()
+            for handle in handles:
+                handle.schema, handle.table = RESULTS_SCHEMA, name
+
+    # Drop result tables no live handle reads any more
+    def prune_results(self):
+        shown = {handle.table for handle in list(self.result_handles) if handle.schema == RESULTS_SCHEMA}
+        with self.lock:
+            names = [row[0] for row in self.conn.execute(f"SELECT name FROM {RESULTS_SCHEMA}.sqlite_master WHERE type = 'table'")]
+            for name in names:
+                if name not in shown:
+                    self.conn.execute(f'DROP TABLE {RESULTS_SCHEMA}."{name}"')
+            self.conn.commit()
+
+    # Rewrite a statement to use the base store's precomputed indexes (same result, less work)
+    def use_indexes(self, q):
+        if self.base is None:
+            return q
+        if self.base.code_set_bits:
+            # A session table shadowing a code set keeps its subqueries as written
+            bits = {name: bit for name, bit in self.base.code_set_bits.items() if not self.has_session_table(name)}
+            q = rewrite_code_set_membership(q, bits, f"{BASE_SCHEMA}.{CODE_SET_INDEX}")
+        prefix = prefix_filter(q) if self.base.prefix_indexes else None
+        if prefix is not None:
+            table_name, column, prefixes, where_at = prefix
+            index = self.base.prefix_indexes.get((table_name.lower(), column))
+            if index is not None and not self.has_session_table(table_name):
+                # Matching rowids come from the index; SQLite then fetches just those rows, in table order
+                matches = self.load_prefix_matches(index.search(prefixes))
+                q = q[:where_at] + f'rowid IN (SELECT row_id FROM temp."{matches}")'
+        # Natural joins of two base tables read the shared table holding the join's rows
+        joins = [
+            (left, right) for left, right in natural_joins(q)
+            if all(self.base.has_table(name) and not self.has_session_table(name) for name in (left, right))
+        ]
+        if joins:
+            columns = referenced_base_columns(q, {name: self.base.available_columns[self.base.table_name(name)] for pair in joins for name in pair})
+            joined = {}
+            for left, right in joins:
+                name = self.base.natural_join(left, right, columns.get(left, []) + columns.get(right, []))
+                if name is not None:
+                    joined[(left.lower(), right.lower())] = f'{BASE_SCHEMA}."{name}"'
+            if joined:
+                q = rewrite_natural_joins(q, joined)
+        return q
+
+    # Columns of a session or base table (loaded or not); None for names that are not tables
+    def known_columns(self, name):
+        if self.has_session_table(name):
+            return self.columns(name)
+        if self.base is not None and self.base.has_table(name):
+            return self.base.available_columns[self.base.table_name(name)]
+        return None
+
+    # Lowercase names of the columns a statement subtracts as dates that really hold dates, for
+    # sqlite_dialect. Base tables parse every column named as a date on load; a session table's
+    # column counts when its values are ISO dates.
+    def date_columns(self, q):
+        wanted = date_difference_columns(q)
+        if not wanted:
+            return set()
+        tables = statement_tables(q)
+        found = set()
+        with self.lock:
+            for name in tables["reads"] | tables["writes"]:
+                for col in self.known_columns(name) or []:
+                    if col.lower() not in wanted or col.lower() in found:
+                        continue
+                    if not self.has_session_table(name):
+                        found.add(col.lower())
+                        continue
+                    value = self.conn.execute(f'SELECT "{col}" FROM "{name}" WHERE "{col}" IS NOT NULL LIMIT 1').fetchone()
+                    if value is not None and isinstance(value[0], str) and ISO_DATE_PATTERN.match(value[0]):
+                        found.add(col.lower())
+        return found
+
+    # Get a statement ready to run: turn NOT EXISTS lookups into anti-joins, reuse derived columns it
+    # would recompute, rewrite it for the precomputed indexes, load the base columns it needs and index
+    # the keys it would otherwise look up by scanning. Its query plan is kept in last_plan when
+    # query_plans_enabled().
+    def prepare(self, q):
+        q = decorrelate_not_exists(q, self.known_columns)
+        q_reused, reused = self.reuse_derived_columns(q)
+        q_indexed = self.use_indexes(q_reused)
+        self.load_base_columns(q_indexed)
+        indexes = self.create_indexes(q_indexed)
+        plan = self.query_plan(q_indexed) if query_plans_enabled() else []
+        self.last_plan = {"plan": plan, "indexes": indexes, "reused": reused}
+        return q_indexed
+
+    # --- Reusing Built Tables ---
+
+    # Remember the SELECT a session table was just built from (the table must hold exactly its rows).
+    # Derived columns of a row-local SELECT over one session table are remembered too, when every
+    # column their expression reads is copied into the table unchanged.
+    def record_created(self, name, select_sql):
+        key = self.statement_key(select_sql)
+        fingerprint = self.table_fingerprint(name)
+        if key is None or fingerprint is None:
+            return
+        self.created_from[name.lower()] = (key, fingerprint)
+        derived = derived_columns(select_sql)
+        if derived is None or not self.has_session_table(derived[0]):
+            return
+        source, copied, expressions = derived
+        source_columns = {col.lower() for col in self.columns(source)}
+        reusable = []
+        for expression, column in expressions:
+            tokens = sql_tokens(expression)
+            used = {token.lower() for token in tokens} & source_columns
+            if used and (copied is None or used <= copied) and "." not in tokens \
+                    and not UNTOKENIZED_PATTERN.search(expression) and is_atomic_expression(tokens):
+                reusable.append((tokens, column))
+        if reusable:
+            self.derived_columns[name.lower()] = (fingerprint, reusable)
+
+    # Session table built by exactly this SELECT and unchanged since, if there is one
+    def served_table(self, q):
+        key = self.statement_key(q)
+        if key is None:
+            return None
+        for name, (select_key, fingerprint) in self.created_from.items():
+            if select_key == key and self.table_fingerprint(name) == fingerprint:
+                return name
+        return None
+
+    # In a SELECT (or the SELECT of a CREATE TABLE ... AS) reading only a table with remembered derived
+    # columns, replace each of their expressions by the column holding its value, so it is not evaluated
+    # again for every row. Expressions are matched outside string literals and comments.
+    # Returns the statement and the [table, column] pairs reused.
+    def reuse_derived_columns(self, q):
+        select_at = select_query_start(mask_literals(q))
+        reads = {name.lower() for name in statement_tables(q)["reads"]}
+        if select_at is None or len(reads) != 1:
+            return q, []
+        name = next(iter(reads))
+        fingerprint, expressions = self.derived_columns.get(name, (None, []))
+        if fingerprint is None or self.table_fingerprint(name) != fingerprint:
+            return q, []
+        reused = []
+        for tokens, column in expressions:
+            pattern = re.compile(r"(?<![\w$.])" + r"\s*".join(map(re.escape, tokens)) + r"(?![\w$])", re.IGNORECASE)
+            matches = list(pattern.finditer(mask_literals(q), select_at))
+            for match in reversed(matches):
+                q = q[:match.start()] + f'"{column}"' + q[match.end():]
+            if matches:
+                reused.append([name, column])
+        return q, reused
+
+    # SQLite's plan for a statement as (id, parent id, detail) rows; empty for statements without one
+    def plan_rows(self, q):
+        with self.lock:
+            try:
+                return [(row[0], row[1], row[3]) for row in self.conn.execute(f"EXPLAIN QUERY PLAN {q}")]
+            except sqlite3.Error:
+                return []
+
+    # The plan as indented lines for the Messages tab
+    def query_plan(self, q):
+        depth = {0: -1}
+        lines = []
+        for node_id, parent, detail in self.plan_rows(q):
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node_id] + detail)
+        return lines
+
+    # Create lasting indexes on the keys the plan looks rows up by: columns SQLite would build a
+    # throwaway automatic index on, and the join keys of tables scanned in full inside a correlated
+    # subquery (once per outer row). Returns the (table, columns) pairs indexed.
+    def create_indexes(self, q):
+        rows = self.plan_rows(q)
+        if not rows:
+            return []
+        parents = {node_id: (parent, detail) for node_id, parent, detail in rows}
+        aliases = table_aliases(q)
+        keys = equality_keys(q)
+        wanted = []
+        for node_id, parent, detail in rows:
+            match = AUTOMATIC_INDEX_PATTERN.match(detail)
+            if match:
+                columns = tuple(re.match(r"\w+", term).group(0) for term in match.group(2).split(" AND "))
+                wanted.append((match.group(1), columns))
+                continue
+            match = TABLE_SCAN_PATTERN.match(detail)
+            if match and self.is_correlated(parent, parents):
+                wanted += [(match.group(1), columns) for columns in sorted(keys.get(match.group(1).lower(), ()))]
+        created = []
+        for alias, columns in wanted:
+            table_name = aliases.get(alias.lower(), alias)
+            if (table_name, columns) not in created and self.create_index(table_name, columns):
+                created.append((table_name, columns))
+        return created
+
+    # Whether a plan step runs inside a correlated subquery
+    def is_correlated(self, node_id, parents):
+        while node_id in parents:
+            node_id, detail = parents[node_id]
+            if detail.startswith("CORRELATED"):
+                return True
+        return False
+
+    # Index columns of a session or base table, unless the table is small or the index exists.
+    # Base table indexes are built in the shared store, so every session uses them.
+    def create_index(self, table_name, columns):
+        schema = self.table_schema(table_name)
+        if schema is None:
+            if self.base is not None and self.base.has_table(table_name):
+                return self.base.create_index(table_name, columns, INDEX_MIN_ROWS)
+            return False
+        table_columns = {col.lower() for col in self.columns(table_name, schema)}
+        if not {col.lower() for col in columns} <= table_columns or self.row_count(table_name) < INDEX_MIN_ROWS:
+            return False
+        index_name = f"auto_{table_name}_{'_'.join(columns)}".lower()
+        with self.lock:
+            exists = self.conn.execute(
+                f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'index' AND name = ?", (index_name,)
+            ).fetchone()
+            if exists:
+                return False
+            column_list = ", ".join(f'"{col}"' for col in columns)
+            self.conn.execute(f'CREATE INDEX {schema}."{index_name}" ON "{table_name}" ({column_list})')
+            self.conn.commit()
+        return True
+
+    # Hold the rowids found by a prefix search in a temp table of the statement being prepared, named so
+    # no session table can collide with it; returns its name
+    def load_prefix_matches(self, rowids):
+        name = f"{PREFIX_MATCHES_PREFIX}{uuid.uuid4().hex}"
+        with self.lock:
+            self.conn.execute(f'CREATE TEMP TABLE "{name}" (row_id INTEGER PRIMARY KEY)')
+            self.conn.executemany(f'INSERT INTO temp."{name}" VALUES (?)', ((int(rowid),) for rowid in rowids))
+            self.prefix_matches.append(name)
+        return name
+
+    # Drop the statement's prefix matches once it has run, so they never show up as a session table
+    def drop_prefix_matches(self):
+        with self.lock:
+            for name in self.prefix_matches:
+                self.conn.execute(f'DROP TABLE IF EXISTS temp."{name}"')
+            self.prefix_matches = []
+
+    # Rows of a base table whose column starts with any of the prefixes (ASCII case-insensitive),
+    # answered from the column's PrefixIndex when one was built; returns a ResultHandle
+    def search_prefixes(self, table_name, column, prefixes, columns=None, transform=None):
+        select_list = ", ".join(f'"{col}"' for col in columns) if columns else "*"
+        terms = " OR ".join(f"LOWER({column}) LIKE LOWER('{prefix.replace(chr(39), chr(39) * 2)}%')" for prefix in prefixes)
+        return self.result(f"SELECT {select_list} FROM {table_name} WHERE {terms}", transform)
+
+    # Whether a CREATE statement makes a TEMP table
+    def is_temp_create(self, q):
+        tokens = [token.lower() for token in sql_tokens(q)[:3]]
+        return "temp" in tokens or "temporary" in tokens
+
+    # Serialize one table into a standalone SQLite database, keeping its column types and values exactly
+    def snapshot_table(self, name, schema=None):
+        source = f'{schema}."{name}"' if schema else f'"{name}"'
+        with self.lock:
+            self.conn.execute(f"ATTACH DATABASE ':memory:' AS {SNAPSHOT_SCHEMA}")
+            try:
+                self.conn.execute(f'CREATE TABLE {SNAPSHOT_SCHEMA}.result AS SELECT * FROM {source}')
+                self.conn.commit()
+                return self.conn.serialize(name=SNAPSHOT_SCHEMA)
+            finally:
+                self.conn.execute(f"DETACH DATABASE {SNAPSHOT_SCHEMA}")
+
+    # Recreate a table from a snapshot_table() result (in the given schema when one is named)
+    def restore_table(self, name, snapshot, temp=False, schema=None):
+        target = f'{schema}."{name}"' if schema else f'"{name}"'
+        with self.lock:
+            self.conn.execute(f"ATTACH DATABASE ':memory:' AS {SNAPSHOT_SCHEMA}")
+            try:
+                self.conn.deserialize(snapshot, name=SNAPSHOT_SCHEMA)
+                self.conn.execute(f"DROP TABLE IF EXISTS {target}")
+                self.conn.execute(f'CREATE {"TEMP " if temp else ""}TABLE {target} AS SELECT * FROM {SNAPSHOT_SCHEMA}.result')
+                self.conn.commit()
+            finally:
+                self.conn.execute(f"DETACH DATABASE {SNAPSHOT_SCHEMA}")
+
+    # Append the rows of a snapshot_table() result to a table, creating the table when it does not exist
+    def append_table(self, name, snapshot, temp=False):
+        with self.lock:
+            self.preserve_results([name])
+            self.conn.execute(f"ATTACH DATABASE ':memory:' AS {SNAPSHOT_SCHEMA}")
+            try:
+                self.conn.deserialize(snapshot, name=SNAPSHOT_SCHEMA)
+                added = self.conn.execute(f"SELECT COUNT(*) FROM {SNAPSHOT_SCHEMA}.result").fetchone()[0]
+                if self.has_session_table(name):
+                    self.conn.execute(f'INSERT INTO "{name}" SELECT * FROM {SNAPSHOT_SCHEMA}.result')
+                    count = self.table_rows.get(name.lower())
+                else:
+                    self.conn.execute(f'CREATE {"TEMP " if temp else ""}TABLE "{name}" AS SELECT * FROM {SNAPSHOT_SCHEMA}.result')
+                    count = 0
+                self.conn.commit()
+                if count is None:
+                    self.table_rows.pop(name.lower(), None)
+                else:
+                    self.table_rows[name.lower()] = count + added
+            finally:
+                self.conn.execute(f"DETACH DATABASE {SNAPSHOT_SCHEMA}")
+        # The table's contents no longer match a fingerprint of how it was built
+        self.fingerprints.pop(name.lower(), None)
+
+    # Materialize a whole table as a DataFrame
+    def read_table(self, name):
+        return self.query(f'SELECT * FROM "{name}"')
+
+    # Replace the contents of a table with a DataFrame
+    def write_table(self, name, df):
+        self.register(name, df)
+
+    # --- Export ---
+
+    # Arrow type of each column of a session table, from the SQLite storage classes its values use:
+    # only integers -> int64, integers and reals -> float64, blobs -> binary, anything else -> string
+    def arrow_schema(self, name):
+        columns = self.columns(name)
+        select_list = ", ".join(f'group_concat(DISTINCT typeof("{col}"))' for col in columns)
+        with self.lock:
+            storage = self.conn.execute(f'SELECT {select_list} FROM "{name}"').fetchone() if columns else []
+        fields = []
+        for col, classes in zip(columns, storage):
+            classes = set((classes or "null").split(",")) - {"null"}
+            if classes == {"integer"}:
+                fields.append(pa.field(col, pa.int64()))
+            elif classes and classes <= {"integer", "real"}:
+                fields.append(pa.field(col, pa.float64()))
+            elif classes == {"blob"}:
+                fields.append(pa.field(col, pa.binary()))
+            else:
+                fields.append(pa.field(col, pa.string()))
+        return pa.schema(fields)
+
+    # A session table's rows as Arrow record batches of the arrow_schema() types, so tables of any
+    # size can be written out without holding them in memory
+    def arrow_batches(self, name, batch_rows=EXPORT_BATCH_ROWS):
+        schema = self.arrow_schema(name)
+        select_list = ", ".join(f'"{field.name}"' for field in schema)
+        with self.lock:
+            cursor = self.conn.execute(f'SELECT {select_list} FROM "{name}"')
+            while True:
+                rows = cursor.fetchmany(batch_rows)
+                if not rows:
+                    break
+                arrays = []
+                for field, values in zip(schema, zip(*rows)):
+                    if pa.types.is_string(field.type):
+                        # Text columns can hold numbers too; they are written as their text form
+                        values = [value if value is None or isinstance(value, str) else str(value) for value in values]
+                    arrays.append(pa.array(values, field.type))
+                yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    # --- Worker Engines ---
+
+    # A worker engine for running a step alongside other steps: a connection of its own holding private
+    # copies of the given session tables (attached as INPUTS_SCHEMA). Base tables are read from the
+    # in-memory store through the worker's own connection to it, as every session reads them.
+    def fork(self, tables):
+        worker = SQLEngine(base=self.base)
+        names = [name for name in tables if self.has_session_table(name)]
+        if names:
+            with self.lock:
+                self.conn.execute(f"ATTACH DATABASE ':memory:' AS {SNAPSHOT_SCHEMA}")
+                try:
+                    for name in names:
+                        self.conn.execute(f'CREATE TABLE {SNAPSHOT_SCHEMA}."{name}" AS SELECT * FROM "{name}"')
+                    self.conn.commit()
+                    snapshot = self.conn.serialize(name=SNAPSHOT_SCHEMA)
+                finally:
+                    self.conn.execute(f"DETACH DATABASE {SNAPSHOT_SCHEMA}")
+            worker.conn.execute(f"ATTACH DATABASE ':memory:' AS {INPUTS_SCHEMA}")
+            worker.conn.deserialize(snapshot, name=INPUTS_SCHEMA)
+            worker.schemas.append(INPUTS_SCHEMA)
+        worker.fingerprints = {name.lower(): self.fingerprints[name.lower()] for name in names if name.lower() in self.fingerprints}
+        worker.table_rows = {name.lower(): self.table_rows[name.lower()] for name in names if name.lower() in self.table_rows}
+        return worker
+
+    # Copy a worker's final version of each given table into this session; tables the worker
+    # no longer has are dropped here too. Copied inputs keep the TEMP-ness they had in the session.
+    def adopt(self, worker, tables):
+        self.preserve_results(tables)
+        for name in tables:
+            worker_schema = worker.table_schema(name)
+            if worker_schema is None:
+                if self.has_session_table(name):
+                    with self.lock:
+                        self.conn.execute(f'DROP TABLE "{name}"')
+                        self.conn.commit()
+                self.fingerprints.pop(name.lower(), None)
+                self.table_rows.pop(name.lower(), None)
+                continue
+            temp = self.table_schema(name) == "temp" if worker_schema == INPUTS_SCHEMA else worker_schema == "temp"
+            self.restore_table(name, worker.snapshot_table(name), temp=temp)
+            fingerprint = worker.fingerprints.get(name.lower())
+            if fingerprint is None:
+                self.fingerprints.pop(name.lower(), None)
+            else:
+                self.fingerprints[name.lower()] = fingerprint
+            if name.lower() in worker.table_rows:
+                self.table_rows[name.lower()] = worker.table_rows[name.lower()]
+            else:
+                self.table_rows.pop(name.lower(), None)
+        # Result handles made on the worker now read from this session; rows it had to store are copied over
+        for handle in list(worker.result_handles):
+            if handle.schema == RESULTS_SCHEMA:
+                name = f"result_{next(self.result_ids)}"
+                self.restore_table(name, worker.snapshot_table(handle.table, RESULTS_SCHEMA), schema=RESULTS_SCHEMA)
+                handle.table = name
+            handle.engine = self
+            self.result_handles.add(handle)
+
+    # Release the engine's connection (worker engines are closed once their step is adopted, together
+    # with their private base tables)
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # Bytes held by this session's own tables (the attached base tables are not counted)
+    def session_bytes(self):
+        with self.lock:
+            total = 0
+            for schema in ["main", "temp", RESULTS_SCHEMA]:
+                page_count = self.conn.execute(f"PRAGMA {schema}.page_count").fetchone()[0]
+                page_size = self.conn.execute(f"PRAGMA {schema}.page_size").fetchone()[0]
+                total += page_count * page_size
+        return total
+
+# --- In-Place Data Changes ---
+
+# Run a DELETE, UPDATE or ALTER TABLE statement in place inside the engine and describe the outcome
+def run_dml(engine, q):
+    kind = q.split()[0].upper()
+    table_name = next(iter(statement_tables(q)["writes"]), "")
+    try:
+        rowcount = engine.execute(q)
+    except sqlite3.Error as e:
+        return f"Warning: {kind} failed in the SQL engine: {e}"
+    if kind == "DELETE":
+        return f"✅ DELETE complete: Deleted {rowcount} rows from {table_name}."
+    if kind == "UPDATE":
+        return f"📝 UPDATE complete: Updated {rowcount} rows in {table_name}."
+    return f"📝 ALTER TABLE complete: Altered {table_name}."
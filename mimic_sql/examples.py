@@ -0,0 +1,702 @@
+import pandas as pd
+from mimic_sql.data_store import BaseTableStore, parse_time_columns, remove_whitespace
+from mimic_sql.streaming import stream_row_threshold
+
+# Data directories of the disease and drug examples
+DISEASE_DATA_DIR = "MIMIC_IV_data/diseases_data"
+DRUG_DATA_DIR = "MIMIC_IV_data/drugs_data"
+
+# Disease steps 0-12 test single base tables; steps 13-35 are the cohort pipeline
+DISEASE_TABLE_TEST_STEPS = range(0, 13)
+DISEASE_PIPELINE_STEPS = range(13, 36)
+
+# Drug step 0 tests the prescriptions table; steps 1-7 are the pipeline
+DRUG_PIPELINE_STEPS = range(1, 8)
+
+# Engine name of the prescriptions table, whose drug column gets a prefix index
+PRESCRIPTIONS_TABLE = "mimiciv_hosp_dot_prescriptions"
+
+# --- Table Names ---
+
+# Engine name of a disease table file (mimiciv_hosp.admissions -> mimiciv_hosp_admissions)
+def disease_table_alias(name):
+    return name.replace(".", "_")
+
+# Engine name of a drug table file (mimiciv_hosp.prescriptions -> mimiciv_hosp_dot_prescriptions)
+def drug_table_alias(name):
+    return name.replace(".", "_dot_")
+
+# --- Base Table Stores ---
+
+# Prepare loaded disease base columns: strip whitespace and parse date/time columns.
+# Arrow files written by `python -m mimic_sql.ingest` are already prepared and skip this.
+def prepare_disease_table(df):
+    return parse_time_columns(remove_whitespace(df))
+
+# Add (table name, source) pairs to a store under their engine names; a source is a .pkl or
+# Arrow file path, or an already loaded DataFrame
+def add_tables(store, tables, alias):
+    for original_table_name, source in tables:
+        if isinstance(source, pd.DataFrame):
+            store.register(alias(original_table_name), source)
+        else:
+            store.add_table(alias(original_table_name), source)
+    return store
+
+# Shared store of the disease base tables
+def build_disease_store(tables):
+    store = add_tables(BaseTableStore(transform=prepare_disease_table), tables, disease_table_alias)
+    # Tag ICD codes with the code sets containing them, for the comorbidity step's membership tests
+    store.build_code_set_index()
+    return store
+
+# Shared store of the drug base tables
+def build_drug_store(tables):
+    store = add_tables(BaseTableStore(), tables, drug_table_alias)
+    # Drug-name prefix searches (Step 1 and the drug search box) are answered from this index.
+    # Prescriptions big enough to be streamed are left on disk, so they get no index.
+    source = store.arrow_sources.get(PRESCRIPTIONS_TABLE)
+    if source is None or source.num_rows <= stream_row_threshold():
+        store.build_prefix_index(PRESCRIPTIONS_TABLE, "drug")
+    return store
+
+# --- Disease Steps ---
+
+# Name, description and default SQL of every disease step
+DISEASE_QUERY_NAMES = [
+    "SQL statement for the admissions table",
+    "SQL statement for the diagnoses_icd table",
+    "SQL statement for the patients table",
+    "SQL statement for the diagnosis table",
+    "SQL statement for the edstays table",
+    "SQL statement for the diabetes_icd_codes table",
+    "SQL statement for the heart_type_disease_icd_codes table",
+    "SQL statement for the hemorrhagic_stroke_icd_codes table",
+    "SQL statement for the hyperlipidemia_icd_codes table",
+    "SQL statement for the hypertension_icd_codes table",
+    "SQL statement for the ischemic_stroke_icd_codes table",
+    "SQL statement for the neurological_type_disease_icd_codes table",
+    "SQL statement for the psychosis_icd_codes table",
+    "Step 1",
+    "Step 2",
+    "Step 3",
+    "Step 4",
+    "Step 5",
+    "Step 6",
+    "Step 7",
+    "Step 8",
+    "Step 9",
+    "Step 10",
+    "Step 11",
+    "Step 12",
+    "Step 13",
+    "Step 14",
+    "Step 15",
+    "Step 16",
+    "Step 17",
+    "Step 18",
+    "Step 19",
+    "Step 20",
+    "Step 21",
+    "Step 22",
+    "Step 23"
+]
+
+DISEASE_QUERY_SUBTITLES = [
+    # SQL Step One.
+    """Use NATURAL JOIN to combine hosp (diagnoses_icd, admissions). 
+        &#35; Produces the complete hosp table (IDs not deduplicated).""",
+    # SQL Step Two.
+    "Use DISTINCT to filter out duplicate subject_id. # Save hosp's subject_id to temp_two (extract required IDs).",
+    # SQL Step Three.
+    "Use NATURAL JOIN to combine ed (diagnosis, edstays). # Produces the complete ed table (IDs not deduplicated).",
+    # SQL Step Four.
+    """Use subject_id from temp_two (hosp) as a query condition for temp_three (ed). 
+        &#35; Find in ed those with the same subject_id as in hosp.""",
+    # SQL Step Five.
+    """Use UNION ALL to merge temp_one (hosp) + temp_four (ed). 
+        &#35; Produces the complete combined hosp + ed table (IDs not deduplicated).""",
+    # SQL Step Six.
+    """1.Use psychosis_icd_codes to query temp_five (case) for records of patients with psychosis.
+            \n2.Use GROUP BY subject_id to group records, ensuring no duplicate subject_id.
+            \n3.Use MIN(admit_date) to find the earliest admission date.""",
+    # SQL Step Seven.
+    """1.Use GROUP BY subject_id to group records, ensuring no duplicate subject_id.
+            \n2.Use MIN(admit_date) to find the earliest admission date.
+            \n3.Execute a DELETE FROM command to expunge all patient records related to psychiatric disorders.""",
+    # SQL Step Eight.
+    """1.Use SELECT *, 'TRUE' AS with_psychosis to add a with_psychosis column with value TRUE (for case group).
+            \n2.Use SELECT *, 'FALSE' AS with_psychosis to add a with_psychosis column with value FALSE (for control group).
+            \n3.Use UNION ALL to combine hosp + ed.""",
+    # SQL Step Nine.
+    """1.Use GROUP BY subject_id to group records, ensuring no duplicate subject_id.
+            \n2.Use MAX(admit_date) to find the last admission date.
+            \n3.Use DELETE FROM to remove records where psychosis is TRUE
+            and the earliest admission date equals the last admission date.""",
+    # SQL Step Ten.
+    """1.Use ischemic_stroke_icd_codes to query temp_five (entire) for records of patients with ischemic stroke.
+            \n2.Use GROUP BY subject_id to group records, ensuring no duplicate subject_id.
+            \n3.Use MIN(admit_date) to find the earliest admission date.""",
+    # SQL Step Eleven.
+    """1.Create table temp_eleven by importing data from temp_nine using CREATE TABLE.
+            \n2.Use DELETE FROM temp_nine to remove records where the earliest hospital admission date equals
+            the ischemic stroke earliest hospital admission date.""",
+    # SQL Step Twelve.
+    """1.Use the ID column from temp_eleven to fetch records from temp_ten with matching IDs 
+            and where the event date (first occurrence) is closest to the earliest admission date.
+            \n2.Use LEFT JOIN to retain all records from temp_eleven; if there is no corresponding event_date, display as NULL.""",
+    # SQL Step Thirteen.
+    "Check if the event_date column is NULL; if not NULL, set the new column E to TRUE, otherwise FALSE.",
+    # SQL Step Fourteen.
+    """1.For records in temp_thirteen where event_date is NULL, fill in with the patient's death date.
+            \n2.Use UPDATE to change the event_date in temp_fourteen from NULL to the patients' death_date.""",
+    # SQL Step Fifteen.
+    """1.Create table temp_fifteen containing the latest admission year for each subject_id.
+            \n2.Use UNION ALL to combine hosp + ed.
+            \n3.Use GROUP BY subject_id to group records, ensuring no duplicate subject_id.""",
+    # SQL Step Sixteen.
+    """1.Create table temp_sixteen to read all records from temp_fourteen.
+            \n2.Use UPDATE to set the event_date in temp_sixteen (where it is NULL) to last_year/12/31.""",
+    # SQL Step Seventeen.
+    """1.Create table temp_seventeen to read all records from temp_sixteen.
+            \n2.Use a subquery to calculate gender (male = 1, female = 0) by matching subject_id.
+            \n3.Use a subquery to calculate age (based on index_date) by matching subject_id.""",
+    # SQL Step Eighteen.
+    """1.Create table temp_eighteen to read all records from temp_seventeen.
+            \n2.Delete entire rows from the control group (with_psychosis = FALSE) 
+            that do not have a matching gender and age in the case group (with_psychosis = TRUE).""",
+    # SQL Step Nineteen.
+    """1.Create table temp_nineteen to read all records from temp_eighteen.
+            \n2.Use ALTER TABLE to modify the structure of the existing temp_nineteen table (add column T).
+            \n3.Use UPDATE to update the T column in temp_nineteen.""",
+    # SQL Step Twenty.
+    """1.Create table temp_twenty to read all records from temp_nineteen.
+            \n2.Use DELETE to remove records from temp_twenty where the T column is less than or equal to 0.""",
+    # SQL Step Twenty-One.
+    """1.Drop the existing temp_twenty_one table (if any) and create a new temporary table temp_twenty_one
+            to store subject_id, admit_date (as DATE), icd_code and icd_version from both the hospital and ED sources.
+            \n2.Use UNION ALL to vertically merge the two result-sets: one from mimiciv_hosp.diagnoses_icd
+            joined with mimiciv_hosp.admissions, and one from mimic_ed.diagnosis joined with mimic_ed.edstays.
+            \n3.Finally, select all rows from the newly created temp_twenty_one to verify its contents.""",
+    # SQL Step Twenty-Two.
+    """1.Create table temp_twenty_two by reading from temp_twenty_one and performing a new SELECT query.
+            \n2.Use LEFT JOIN on subject_id so that every patient in temp_twenty is retained.
+            \n3.For each disease category, first apply an inner CASE that returns 1 whenever a diagnosis’s admit_date
+            falls between the patient’s index_date and event_date and the icd_code belongs to that category, otherwise 0.
+            \n4.Wrap each of those inner cases in SUM(…) to count how many times each patient met that disease condition,
+            and surround the SUM in COALESCE(…, 0) to turn any NULL (i.e. no matching rows) into 0.
+            \n5.Classify disease presence per patient using(CASE WHEN the count of matching diagnoses > 0 THEN 'TRUE' ELSE 'FALSE' END),
+            where 'TRUE' explicitly means that at least one diagnosis occurred between the patient’s index_date and event_date.
+            \n6.Repeat steps 3–5 for each of the hypertension, heart‑type, neurological, diabetes, and hyperlipidemia ICD code sets.
+            \n7.Group all aggregated results by t.subject_id so that each row represents one patient.""",
+    # SQL Step Twenty-Three.
+    """1.Create table temp_twenty_three to store the merged data from temp_twenty and temp_twenty_two.
+            \n2.Use LEFT JOIN to merge temp_twenty and temp_twenty_two based on subject_id."""
+]
+
+DISEASE_QUERIES = [
+    "SELECT subject_id, admittime FROM mimiciv_hosp.admissions;",
+    "SELECT subject_id, seq_num, icd_code, icd_version FROM mimiciv_hosp.diagnoses_icd;",
+    "SELECT subject_id, gender, anchor_age, anchor_year, dod FROM mimiciv_hosp.patients;",
+    "SELECT subject_id, seq_num, icd_code, icd_version FROM mimic_ed.diagnosis;",
+    "SELECT subject_id, intime FROM mimic_ed.edstays;",
+    "SELECT icd_code, icd_version FROM diabetes_icd_codes;",
+    "SELECT icd_code, icd_version FROM heart_type_disease_icd_codes;",
+    "SELECT icd_code, icd_version FROM hemorrhagic_stroke_icd_codes;",
+    "SELECT icd_code, icd_version FROM hyperlipidemia_icd_codes;",
+    "SELECT icd_code, icd_version FROM hypertension_icd_codes;",
+    "SELECT icd_code, icd_version FROM ischemic_stroke_icd_codes;",
+    "SELECT icd_code, icd_version FROM neurological_type_disease_icd_codes;",
+    "SELECT icd_code, icd_version FROM psychosis_icd_codes;",
+    # SQL Step One
+    f"""DROP TABLE IF EXISTS temp_one;
+CREATE TEMP TABLE temp_one AS
+SELECT subject_id, DATE(admittime) AS admit_date, icd_code, icd_version
+FROM mimiciv_hosp.diagnoses_icd
+NATURAL JOIN mimiciv_hosp.admissions;
+SELECT * FROM temp_one;""",
+    # SQL Step Two
+    f"""DROP TABLE IF EXISTS temp_two;
+CREATE TEMP TABLE temp_two AS
+SELECT DISTINCT subject_id
+FROM temp_one;
+SELECT * FROM temp_two;""",
+    # SQL Step Three
+    f"""DROP TABLE IF EXISTS temp_three;
+CREATE TEMP TABLE temp_three AS
+SELECT subject_id, DATE(intime) AS admit_date, icd_code, icd_version
+FROM mimic_ed.diagnosis
+NATURAL JOIN mimic_ed.edstays;
+SELECT * FROM temp_three;""",
+    # SQL Step Four
+    f"""DROP TABLE IF EXISTS temp_four;
+CREATE TABLE temp_four AS
+SELECT * FROM temp_three
+WHERE subject_id IN (SELECT subject_id FROM temp_two);
+SELECT * FROM temp_four;""",
+    # SQL Step Five
+    f"""DROP TABLE IF EXISTS temp_five;
+CREATE TABLE temp_five AS
+SELECT * FROM temp_one
+UNION ALL
+SELECT * FROM temp_four;
+SELECT * FROM temp_five;""",
+    # SQL Step Six
+    f"""DROP TABLE IF EXISTS temp_six;
+CREATE TABLE temp_six AS
+SELECT subject_id, MIN(admit_date) AS index_date
+FROM (
+SELECT * FROM temp_five
+WHERE (icd_version = 10
+AND icd_code IN (SELECT icd_code FROM psychosis_icd_codes WHERE icd_version = 10))
+OR (icd_version = 9
+AND icd_code IN (SELECT icd_code FROM psychosis_icd_codes WHERE icd_version = 9))
+) AS all_diagnoses
+GROUP BY subject_id;
+SELECT * FROM temp_six;""",
+    # SQL Step Seven #pgadmin 4 SQL differences
+    f"""DROP TABLE IF EXISTS temp_seven;
+CREATE TABLE temp_seven AS
+SELECT subject_id, MIN(admit_date) AS index_date
+FROM temp_five
+GROUP BY subject_id;
+DELETE FROM temp_seven
+WHERE subject_id IN (SELECT subject_id FROM temp_six);
+DELETE FROM temp_seven
+WHERE subject_id IN (
+SELECT DISTINCT subject_id
+FROM temp_five
+WHERE (icd_version = 10
+AND icd_code IN (
+SELECT icd_code
+FROM all_psychiatric_disorders_icd_codes
+WHERE icd_version = 10))
+OR (icd_version = 9
+AND icd_code IN (
+SELECT icd_code
+FROM all_psychiatric_disorders_icd_codes
+WHERE icd_version = 9)));
+SELECT * FROM temp_seven;""",
+    # SQL Step Eight #pgadmin 4 SQL differences
+    f"""DROP TABLE IF EXISTS temp_eight;
+CREATE TEMP TABLE temp_eight AS
+SELECT *, 'TRUE' AS with_psychosis FROM temp_six
+UNION ALL
+SELECT *, 'FALSE' AS with_psychosis FROM temp_seven;
+SELECT * FROM temp_eight;""",
+    # SQL Step Nine #pgadmin 4 SQL differences
+    f"""DROP TABLE IF EXISTS temp_nine;
+CREATE TABLE temp_nine AS
+SELECT subject_id, MAX(admit_date) AS last_date
+FROM temp_five
+GROUP BY subject_id;
+DELETE FROM temp_eight
+WHERE subject_id IN (
+SELECT temp_eight.subject_id
+FROM temp_eight
+JOIN temp_nine 
+ON temp_eight.subject_id = temp_nine.subject_id
+WHERE temp_nine.last_date = temp_eight.index_date
+AND temp_eight.with_psychosis = 'TRUE');
+DROP TABLE IF EXISTS temp_nine;
+CREATE TABLE temp_nine AS
+SELECT * FROM temp_eight;
+SELECT * FROM temp_nine;""",
+    # SQL Step Ten
+    f"""DROP TABLE IF EXISTS temp_ten;
+CREATE TABLE temp_ten AS
+SELECT subject_id, MIN(admit_date) AS first_date_ischemic_stroke
+FROM (
+SELECT * FROM temp_five
+WHERE (icd_version = 10
+AND icd_code IN (SELECT icd_code FROM ischemic_stroke_icd_codes WHERE icd_version = 10))
+OR (icd_version = 9
+AND icd_code IN (SELECT icd_code FROM ischemic_stroke_icd_codes WHERE icd_version = 9))
+) AS all_diagnoses_first_date_ischemic_stroke
+GROUP BY subject_id;
+SELECT * FROM temp_ten;""",
+    # SQL Step Eleven
+    f"""DROP TABLE IF EXISTS temp_eleven;
+CREATE TABLE temp_eleven AS
+SELECT * FROM temp_nine;
+DELETE FROM temp_eleven
+WHERE subject_id IN (
+SELECT temp_eleven.subject_id
+FROM temp_eleven
+JOIN temp_ten 
+ON temp_eleven.subject_id = temp_ten.subject_id
+WHERE temp_ten.first_date_ischemic_stroke = temp_eleven.index_date);
+SELECT * FROM temp_eleven;""",
+    # SQL Step Twelve
+    f"""DROP TABLE IF EXISTS temp_twelve;
+CREATE TABLE temp_twelve AS
+SELECT 
+temp_eleven.subject_id,
+temp_eleven.with_psychosis,
+temp_eleven.index_date,
+IS_after_index_date.first_date_ischemic_stroke AS event_date
+FROM temp_eleven
+LEFT JOIN (
+SELECT 
+temp_ten.subject_id, 
+temp_ten.first_date_ischemic_stroke
+FROM temp_ten
+JOIN temp_eleven ON temp_ten.subject_id = temp_eleven.subject_id
+WHERE temp_ten.first_date_ischemic_stroke > temp_eleven.index_date
+) AS IS_after_index_date
+ON temp_eleven.subject_id = IS_after_index_date.subject_id;
+SELECT * FROM temp_twelve;""",
+    # SQL Step Thirteen
+    f"""DROP TABLE IF EXISTS temp_thirteen;
+CREATE TABLE temp_thirteen AS
+SELECT *, CASE 
+WHEN event_date IS NOT NULL THEN 'TRUE' 
+ELSE 'FALSE' END AS "E"
+FROM temp_twelve;
+SELECT * FROM temp_thirteen;""",
+    # SQL Step Fourteen
+    f"""DROP TABLE IF EXISTS temp_fourteen;
+CREATE TABLE temp_fourteen AS
+SELECT * FROM temp_thirteen;
+UPDATE temp_fourteen
+SET event_date = patients_death_date.death_date
+FROM (
+SELECT 
+mimiciv_hosp.patients.subject_id, 
+DATE(mimiciv_hosp.patients.dod) AS death_date
+FROM mimiciv_hosp.patients 
+WHERE mimiciv_hosp.patients.dod IS NOT NULL
+) patients_death_date
+WHERE temp_fourteen.subject_id = patients_death_date.subject_id
+AND temp_fourteen.event_date IS NULL;
+SELECT * FROM temp_fourteen;""",
+    # SQL Step Fifteen #pgadmin 4 SQL differences
+    f"""DROP TABLE IF EXISTS temp_fifteen;
+CREATE TABLE temp_fifteen AS
+SELECT 
+subject_id, 
+MAX(admit_year) AS admit_year
+FROM (
+SELECT subject_id, strftime('%Y', admittime) AS admit_year
+FROM mimiciv_hosp.diagnoses_icd NATURAL JOIN mimiciv_hosp.admissions
+UNION ALL
+SELECT 
+subject_id, 
+strftime('%Y', intime) AS admit_year
+FROM mimic_ed.diagnosis NATURAL JOIN mimic_ed.edstays
+) AS all_diagnoses
+GROUP BY subject_id;
+SELECT * FROM temp_fifteen;""",
+    # SQL Step Sixteen #pgadmin 4 SQL differences
+    f"""DROP TABLE IF EXISTS temp_sixteen;
+CREATE TABLE temp_sixteen AS
+SELECT * FROM temp_fourteen;
+UPDATE temp_sixteen
+SET event_date = (
+SELECT date(temp_fifteen.admit_year || '-12-31')
+FROM temp_fifteen
+WHERE temp_fifteen.subject_id = temp_sixteen.subject_id)
+WHERE event_date IS NULL;
+SELECT * FROM temp_sixteen;""",
+    # SQL Step Seventeen #pgadmin 4 SQL differences
+    f"""DROP TABLE IF EXISTS temp_seventeen;
+CREATE TABLE temp_seventeen AS
+SELECT temp_sixteen.*, (SELECT CASE WHEN patients.gender = 'M' THEN 1 ELSE 0 END
+FROM mimiciv_hosp.patients AS patients
+WHERE patients.subject_id = temp_sixteen.subject_id) AS gender,
+(SELECT (CAST(strftime('%Y', temp_sixteen.index_date) AS INTEGER) - (patients.anchor_year - patients.anchor_age))
+FROM mimiciv_hosp.patients AS patients
+WHERE patients.subject_id = temp_sixteen.subject_id) AS age
+FROM temp_sixteen;
+SELECT subject_id, gender, event_date, index_date, with_psychosis, "E", age
+FROM temp_seventeen;""",
+    # SQL Step Eighteen
+    f"""DROP TABLE IF EXISTS temp_eighteen;
+CREATE TABLE temp_eighteen AS
+SELECT * FROM temp_seventeen;
+DELETE FROM temp_eighteen
+WHERE with_psychosis = FALSE
+AND NOT EXISTS (
+SELECT 1
+FROM temp_eighteen temp_eighteen_case
+WHERE with_psychosis = TRUE
+AND temp_eighteen.gender = temp_eighteen_case.gender
+AND temp_eighteen.age = temp_eighteen_case.age);
+SELECT subject_id, gender, event_date, index_date, with_psychosis, "E", age 
+FROM temp_eighteen;""",
+    # SQL Step Nineteen - Update T column (if calculation fails, keep NA)
+    f"""DROP TABLE IF EXISTS temp_nineteen;
+CREATE TABLE temp_nineteen AS
+SELECT * FROM temp_eighteen;
+ALTER TABLE temp_nineteen
+ADD COLUMN "T" INTEGER;
+UPDATE temp_nineteen
+SET "T" = (event_date - index_date);
+SELECT subject_id, gender, event_date, index_date, with_psychosis, "E", age, "T"
+FROM temp_nineteen;""",
+    # SQL Step Twenty - Delete rows with T column value <= 0 #pgadmin 4 SQL differences
+    f"""DROP TABLE IF EXISTS temp_twenty;
+CREATE TABLE temp_twenty AS
+SELECT subject_id, gender, event_date, index_date, with_psychosis, "E", age, "T"
+FROM temp_nineteen;
+DELETE FROM temp_twenty
+WHERE T <= 0;
+SELECT * FROM temp_twenty;""",
+    # SQL Step Twenty-One
+    f"""DROP TABLE IF EXISTS temp_twenty_one;
+CREATE TEMP TABLE temp_twenty_one AS
+SELECT subject_id,DATE(admittime) AS admit_date,icd_code,icd_version
+FROM mimiciv_hosp.diagnoses_icd
+NATURAL JOIN mimiciv_hosp.admissions
+UNION ALL
+SELECT subject_id,DATE(intime) AS admit_date,icd_code,icd_version
+FROM mimic_ed.diagnosis
+NATURAL JOIN mimic_ed.edstays;
+SELECT * FROM temp_twenty_one;""",
+    # SQL Step Twenty-Two - Use WITH and LEFT JOIN to consolidate disease counts #pgadmin 4 SQL differences
+    f"""DROP TABLE IF EXISTS temp_twenty_two;
+CREATE TABLE temp_twenty_two AS
+SELECT t.subject_id,
+CASE WHEN SUM(CASE 
+WHEN d.admit_date BETWEEN t.index_date AND t.event_date
+AND d.icd_code IN (
+SELECT icd_code 
+FROM hypertension_icd_codes 
+WHERE icd_version = d.icd_version)
+THEN 1 ELSE 0 END) > 0
+THEN 'TRUE' ELSE 'FALSE'
+END AS with_hypertension,
+SUM(CASE 
+WHEN d.admit_date BETWEEN t.index_date AND t.event_date
+AND d.icd_code IN (
+SELECT icd_code 
+FROM hypertension_icd_codes 
+WHERE icd_version = d.icd_version)
+THEN 1 ELSE 0 END) AS hypertension_times,
+CASE WHEN SUM(CASE 
+WHEN d.admit_date BETWEEN t.index_date AND t.event_date
+AND d.icd_code IN (
+SELECT icd_code 
+FROM heart_type_disease_icd_codes 
+WHERE icd_version = d.icd_version)
+THEN 1 ELSE 0 END) > 0
+THEN 'TRUE' ELSE 'FALSE'
+END AS with_heart_type_disease,
+SUM(CASE 
+WHEN d.admit_date BETWEEN t.index_date AND t.event_date
+AND d.icd_code IN (
+SELECT icd_code 
+FROM heart_type_disease_icd_codes 
+WHERE icd_version = d.icd_version)
+THEN 1 ELSE 0 END) AS heart_type_disease_times,
+CASE WHEN SUM(CASE 
+WHEN d.admit_date BETWEEN t.index_date AND t.event_date
+AND d.icd_code IN (
+SELECT icd_code 
+FROM neurological_type_disease_icd_codes 
+WHERE icd_version = d.icd_version)
+THEN 1 ELSE 0 END) > 0
+THEN 'TRUE' ELSE 'FALSE'
+END AS with_neurological_type_disease,
+SUM(CASE WHEN d.admit_date BETWEEN t.index_date AND t.event_date
+AND d.icd_code IN (
+SELECT icd_code 
+FROM neurological_type_disease_icd_codes 
+WHERE icd_version = d.icd_version)
+THEN 1 ELSE 0 END) AS neurological_type_disease_times,
+CASE WHEN SUM(CASE 
+WHEN d.admit_date BETWEEN t.index_date AND t.event_date
+AND d.icd_code IN (
+SELECT icd_code 
+FROM diabetes_icd_codes 
+WHERE icd_version = d.icd_version)
+THEN 1 ELSE 0 END) > 0
+THEN 'TRUE' ELSE 'FALSE'
+END AS with_diabetes,
+SUM(CASE WHEN d.admit_date BETWEEN t.index_date AND t.event_date
+AND d.icd_code IN (
+SELECT icd_code 
+FROM diabetes_icd_codes 
+WHERE icd_version = d.icd_version)
+THEN 1 ELSE 0 END) AS diabetes_times,
+CASE WHEN SUM(CASE 
+WHEN d.admit_date BETWEEN t.index_date AND t.event_date
+AND d.icd_code IN (
+SELECT icd_code 
+FROM hyperlipidemia_icd_codes 
+WHERE icd_version = d.icd_version)
+THEN 1 ELSE 0 END) > 0
+THEN 'TRUE' ELSE 'FALSE'
+END AS with_hyperlipidemia,
+SUM(CASE WHEN d.admit_date BETWEEN t.index_date AND t.event_date
+AND d.icd_code IN (
+SELECT icd_code 
+FROM hyperlipidemia_icd_codes 
+WHERE icd_version = d.icd_version)
+THEN 1 ELSE 0 END) AS hyperlipidemia_times
+FROM temp_twenty AS t
+LEFT JOIN temp_twenty_one AS d
+ON t.subject_id = d.subject_id
+GROUP BY t.subject_id;
+SELECT * FROM temp_twenty_two;""",
+    # SQL Step Twenty-Three
+    f"""DROP TABLE IF EXISTS temp_twenty_three;
+CREATE TABLE temp_twenty_three AS
+SELECT
+temp_twenty.subject_id,
+temp_twenty.gender,
+temp_twenty.age,
+temp_twenty.with_psychosis,
+temp_twenty.index_date,
+temp_twenty.event_date,
+temp_twenty."T",
+temp_twenty."E",
+temp_twenty_two.with_hypertension,
+temp_twenty_two.with_heart_type_disease,
+temp_twenty_two.with_neurological_type_disease,
+temp_twenty_two.with_diabetes,
+temp_twenty_two.with_hyperlipidemia,
+temp_twenty_two.hypertension_times,
+temp_twenty_two.heart_type_disease_times,
+temp_twenty_two.neurological_type_disease_times,
+temp_twenty_two.diabetes_times,
+temp_twenty_two.hyperlipidemia_times
+FROM temp_twenty
+LEFT JOIN temp_twenty_two
+ON temp_twenty.subject_id = temp_twenty_two.subject_id;
+SELECT * FROM temp_twenty_three;"""
+]
+
+# --- Drug Steps ---
+
+# Name, description and default SQL of every drug step
+DRUG_QUERY_NAMES = [
+    "SQL Statement for the prescriptions table",  
+    "Step 1",
+    "Step 2",
+    "Step 3",
+    "Step 4",
+    "Step 5",
+    "Step 6",
+    "Step 7"
+]
+
+DRUG_QUERY_SUBTITLES = [
+    """Uniform casing for drug names and extended search for identical names
+        (Using the mimic_hosp.prescriptions table for querying).""",
+    "The drug unit is MG (using the table from Step 1 for querying).",
+    "The drug dose is not NULL (using the table from Step 2 for querying).",
+    "The start and end times of drug usage are not NULL (using the table from Step 3 for querying).",
+    """1.Add the hours_diff column to store the duration from the start to the end of drug usage (in hours).
+            \n2.Use ABS to ensure that the values in the hours_diff column are converted to absolute values,
+            preventing negative values (Using the table from Step 4 for querying).""",
+    "Change all 0 values in the hours_diff column to 1 (Using the table from Step 5 for querying).",
+    "Delete entire rows where the dose_val_rx column contains a value of 0 (Using the table from Step 6 for querying)."
+]
+
+DRUG_QUERIES = [
+    "SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime FROM mimiciv_hosp.prescriptions;",
+    """DROP TABLE IF EXISTS temp_one;
+CREATE TEMP TABLE temp_one AS
+SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime
+FROM mimiciv_hosp.prescriptions
+WHERE LOWER(drug) LIKE LOWER('aspirin%')
+OR LOWER(drug) LIKE LOWER('warfarin%')
+OR LOWER(drug) LIKE LOWER('clopidogrel%')
+OR LOWER(drug) LIKE LOWER('apixaban%')
+OR LOWER(drug) LIKE LOWER('rivaroxaban%')
+OR LOWER(drug) LIKE LOWER('dabigatran etexilate%')
+OR LOWER(drug) LIKE LOWER('cilostazol%')
+OR LOWER(drug) LIKE LOWER('enoxaparin%');
+SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime
+FROM temp_one;""",
+    """DROP TABLE IF EXISTS temp_two;
+CREATE TEMP TABLE temp_two AS
+SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime
+FROM temp_one
+WHERE dose_unit_rx = 'mg';
+SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime
+FROM temp_one
+WHERE dose_unit_rx = 'mg';""",
+    """DROP TABLE IF EXISTS temp_three;
+CREATE TEMP TABLE temp_three AS
+SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime
+FROM temp_two
+WHERE dose_val_rx IS NOT NULL;
+SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime
+FROM temp_two
+WHERE dose_val_rx IS NOT NULL;""",
+    """DROP TABLE IF EXISTS temp_four;
+CREATE TEMP TABLE temp_four AS
+SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime
+FROM temp_three
+WHERE (starttime IS NOT NULL AND stoptime IS NOT NULL);
+SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime
+FROM temp_three
+WHERE (starttime IS NOT NULL AND stoptime IS NOT NULL);""",
+    """DROP TABLE IF EXISTS temp_five;
+CREATE TEMP TABLE temp_five AS
+SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime,
+ABS((julianday(stoptime) - julianday(starttime)) * 24) AS hours_diff
+FROM temp_four;
+SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime,
+ABS((julianday(stoptime) - julianday(starttime)) * 24) AS hours_diff
+FROM temp_four;""",
+    """DROP TABLE IF EXISTS temp_six;
+CREATE TEMP TABLE temp_six AS
+SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime,
+CASE 
+WHEN ABS((julianday(stoptime) - julianday(starttime)) * 24) = 0 
+THEN 1 
+ELSE ABS((julianday(stoptime) - julianday(starttime)) * 24)
+END AS hours_diff
+FROM temp_five;
+SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime,
+CASE 
+WHEN ABS((julianday(stoptime) - julianday(starttime)) * 24) = 0 
+THEN 1 
+ELSE ABS((julianday(stoptime) - julianday(starttime)) * 24)
+END AS hours_diff
+FROM temp_five;""",
+    """DROP TABLE IF EXISTS temp_seven;
+CREATE TEMP TABLE temp_seven AS
+SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime, hours_diff
+FROM temp_six;
+DELETE FROM temp_seven
+WHERE dose_val_rx = '0';
+SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime, hours_diff
+FROM temp_seven;"""
+]
+
+# --- Pipelines ---
+
+# The example pipelines: where their tables live, how they are loaded, which steps run, the
+# table holding each pipeline's final output and the code sets a cohort run can swap out
+EXAMPLE_PIPELINES = {
+    "disease": {
+        "data_dir": DISEASE_DATA_DIR,
+        "build_store": build_disease_store,
+        "alias": disease_table_alias,
+        "queries": DISEASE_QUERIES,
+        "names": DISEASE_QUERY_NAMES,
+        "steps": DISEASE_PIPELINE_STEPS,
+        "output": "temp_twenty_three",
+        "stream_table": None,
+        "code_sets": {
+            "exposure": "psychosis_icd_codes",
+            "exclusion": "all_psychiatric_disorders_icd_codes",
+            "outcome": "ischemic_stroke_icd_codes",
+        },
+    },
+    "drug": {
+        "data_dir": DRUG_DATA_DIR,
+        "build_store": build_drug_store,
+        "alias": drug_table_alias,
+        "queries": DRUG_QUERIES,
+        "names": DRUG_QUERY_NAMES,
+        "steps": DRUG_PIPELINE_STEPS,
+        "output": "temp_seven",
+        "stream_table": PRESCRIPTIONS_TABLE,
+        "code_sets": None,
+    },
+}
@@ -0,0 +1,75 @@
+import argparse
+import os
+import pandas as pd
+import pyarrow as pa
+from mimic_sql.data_store import ARROW_EXTENSION, PREPARED_METADATA_KEY, format_bytes, parse_time_columns, remove_whitespace
+from mimic_sql.schema import apply_table_schema, frame_bytes
+
+# Data directories converted when none is given on the command line, and whether the
+# disease page's preparation (whitespace cleanup and datetime parsing) applies to them
+DEFAULT_DATA_DIRS = {
+    "MIMIC_IV_data/diseases_data": True,
+    "MIMIC_IV_data/drugs_data": False,
+}
+
+# --- Columnar Ingest ---
+
+# Write a DataFrame as an uncompressed Arrow IPC file, so it can be memory-mapped without decoding
+def write_arrow_table(df, path, metadata=None):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if metadata:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    return table
+
+# Convert every pickled table in a data directory into an Arrow file next to it.
+# Prepared tables are typed (and cleaned unless clean=False) once here instead of on every load.
+# Every table gets its declared compact dtypes (see schema.py); each entry of the result reports
+# the table's in-memory size as loaded from the pickle and after the conversion.
+def ingest_directory(data_dir, prepare=False, clean=True):
+    written = []
+    for file_name in sorted(os.listdir(data_dir)):
+        if not file_name.endswith(".pkl"):
+            continue
+        table_name = os.path.splitext(file_name)[0]
+        df = pd.read_pickle(os.path.join(data_dir, file_name))
+        if not isinstance(df, pd.DataFrame):
+            continue
+        loaded_bytes = frame_bytes(df)
+        metadata = None
+        if prepare:
+            if clean:
+                df = remove_whitespace(df)
+            df = parse_time_columns(df)
+            metadata = {PREPARED_METADATA_KEY: b"true"}
+        df = apply_table_schema(df, table_name)
+        path = os.path.join(data_dir, table_name + ARROW_EXTENSION)
+        table = write_arrow_table(df, path, metadata)
+        written.append((path, table.num_rows, table.num_columns, loaded_bytes, frame_bytes(df)))
+    return written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the MIMIC-IV .pkl tables into memory-mappable Arrow files.")
+    parser.add_argument("data_dirs", nargs="*", help="directories containing .pkl tables (default: both MIMIC_IV_data directories)")
+    parser.add_argument("--prepare", action="store_true", help="clean and type the tables in the given directories")
+    parser.add_argument("--no-clean", action="store_true", help="skip whitespace cleanup when the source is already clean")
+    args = parser.parse_args(argv)
+    data_dirs = {data_dir: args.prepare for data_dir in args.data_dirs} if args.data_dirs else DEFAULT_DATA_DIRS
+    total_loaded, total_compact = 0, 0
+    for data_dir, prepare in data_dirs.items():
+        for path, num_rows, num_columns, loaded_bytes, compact_bytes in ingest_directory(data_dir, prepare=prepare, clean=not args.no_clean):
+            print(
+                f"✅ {path}: {num_rows} rows, {num_columns} columns · "
+                f"{format_bytes(loaded_bytes)} → {format_bytes(compact_bytes)} in memory"
+            )
+            total_loaded += loaded_bytes
+            total_compact += compact_bytes
+    if total_compact:
+        print(f"🧠 {format_bytes(total_loaded)} → {format_bytes(total_compact)} in memory ({total_loaded / total_compact:.1f}x smaller)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Pipeline runs that can execute at once across all sessions; override with MIMIC_SQL_PIPELINE_WORKERS
+DEFAULT_PIPELINE_WORKERS = 4
+
+# Steps that can execute at once across all runs; override with MIMIC_SQL_STEP_WORKERS.
+# One by default: raise it only where `python -m mimic_sql.benchmark concurrency --workers N`
+# shows the concurrent run beating the sequential one (on one core it ran at 0.82x).
+DEFAULT_STEP_WORKERS = 1
+
+# --- Background Pipeline Runs ---
+
+class PipelineJob:
+    """
+    One background run of pipeline steps on a session's SQLEngine.
+    A worker thread runs the steps and keeps each finished step's output until the page
+    collects it, so partial results can be shown while later steps are still running.
+    run_step(i, engine) must not touch Streamlit; it returns whatever the page needs to display step i.
+    Without a schedule the steps run one after another. With a pipeline.step_schedule() result,
+    independent steps run at the same time, up to step_worker_count() of them: one on the session
+    engine and the others on worker engines forked from it, whose changed tables are copied back
+    when they finish.
+    SQLite releases the GIL while a statement runs, so steps working on their own session tables use
+    separate cores; reads of the shared in-memory base tables go through one shared cache and partly
+    take turns.
+    Cancelling stops before the next step and interrupts the statements that are running.
+    """
+
+    def __init__(self, indices, run_step, engine, labels=None, schedule=None):
+        self.indices = list(indices)
+        self.run_step = run_step
+        self.engine = engine
+        self.labels = labels or {}
+        self.schedule = schedule
+        self.status = "queued"
+        self.running = {}
+        self.error = None
+        self.done = []
+        self.outputs = {}
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+        self.future = None
+        self.started_at = None
+        self.finished_at = None
+        # Optional progress note within the running step (e.g. chunks streamed so far)
+        self.detail = None
+
+    # Worker body: run every step unless cancelled, stopping at the first failure
+    def run(self):
+        if self.cancel_event.is_set():
+            self.status = "cancelled"
+            return
+        self.status = "running"
+        self.started_at = time.time()
+        try:
+            if self.schedule is None:
+                for i in self.indices:
+                    if self.cancel_event.is_set():
+                        break
+                    self.running = {i: self.engine}
+                    self.finish_step(i, self.run_step(i, self.engine))
+            else:
+                self.run_concurrently()
+        except Exception as e:
+            self.fail(next(iter(self.running), None), e)
+        finally:
+            self.running = {}
+            self.finished_at = time.time()
+            if self.error is not None:
+                self.status = "failed"
+            elif self.cancel_event.is_set():
+                self.status = "cancelled"
+            else:
+                self.status = "finished"
+
+    # Start every step whose predecessors have finished, then wait for one to end, until all are done
+    def run_concurrently(self):
+        pending = list(self.indices)
+        futures = {}
+        pool = step_worker_pool()
+        while pending or futures:
+            if self.cancel_event.is_set() or self.error is not None:
+                pending = []
+            unfinished = set(pending) | set(self.running)
+            ready = [i for i in pending if not self.schedule[i]["after"] & unfinished]
+            for i in ready[:max(0, step_worker_count() - len(futures))]:
+                pending.remove(i)
+                # The first step to start runs on the session engine; steps started beside it get a worker engine
+                on_session = all(engine is not self.engine for engine in self.running.values())
+                try:
+                    engine = self.engine if on_session else self.engine.fork(self.schedule[i]["inputs"])
+                except Exception as e:
+                    self.fail(i, e)
+                    break
+                self.running[i] = engine
+                futures[pool.submit(self.run_step, i, engine)] = i
+            if not futures:
+                break
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                i = futures.pop(future)
+                engine = self.running.pop(i)
+                try:
+                    output = future.result()
+                    if engine is not self.engine:
+                        self.engine.adopt(engine, self.schedule[i]["writes"])
+                    self.finish_step(i, output)
+                except Exception as e:
+                    self.fail(i, e)
+                finally:
+                    if engine is not self.engine:
+                        engine.close()
+
+    # Keep a finished step's output for the page
+    def finish_step(self, i, output):
+        with self.lock:
+            self.outputs[i] = output
+            self.done.append(i)
+
+    # Record the first failure; an interrupted statement is how a cancelled step ends
+    def fail(self, i, e):
+        if self.error is not None or (isinstance(e, sqlite3.OperationalError) and self.cancel_event.is_set()):
+            return
+        if isinstance(e, sqlite3.OperationalError):
+            self.error = f"{self.label(i)} failed: {e}"
+        else:
+            self.error = f"{self.label(i)} failed: {type(e).__name__}: {e}"
+
+    # Ask the run to stop; statements in progress are interrupted
+    def cancel(self):
+        self.cancel_event.set()
+        for engine in list(self.running.values()):
+            engine.conn.interrupt()
+
+    # Whether the run is still queued or running
+    def is_active(self):
+        return self.status in ("queued", "running")
+
+    # Outputs of the steps finished since the last call, in step order
+    def collect(self):
+        with self.lock:
+            ready = [(i, self.outputs.pop(i)) for i in self.indices if i in self.outputs]
+        return ready
+
+    # Fraction of the steps finished
+    def progress(self):
+        return len(self.done) / len(self.indices) if self.indices else 1.0
+
+    # Display name of a step
+    def label(self, i):
+        return self.labels.get(i, f"Step {i}")
+
+    # One-line description of where the run stands
+    def describe(self):
+        elapsed = (self.finished_at or time.time()) - (self.started_at or time.time())
+        finished = f"{len(self.done)} of {len(self.indices)} steps"
+        if self.status == "queued":
+            return "⏳ Waiting for a free worker..."
+        if self.status == "running":
+            running = ", ".join(self.label(i) for i in sorted(self.running))
+            detail = f" · {self.detail}" if self.detail else ""
+            return f"⏳ {finished} done ({elapsed:.0f} s) · running {running}...{detail}"
+        if self.status == "cancelled":
+            return f"⏹️ Cancelled after {finished} ({elapsed:.0f} s)."
+        if self.status == "failed":
+            return f"❌ {self.error} ({finished} completed)."
+        return f"✅ Finished {finished} in {elapsed:.1f} s."
+
+worker_pool = None
+worker_pool_lock = threading.Lock()
+
+# Thread pool shared by every session of this server process
+def pipeline_worker_pool():
+    global worker_pool
+    with worker_pool_lock:
+        if worker_pool is None:
+            max_workers = int(os.environ.get("MIMIC_SQL_PIPELINE_WORKERS", DEFAULT_PIPELINE_WORKERS))
+            worker_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mimic-sql-pipeline")
+        return worker_pool
+
+step_pool = None
+
+# Number of steps that can execute at once
+def step_worker_count():
+    return max(1, int(os.environ.get("MIMIC_SQL_STEP_WORKERS", DEFAULT_STEP_WORKERS)))
+
+# Thread pool the steps of concurrent runs execute on, shared by every session of this server process
+def step_worker_pool():
+    global step_pool
+    with worker_pool_lock:
+        if step_pool is None:
+            step_pool = ThreadPoolExecutor(max_workers=step_worker_count(), thread_name_prefix="mimic-sql-step")
+        return step_pool
+
+# Queue a job on the shared worker pool
+def submit_job(job):
+    job.future = pipeline_worker_pool().submit(job.run)
+    return job
@@ -0,0 +1,103 @@
+import itertools
+from mimic_sql.sql_parse import split_statements, statement_tables
+
+# --- Step Dependency Analysis ---
+
+# Tables a whole step reads from outside itself, writes, creates, mutates in place
+# (tables it changes without having created them) and leaves behind when it finishes
+def step_tables(sql, known_tables=None):
+    reads, writes, creates, mutates = set(), set(), set(), set()
+    local = set()
+    for q in split_statements(sql):
+        tables = statement_tables(q, known_tables)
+        reads |= tables["reads"] - local
+        writes |= tables["writes"]
+        creates |= tables["creates"]
+        mutates |= tables["writes"] - tables["creates"] - tables["drops"] - local
+        local -= tables["drops"]
+        local |= tables["creates"]
+    return {"reads": reads, "writes": writes, "creates": creates, "mutates": mutates, "outputs": local}
+
+# Every table name the steps could refer to: session tables, base tables and tables any step creates
+def pipeline_tables(step_sql, engine):
+    known_tables = {name.lower() for name in engine.session_tables()}
+    if engine.base is not None:
+        known_tables |= set(engine.base.table_columns())
+    for sql in step_sql.values():
+        known_tables |= step_tables(sql)["creates"]
+    return known_tables
+
+# --- Concurrent Scheduling ---
+
+# For each step: the earlier steps it has to wait for, the session tables it needs when it runs on
+# a worker connection, and the tables it changes. A step waits for every earlier step that writes
+# a table it reads or writes, and for every earlier step that reads a table it writes.
+def step_schedule(step_sql, known_tables=None):
+    analyses = {i: step_tables(sql, known_tables) for i, sql in step_sql.items()}
+    schedule = {}
+    for j in sorted(step_sql):
+        touched = analyses[j]["reads"] | analyses[j]["writes"]
+        schedule[j] = {
+            "after": {
+                i for i in step_sql
+                if i < j and (analyses[i]["writes"] & touched or analyses[i]["reads"] & analyses[j]["writes"])
+            },
+            "inputs": analyses[j]["reads"] | analyses[j]["mutates"],
+            "writes": analyses[j]["writes"],
+        }
+    return schedule
+
+# --- Incremental Re-execution ---
+
+class PipelineState:
+    """
+    Remembers the SQL and input table versions each step last ran with, so "Execute All"
+    only re-runs steps that are stale (edited, never run, or fed by a changed table)
+    together with every step downstream of them.
+    """
+
+    def __init__(self):
+        self.versions = itertools.count(1)
+        self.table_versions = {}
+        self.step_runs = {}
+
+    # Work out which steps need to run; step_sql maps step index -> SQL with aliases applied
+    def plan(self, step_sql, engine):
+        known_tables = pipeline_tables(step_sql, engine)
+        analyses = {i: step_tables(sql, known_tables) for i, sql in step_sql.items()}
+        dirty = {i for i in step_sql if self.is_stale(i, step_sql[i], analyses[i], engine)}
+        changed = True
+        while changed:
+            changed = False
+            for j in sorted(step_sql):
+                if j in dirty:
+                    # Re-running a step that changes an earlier step's table in place needs that table rebuilt first
+                    for table in analyses[j]["mutates"]:
+                        producers = [p for p in step_sql if p < j and table in analyses[p]["creates"]]
+                        if producers and max(producers) not in dirty:
+                            dirty.add(max(producers))
+                            changed = True
+                elif any(d < j and analyses[d]["writes"] & analyses[j]["reads"] for d in dirty):
+                    dirty.add(j)
+                    changed = True
+        return sorted(dirty)
+
+    # A step is stale if it never ran, its SQL changed, an input table changed or an output went missing
+    def is_stale(self, i, sql, analysis, engine):
+        run = self.step_runs.get(i)
+        if run is None or run["sql"] != sql:
+            return True
+        if any(self.table_versions.get(table, 0) != version for table, version in run["inputs"].items()):
+            return True
+        return any(not engine.has_table(table) for table in run["outputs"])
+
+    # Record a finished step: bump the versions of everything it wrote, then remember its inputs
+    def record_run(self, i, sql):
+        analysis = step_tables(sql)
+        for table in analysis["writes"]:
+            self.table_versions[table] = next(self.versions)
+        self.step_runs[i] = {
+            "sql": sql,
+            "inputs": {table: self.table_versions.get(table, 0) for table in analysis["reads"]},
+            "outputs": analysis["outputs"],
+        }
@@ -0,0 +1,103 @@
+import json
+import sys
+import time
+from contextlib import contextmanager
+import pandas as pd
+from mimic_sql.sql_parse import normalize_sql
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Longest statement text kept in a profile entry
+STATEMENT_TEXT_LIMIT = 300
+
+# --- Per-Statement Profiling ---
+
+# Peak resident memory of this process so far in bytes (None where the platform does not report it)
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class StepProfiler:
+    """
+    Records what each statement of a step cost: wall time, split into time in the SQL engine and time
+    building results (counting rows and reading the first page into a DataFrame); rows in the tables it
+    reads (as recorded when they were built, so profiling adds no table scans) and rows it produced;
+    how much the engine's own tables grew; and how much the process's peak resident memory grew while
+    it ran. The peak is process-wide, so statements running at the same time in other steps or
+    sessions can raise it too.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    # Profile the statement run inside the with-block
+    @contextmanager
+    def statement(self, q):
+        rows_in = self.engine.input_rows(q)
+        engine_bytes = self.engine.session_bytes()
+        peak = peak_rss_bytes()
+        self.engine.last_stats = {}
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start
+            stats = self.engine.last_stats
+            peak_after = peak_rss_bytes()
+            self.statements.append({
+                "statement": normalize_sql(q)[:STATEMENT_TEXT_LIMIT],
+                "kind": q.split()[0].upper() if q.split() else "",
+                "wall_seconds": round(wall, 4),
+                "engine_seconds": round(stats.get("engine_seconds", 0.0), 4),
+                "convert_seconds": round(stats.get("convert_seconds", 0.0), 4),
+                "rows_in": rows_in,
+                "rows_out": stats.get("rows_out"),
+                "engine_bytes_delta": self.engine.session_bytes() - engine_bytes,
+                "peak_rss_delta_bytes": None if peak is None else peak_after - peak,
+                "from_cache": self.engine.last_from_cache,
+                "indexes_created": [[table, list(columns)] for table, columns in stats.get("indexes", [])],
+                "query_plan": stats.get("plan", []),
+                "reused_columns": stats.get("reused", []),
+                "served_from": stats.get("served_from"),
+            })
+
+    # One-line total for the Messages tab
+    def summary(self):
+        return profile_summary(self.statements)
+
+# One-line total of statement profiles
+def profile_summary(statements):
+    wall = sum(entry["wall_seconds"] for entry in statements)
+    engine = sum(entry["engine_seconds"] for entry in statements)
+    convert = sum(entry["convert_seconds"] for entry in statements)
+    return f"⏱️ Step took {wall:.2f} s: {engine:.2f} s in the SQL engine, {convert:.2f} s building results."
+
+# Statement profiles as a table for display
+def profile_table(statements):
+    df = pd.DataFrame(statements, columns=[
+        "kind", "wall_seconds", "engine_seconds", "convert_seconds", "rows_in", "rows_out",
+        "engine_bytes_delta", "peak_rss_delta_bytes", "from_cache", "statement"
+    ])
+    df.index = range(1, len(df) + 1)
+    return df
+
+# A pipeline run's statement profiles as JSON, one entry per step; step_profiles maps step index -> statements
+def profile_json(step_profiles, labels=None):
+    labels = labels or {}
+    steps = [
+        {
+            "step": i,
+            "label": labels.get(i, f"Step {i}"),
+            "wall_seconds": round(sum(entry["wall_seconds"] for entry in statements), 4),
+            "statements": statements,
+        }
+        for i, statements in sorted(step_profiles.items())
+    ]
+    return json.dumps({"wall_seconds": round(sum(step["wall_seconds"] for step in steps), 4), "steps": steps}, indent=2)
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+import pandas as pd
+from mimic_sql.data_store import format_bytes
+
+# Memory budget of the process-wide result cache; override with the MIMIC_SQL_RESULT_CACHE_MB environment variable
+DEFAULT_CACHE_MB = 512
+
+# --- Fingerprints ---
+
+# Content fingerprint of a DataFrame written into an engine (column names, dtypes and every value)
+def content_fingerprint(df):
+    digest = hashlib.sha256()
+    digest.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode())
+    try:
+        digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    except TypeError:
+        # Unhashable values: give the table a unique fingerprint so results built on it are never reused
+        digest.update(uuid.uuid4().bytes)
+    return digest.hexdigest()
+
+# Combine strings into one fingerprint
+def combine_fingerprints(*parts):
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+# --- Result Cache ---
+
+class ResultCache:
+    """
+    Process-wide LRU cache of statement results, keyed by the normalized statement text plus the
+    fingerprints of every table it reads. SELECT results are kept as DataFrames; CREATE TABLE results
+    are kept as serialized SQLite databases so a hit restores the table with its exact column types.
+    The least recently used entries are evicted once the memory budget is exceeded.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    # Return the cached value for a key (None on a miss) and mark it as recently used
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    # Store a value, evicting least recently used entries until the cache fits its budget
+    def put(self, key, value, num_bytes):
+        with self.lock:
+            if num_bytes > self.max_bytes:
+                return
+            if key in self.entries:
+                self.current_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, num_bytes)
+            self.current_bytes += num_bytes
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self.entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+                self.evictions += 1
+
+    # Drop every entry and reset the counters
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    # One-line report for the Messages tab
+    def summary(self):
+        with self.lock:
+            return (
+                f"🗃️ Result cache: {self.hits} hits, {self.misses} misses, {self.evictions} evictions, "
+                f"{len(self.entries)} entries using {format_bytes(self.current_bytes)} of {format_bytes(self.max_bytes)}."
+            )
+
+shared_cache = None
+shared_cache_lock = threading.Lock()
+
+# The result cache shared by every session and page of this server process
+def shared_result_cache():
+    global shared_cache
+    with shared_cache_lock:
+        if shared_cache is None:
+            max_mb = float(os.environ.get("MIMIC_SQL_RESULT_CACHE_MB", DEFAULT_CACHE_MB))
+            shared_cache = ResultCache(int(max_mb * 1024 * 1024))
+        return shared_cache
@@ -0,0 +1,76 @@
+import pandas as pd
+
+# Page sizes a viewer can pick from, and the one used until they do
+PAGE_SIZES = [25, 100, 500, 1000]
+DEFAULT_PAGE_SIZE = 100
+
+# --- Paged Result Views ---
+
+# Number of pages a result takes (at least one, so an empty result still shows its columns)
+def page_count(num_rows, page_size):
+    return max(1, -(-num_rows // page_size))
+
+# Column names and types of a result, shown up front before any rows
+def result_schema(df):
+    return pd.DataFrame({"Column": list(df.columns), "Type": [str(dtype) for dtype in df.dtypes]})
+
+# --- Result Handles ---
+
+class ResultHandle:
+    """
+    A SELECT result kept inside the session's SQLEngine instead of as a DataFrame: the table holding
+    its rows (the table itself when the SELECT only picks its columns, otherwise a copy in the engine's
+    result schema), the columns shown and the row count. Rows are read only for the page on screen or
+    when to_frame() is called. The engine copies a table aside before anything changes it while a
+    handle still shows it, so a handle keeps showing what its SELECT returned.
+    transform, when given, prepares every fetched DataFrame for display (e.g. parsing date columns).
+    """
+
+    def __init__(self, engine, schema, table, columns, transform=None):
+        self.engine = engine
+        self.schema = schema
+        self.table = table
+        self.columns = list(columns)
+        self.transform = transform
+        self.num_rows = engine.count_rows(self.source())
+        # The last page fetched, so redrawing the page does not have to wait for a busy engine
+        self.last_page = None
+        self.first_page = self.page(0, DEFAULT_PAGE_SIZE)
+
+    # The table the rows are read from, quoted for SQL
+    def source(self):
+        if self.schema is None:
+            return f'"{self.table}"'
+        return f'{self.schema}."{self.table}"'
+
+    # One page of the result (pages count from 0), optionally sorted by a column. The sort is stable,
+    # so rows with equal values keep their original order, and missing values always come last.
+    def page(self, page, page_size, sort_by=None, descending=False):
+        args = (page, page_size, sort_by, descending)
+        if self.last_page is not None and self.last_page[0] == args:
+            return self.last_page[1]
+        order = "rowid"
+        if sort_by is not None:
+            order = f'"{sort_by}" IS NULL, "{sort_by}"{" DESC" if descending else ""}, rowid'
+        df = self.fetch(f"ORDER BY {order} LIMIT {int(page_size)} OFFSET {int(page * page_size)}")
+        df.index = range(page * page_size + 1, page * page_size + len(df) + 1)
+        self.last_page = (args, df)
+        return df
+
+    # Column names and display types of the result
+    def column_types(self):
+        return result_schema(self.first_page)
+
+    # The whole result as a DataFrame, for exporting
+    def to_frame(self):
+        df = self.fetch("ORDER BY rowid")
+        df.index = range(1, len(df) + 1)
+        return df
+
+    # Read rows of the result in the given order, prepared for display
+    def fetch(self, tail):
+        select_list = ", ".join(f'"{col}" AS "{col}"' for col in self.columns)
+        df = self.engine.read_rows(f"SELECT {select_list} FROM {self.source()} {tail}")
+        if self.transform is not None:
+            df = self.transform(df)
+        return df
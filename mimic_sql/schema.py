@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+from mimic_sql.data_store import CODE_SET_SUFFIX
+
+# --- Declared Table Schemas ---
+
+# Compact dtype of each column of the MIMIC tables, applied once at ingest. Low-cardinality strings
+# (ICD codes, drug names, units, gender) become categoricals, which Arrow stores dictionary-encoded;
+# keys, versions and small counts become narrower integers; times become datetime64[ns].
+# Dates of death (patients.dod) are already stored as Arrow dates and are left as they are.
+TABLE_DTYPES = {
+    "mimiciv_hosp.patients": {"subject_id": "int32", "gender": "category", "anchor_age": "int16", "anchor_year": "int16"},
+    "mimiciv_hosp.admissions": {"subject_id": "int32", "admittime": "datetime64[ns]"},
+    "mimiciv_hosp.diagnoses_icd": {"subject_id": "int32", "seq_num": "int16", "icd_code": "category", "icd_version": "int8"},
+    "mimic_ed.edstays": {"subject_id": "int32", "intime": "datetime64[ns]"},
+    "mimic_ed.diagnosis": {"subject_id": "int32", "seq_num": "int16", "icd_code": "category", "icd_version": "int8"},
+    "mimiciv_hosp.prescriptions": {
+        "subject_id": "int32", "drug": "category", "dose_val_rx": "category", "dose_unit_rx": "category",
+        "starttime": "datetime64[ns]", "stoptime": "datetime64[ns]",
+    },
+}
+
+# Dtypes of the *_icd_codes code-set tables; their codes are unique within a set, so they stay strings
+CODE_SET_DTYPES = {"icd_version": "int8"}
+
+# Declared dtypes of a table (empty for tables without a declared schema)
+def declared_dtypes(table_name):
+    if table_name.lower().endswith(CODE_SET_SUFFIX):
+        return CODE_SET_DTYPES
+    return TABLE_DTYPES.get(table_name, {})
+
+# Convert a table's columns to their declared dtypes. Integer columns are only narrowed when every
+# value fits (e.g. subject_ids shifted past the int32 range keep int64) and has no missing values.
+def apply_table_schema(df, table_name):
+    for col, dtype in declared_dtypes(table_name).items():
+        if col not in df.columns or str(df[col].dtype) == dtype:
+            continue
+        if dtype == "category":
+            df[col] = df[col].astype("category")
+        elif dtype.startswith("datetime64"):
+            df[col] = pd.to_datetime(df[col], errors="coerce").astype(dtype)
+        elif pd.api.types.is_integer_dtype(df[col]):
+            limits = np.iinfo(dtype)
+            if df[col].empty or (df[col].min() >= limits.min and df[col].max() <= limits.max):
+                df[col] = df[col].astype(dtype)
+    return df
+
+# Bytes a DataFrame holds, counting the contents of Python string objects
+def frame_bytes(df):
+    return int(df.memory_usage(index=False, deep=True).sum())
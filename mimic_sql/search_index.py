@@ -0,0 +1,60 @@
+import bisect
+import numpy as np
+
+# SQLite's LOWER() and LIKE only fold ASCII letters, so index keys are folded the same way
+ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+# Largest code point, used as the upper bound of a prefix range
+MAX_CHAR = "\U0010ffff"
+
+# Fold a value the way SQLite's LOWER() does
+def ascii_lower(value):
+    return value.translate(ASCII_LOWER)
+
+# --- Prefix Index ---
+
+class PrefixIndex:
+    """
+    Sorted distinct ASCII-lowercased values of one text column, each mapped to the rowids holding it.
+    A prefix is answered with two binary searches, and because the rowids are grouped by key, the rows
+    of every matching value form one contiguous slice. This is the same match as
+    LOWER(column) LIKE LOWER('prefix%') without scanning the table.
+    """
+
+    def __init__(self, rowids, values):
+        # NULLs never match LIKE; other non-text values match as their text form, as in SQLite
+        keys = np.array([ascii_lower(str(value)) if value is not None else "" for value in values], dtype=object)
+        present = np.array([value is not None for value in values], dtype=bool)
+        rowids = np.asarray(rowids, dtype=np.int64)[present]
+        keys = keys[present]
+        order = np.lexsort((rowids, keys.astype(str))) if len(keys) else np.array([], dtype=np.int64)
+        sorted_keys = keys[order]
+        self.rowids = rowids[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]) if len(sorted_keys) else np.array([], dtype=np.int64)
+        self.keys = [str(key) for key in sorted_keys[starts]]
+        self.offsets = np.r_[starts, len(sorted_keys)].astype(np.int64)
+
+    # Range of key positions starting with a prefix
+    def key_range(self, prefix):
+        prefix = ascii_lower(prefix)
+        return bisect.bisect_left(self.keys, prefix), bisect.bisect_left(self.keys, prefix + MAX_CHAR)
+
+    # Rowids whose value starts with any of the prefixes (case-insensitive), in table order
+    def search(self, prefixes):
+        slices = []
+        for prefix in prefixes:
+            lo, hi = self.key_range(prefix)
+            if lo < hi:
+                slices.append(self.rowids[self.offsets[lo]:self.offsets[hi]])
+        if not slices:
+            return np.array([], dtype=np.int64)
+        return np.unique(np.concatenate(slices))
+
+    # Matching distinct (lowercased) values with their row counts, for browsing a search
+    def value_counts(self, prefixes):
+        counts = {}
+        for prefix in prefixes:
+            lo, hi = self.key_range(prefix)
+            for k in range(lo, hi):
+                counts[self.keys[k]] = int(self.offsets[k + 1] - self.offsets[k])
+        return dict(sorted(counts.items()))
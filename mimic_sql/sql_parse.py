@@ -0,0 +1,625 @@
+import re
+
+# --- SQL Tokenizing Helpers ---
+
+# String literals and comments are skipped; quoted identifiers are returned without their quotes
+TOKEN_PATTERN = re.compile(
+    r"""'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/|"((?:[^"]|"")+)"|`([^`]+)`|([A-Za-z_][A-Za-z0-9_$]*)|(\d+(?:\.\d*)?)|(<=|>=|<>|!=|\|\||[*.,()=<>+\-/%;])""",
+    re.S
+)
+
+# Split a statement into identifier, number and punctuation tokens
+def sql_tokens(q):
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(q):
+        token = next((group for group in match.groups() if group is not None), None)
+        if token is not None:
+            tokens.append(token)
+    return tokens
+
+# String literals and comments, whose text no rewrite may match
+LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/", re.S)
+
+# A statement with every string literal and comment blanked out. The text keeps its length, so
+# positions found in it are positions in the statement.
+def mask_literals(q):
+    return LITERAL_PATTERN.sub(lambda match: "\0" * len(match.group(0)), q)
+
+# Position of the parenthesis closing the one at open_at in masked text (None if it is not closed)
+def closing_paren(masked, open_at):
+    depth = 0
+    for k in range(open_at, len(masked)):
+        if masked[k] == "(":
+            depth += 1
+        elif masked[k] == ")":
+            depth -= 1
+            if depth == 0:
+                return k
+    return None
+
+# (start, end) of each condition joined by a top-level AND in masked text
+def conjunct_spans(masked):
+    spans, depth, start = [], 0, 0
+    for match in re.finditer(r"[()]|\bAND\b", masked, re.IGNORECASE):
+        if match.group(0) == "(":
+            depth += 1
+        elif match.group(0) == ")":
+            depth -= 1
+        elif depth == 0:
+            spans.append((start, match.start()))
+            start = match.end()
+    spans.append((start, len(masked)))
+    return spans
+
+# Column names of the base tables a statement references, so only those columns need loading.
+# base_columns maps each base table to its available columns; known_tables are the session's own tables.
+def referenced_base_columns(q, base_columns, known_tables=()):
+    tokens = sql_tokens(q)
+    lowered = [token.lower() for token in tokens]
+    lowered_set = set(lowered)
+    tables = [name for name in base_columns if name.lower() in lowered_set]
+    if not tables:
+        return {}
+    known = {name.lower() for name in known_tables} | {name.lower() for name in base_columns}
+    wanted = {name: [col for col in base_columns[name] if col.lower() in lowered_set] for name in tables}
+    for k, token in enumerate(tokens):
+        if token != "*":
+            continue
+        previous = lowered[k - 1] if k > 0 else ""
+        if previous == ".":
+            # "qualifier.*" selects every column of one table (or of an alias we cannot resolve)
+            qualifier = lowered[k - 2] if k > 1 else ""
+            targets = [name for name in tables if name.lower() == qualifier]
+            if not targets and qualifier not in known:
+                targets = tables
+        elif previous in ("select", ",", "distinct", "all"):
+            # A bare "*" in a select list (not a multiplication or COUNT(*))
+            targets = tables
+        else:
+            targets = []
+        for name in targets:
+            wanted[name] = list(base_columns[name])
+    if "natural" in lowered_set:
+        # NATURAL JOIN matches on every shared column, so those must be present even if not named
+        for name in tables:
+            others = {col.lower() for other in tables if other != name for col in base_columns[other]}
+            if any(table.lower() in lowered_set for table in known_tables):
+                wanted[name] = list(base_columns[name])
+            else:
+                wanted[name] += [col for col in base_columns[name] if col.lower() in others and col not in wanted[name]]
+    return wanted
+
+# Keywords that end a table reference inside a FROM/JOIN clause
+CLAUSE_KEYWORDS = {
+    "where", "join", "inner", "left", "right", "full", "cross", "natural", "outer", "on", "using",
+    "group", "order", "limit", "union", "except", "intersect", "having", "window", "set", "values",
+    "select", "returning", "as", "indexed", "not",
+}
+
+# Split a SQL text into statements the same way the pages do
+def split_statements(sql):
+    return [q.strip() for q in sql.split(";") if q.strip()]
+
+# String literals are kept as written; comments and runs of whitespace outside them are collapsed
+NORMALIZE_PATTERN = re.compile(r"'(?:[^']|'')*'|(?:\s+|--[^\n]*|/\*.*?\*/)+", re.S)
+
+# Canonical text of a statement, so formatting-only edits map to the same cache key
+def normalize_sql(q):
+    def replace(match):
+        text = match.group(0)
+        return text if text.startswith("'") else " "
+    return NORMALIZE_PATTERN.sub(replace, q).strip().rstrip(";").strip()
+
+# "column = TRUE" and other PostgreSQL boolean comparisons of a column; the pipeline stores flags
+# as 'TRUE'/'FALSE' text (or 1/0 from DataFrames)
+BOOLEAN_COMPARISON_PATTERN = re.compile(r'((?:\w+\.)?(?:\w+|"\w+"))\s*(=|<>|!=)\s*(TRUE|FALSE)\b', re.IGNORECASE)
+
+# Subtraction of two columns named as dates, which PostgreSQL evaluates to a number of days when they hold dates
+DATE_DIFFERENCE_PATTERN = re.compile(
+    r"(?<![\w.])((?:\w+\.)?(\w*date\w*))\s*-\s*((?:\w+\.)?(\w*date\w*))(?![\w.(])", re.IGNORECASE
+)
+
+# What ends the assignment list of "UPDATE ... SET"
+ASSIGNMENT_TOKEN_PATTERN = re.compile(r"[(),;=]|\b(?:FROM|WHERE|RETURNING)\b", re.IGNORECASE)
+
+# Positions of the "=" signs in masked text that assign a value in "SET a = ..., b = ..." rather than compare
+def assignment_positions(masked):
+    positions = set()
+    for set_match in re.finditer(r"\bSET\b", masked, re.IGNORECASE):
+        depth, expect = 0, True
+        for match in ASSIGNMENT_TOKEN_PATTERN.finditer(masked, set_match.end()):
+            token = match.group(0)
+            if token == "(":
+                depth += 1
+            elif token == ")":
+                depth -= 1
+                if depth < 0:
+                    break
+            elif depth > 0:
+                continue
+            elif token == ",":
+                expect = True
+            elif token == "=":
+                if expect:
+                    positions.add(match.start())
+                expect = False
+            else:
+                break
+    return positions
+
+# Lowercase column names subtracted from one another as dates, which the caller checks against its tables
+def date_difference_columns(q):
+    return {
+        name.lower() for match in DATE_DIFFERENCE_PATTERN.finditer(mask_literals(q)) for name in match.group(2, 4)
+    }
+
+# Translate the PostgreSQL expressions used by the example steps into their SQLite equivalents, outside
+# string literals and comments: comparisons of a column with TRUE/FALSE (not assignments of them), and
+# differences of two columns listed in date_columns (lowercase names holding dates).
+def sqlite_dialect(q, date_columns=()):
+    masked = mask_literals(q)
+    assignments = assignment_positions(masked)
+    edits = []
+    for match in BOOLEAN_COMPARISON_PATTERN.finditer(masked):
+        if match.start(2) not in assignments:
+            values = "(1, 'TRUE')" if match.group(3).upper() == "TRUE" else "(0, 'FALSE')"
+            operator = "IN" if match.group(2) == "=" else "NOT IN"
+            edits.append((match.start(), match.end(), f"{match.group(1)} {operator} {values}"))
+    for match in DATE_DIFFERENCE_PATTERN.finditer(masked):
+        if match.group(2).lower() in date_columns and match.group(4).lower() in date_columns:
+            edits.append((match.start(), match.end(), f"CAST(julianday({match.group(1)}) - julianday({match.group(3)}) AS INTEGER)"))
+    next_start = len(q)
+    for start, end, text in sorted(edits, reverse=True):
+        if end <= next_start:
+            q = q[:start] + text + q[end:]
+            next_start = start
+    return q
+
+# "alias.icd_code IN (SELECT icd_code FROM <code set> WHERE icd_version = alias.icd_version)"
+CODE_SET_MEMBERSHIP_PATTERN = re.compile(
+    r"\b(\w+)\.icd_code\s+IN\s*\(\s*SELECT\s+icd_code\s+FROM\s+(\w+)\s+WHERE\s+icd_version\s*=\s*(\w+)\.icd_version\s*\)",
+    re.IGNORECASE
+)
+
+# Rewrite correlated ICD code-set membership subqueries into bit tests against a code-set index table.
+# Each table whose rows are tested is wrapped once in a derived table that looks up its rows' bitmask,
+# so the statement needs one index lookup per row instead of a code-set scan per row and category.
+# The wrapper adds an icd_category_mask column, which SELECT * would return and NATURAL JOIN would
+# join on; those statements (and ones naming alias.* or whose tested table cannot be found) look the
+# mask up inside each bit test instead, one index lookup per test.
+# Rows with a NULL icd_code keep the subquery, whose NULL result a bit test cannot give (it matters under NOT).
+# code_set_bits maps lowercased code-set table names to their bit; index_table has
+# (icd_version, icd_code, category_mask) columns.
+# Matching happens outside string literals and comments.
+def rewrite_code_set_membership(q, code_set_bits, index_table):
+    masked = mask_literals(q)
+    if not code_set_bits:
+        return q
+    tests = []
+    for match in CODE_SET_MEMBERSHIP_PATTERN.finditer(masked):
+        alias, code_set, version_alias = match.groups()
+        bit = code_set_bits.get(code_set.lower())
+        if bit is not None and alias.lower() == version_alias.lower():
+            tests.append((match, alias, bit))
+    if not tests:
+        return q
+    if not re.search(r"\bNATURAL\b|\bSELECT\s+(?:DISTINCT\s+)?\*", masked, re.IGNORECASE):
+        wrapped = wrap_code_set_tests(q, tests, index_table)
+        if wrapped is not None:
+            return wrapped
+    lookup = (
+        "COALESCE((SELECT c.category_mask FROM {index} AS c "
+        "WHERE c.icd_version = {alias}.icd_version AND c.icd_code = {alias}.icd_code), 0)"
+    )
+    return replace_code_set_tests(q, tests, lambda alias: lookup.format(index=index_table, alias=alias))
+
+# Replace each (match, alias, bit) membership test by a bit test of the mask mask_of(alias) gives
+def replace_code_set_tests(q, tests, mask_of):
+    rewritten = q
+    for match, alias, bit in reversed(tests):
+        bit_test = f"CASE WHEN {alias}.icd_code IS NULL THEN {q[match.start():match.end()]} ELSE ({mask_of(alias)} & {bit}) != 0 END"
+        rewritten = rewritten[:match.start()] + bit_test + rewritten[match.end():]
+    return rewritten
+
+# Bit tests reading an icd_category_mask column added to each tested table; None when a tested table
+# cannot be wrapped
+def wrap_code_set_tests(q, tests, index_table):
+    rewritten = replace_code_set_tests(q, tests, lambda alias: f"{alias}.icd_category_mask")
+    for alias in {alias for _, alias, _ in tests}:
+        masked = mask_literals(rewritten)
+        if re.search(rf"\b{alias}\.\*", masked, re.IGNORECASE):
+            return None
+        tagged = (
+            "(SELECT m.*, COALESCE((SELECT c.category_mask FROM {index} AS c "
+            "WHERE c.icd_version = m.icd_version AND c.icd_code = m.icd_code), 0) AS icd_category_mask "
+            "FROM {table} AS m)"
+        )
+        aliased = re.compile(rf"\b(FROM|JOIN)\s+(\w+)\s+(?:AS\s+)?{alias}\b", re.IGNORECASE)
+        match = aliased.search(masked)
+        if match and match.group(2).lower() not in CLAUSE_KEYWORDS:
+            replacement = f"{match.group(1)} {tagged.format(index=index_table, table=match.group(2))} AS {alias}"
+        else:
+            match = re.compile(rf"\b(FROM|JOIN)\s+{alias}\b(?!\s*\.)", re.IGNORECASE).search(masked)
+            if not match:
+                return None
+            replacement = f"{match.group(1)} {tagged.format(index=index_table, table=alias)} AS {alias}"
+        rewritten = rewritten[:match.start()] + replacement + rewritten[match.end():]
+    return rewritten
+
+# "FROM a NATURAL JOIN b" with nothing else joined to it and no alias on either table
+NATURAL_JOIN_PATTERN = re.compile(
+    r"\bFROM\s+(\w+)\s+NATURAL\s+JOIN\s+(\w+)"
+    r"(?=\s*(?:$|[;)]|(?:WHERE|GROUP|ORDER|UNION|EXCEPT|INTERSECT|LIMIT|HAVING|WINDOW)\b))",
+    re.IGNORECASE
+)
+
+# Table pairs a statement joins with a plain NATURAL JOIN, as (left, right) names. Pairs whose
+# tables are also referred to by name elsewhere (e.g. admissions.admittime) are left out.
+def natural_joins(q):
+    tokens = sql_tokens(q)
+    qualifiers = {tokens[k].lower() for k in range(len(tokens) - 1) if tokens[k + 1] == "."}
+    pairs = []
+    for match in NATURAL_JOIN_PATTERN.finditer(mask_literals(q)):
+        left, right = match.group(1), match.group(2)
+        if left.lower() not in qualifiers and right.lower() not in qualifiers and (left, right) not in pairs:
+            pairs.append((left, right))
+    return pairs
+
+# Read natural joins from tables holding their rows; joined_tables maps lowercased (left, right) to a table reference.
+# Joins are found in the masked text, so the same words inside literals and comments are kept.
+def rewrite_natural_joins(q, joined_tables):
+    rewritten = q
+    for match in reversed(list(NATURAL_JOIN_PATTERN.finditer(mask_literals(q)))):
+        name = joined_tables.get((match.group(1).lower(), match.group(2).lower()))
+        if name:
+            rewritten = rewritten[:match.start()] + f"FROM {name}" + rewritten[match.end():]
+    return rewritten
+
+# One term of an OR chain of prefix searches: "LOWER(col) LIKE LOWER('prefix%')", either LOWER optional
+PREFIX_TERM_PATTERN = re.compile(
+    r"(?:LOWER\s*\(\s*(\w+)\s*\)|(\w+))\s+LIKE\s+(?:LOWER\s*\(\s*'([^'%_]*)%'\s*\)|'([^'%_]*)%')",
+    re.IGNORECASE
+)
+
+# Recognize "... FROM table WHERE <OR chain of prefix LIKEs on one column>" and return
+# (table, column, prefixes, position of the WHERE condition); None for any other shape.
+# The clauses and the OR chain are found in the masked text, so words inside literals and comments
+# are never taken for them; the condition must run to the end of the statement.
+def prefix_filter(q):
+    masked = mask_literals(q).rstrip().rstrip(";").rstrip()
+    match = re.search(r"\bFROM\s+(\w+)\s+WHERE\s+", masked, re.IGNORECASE)
+    if not match:
+        return None
+    columns, prefixes = set(), []
+    term_start = match.end()
+    for separator in [*re.finditer(r"\s+OR\s+", masked[term_start:], re.IGNORECASE), None]:
+        term_end = len(masked) if separator is None else match.end() + separator.start()
+        term_match = PREFIX_TERM_PATTERN.fullmatch(q[term_start:term_end])
+        if not term_match:
+            return None
+        columns.add((term_match.group(1) or term_match.group(2)).lower())
+        prefixes.append(term_match.group(3) if term_match.group(3) is not None else term_match.group(4))
+        if separator is not None:
+            term_start = match.end() + separator.end()
+    if len(columns) != 1:
+        return None
+    return match.group(1), columns.pop(), prefixes, match.end()
+
+# Recognize "SELECT * FROM table" or "SELECT col, col, ... FROM table" (plain column names, nothing
+# after the table) and return (table, columns), with None as the columns for "*"; None for any other shape
+def table_projection(q):
+    tokens = sql_tokens(q)
+    if tokens and tokens[-1] == ";":
+        tokens = tokens[:-1]
+    if len(tokens) < 4 or tokens[0].upper() != "SELECT" or tokens[-2].upper() != "FROM":
+        return None
+    select_list, table = tokens[1:-2], tokens[-1]
+    if select_list == ["*"]:
+        return table, None
+    names = select_list[::2]
+    if select_list[1::2] != [","] * (len(names) - 1) or not all(re.fullmatch(r"[A-Za-z_]\w*", name) for name in names):
+        return None
+    return table, names
+
+# Keywords of clauses whose result depends on other rows than the current one
+CROSS_ROW_KEYWORDS = {"group", "distinct", "join", "union", "intersect", "except", "order", "limit", "offset", "over", "having", "window"}
+
+# Aggregate functions, which combine rows
+AGGREGATE_FUNCTIONS = {"count", "sum", "avg", "min", "max", "total", "group_concat"}
+
+# Whether a statement looks at each row on its own (row filters, derived columns and changes to single
+# rows of one table, without subqueries), so running it on a table split into chunks and putting the
+# chunks' results together gives the same rows as running it on the whole table
+def row_local(q):
+    tokens = [token.lower() for token in sql_tokens(q)]
+    if tokens.count("select") > 1 or len(statement_tables(q)["reads"]) > 1:
+        return False
+    for k, token in enumerate(tokens):
+        if token in CROSS_ROW_KEYWORDS:
+            return False
+        if token in AGGREGATE_FUNCTIONS and tokens[k + 1:k + 2] == ["("]:
+            return False
+    return True
+
+# "CREATE [TEMP] TABLE name AS SELECT ...", capturing the SELECT
+CREATE_AS_SELECT_PATTERN = re.compile(
+    r'^\s*CREATE\s+(?:TEMP\s+|TEMPORARY\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(?:"[^"]+"|[\w.]+)\s+AS\s+(SELECT\b.*)$',
+    re.IGNORECASE | re.S
+)
+
+# "SELECT items FROM table [WHERE ...]" over a single table without an alias
+SINGLE_TABLE_SELECT_PATTERN = re.compile(r"^\s*SELECT\s+(.*?)\s+FROM\s+(\w+)\s*(?:$|;|WHERE\b)", re.IGNORECASE | re.S)
+
+# Text sql_tokens() does not return as tokens: string literals, quoted identifiers and comments
+UNTOKENIZED_PATTERN = re.compile(r"['\"`]|--|/\*")
+
+# The SELECT that builds a CREATE TABLE ... AS statement's table (None for other statements)
+def create_select(q):
+    match = CREATE_AS_SELECT_PATTERN.match(q)
+    return match.group(1).strip().rstrip(";") if match else None
+
+# Where the query of a SELECT statement, or of a CREATE TABLE ... AS SELECT, starts in masked text;
+# None for every other statement (UPDATE, DELETE, other CREATEs), whose text rewrites must leave alone
+def select_query_start(masked):
+    # Leading comments are blanked to "\0", so they are skipped with the whitespace
+    start = len(masked) - len(masked.lstrip("\0 \t\r\n"))
+    if re.match(r"SELECT\b", masked[start:], re.IGNORECASE):
+        return start
+    match = CREATE_AS_SELECT_PATTERN.match(masked[start:])
+    return start + match.start(1) if match else None
+
+# Split a select list on the commas outside parentheses and string literals
+def split_select_list(text):
+    items, depth, start = [], 0, 0
+    for match in re.finditer(r"'(?:[^']|'')*'|[(),]", text):
+        char = match.group(0)
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            items.append(text[start:match.start()].strip())
+            start = match.end()
+    items.append(text[start:].strip())
+    return items
+
+# Whether tokens form one self-contained expression (a function call, a parenthesized expression or
+# a CASE ... END), so replacing it by a column name cannot change how the operators around it bind
+def is_atomic_expression(tokens):
+    lowered = [token.lower() for token in tokens]
+    if len(lowered) < 3:
+        return False
+    if lowered[0] == "case":
+        opening, closing, k = "case", "end", 0
+    elif lowered[0] == "(":
+        opening, closing, k = "(", ")", 0
+    elif re.fullmatch(r"[a-z_]\w*", lowered[0]) and lowered[1] == "(":
+        opening, closing, k = "(", ")", 1
+    else:
+        return False
+    depth = 0
+    for position, token in enumerate(lowered[k:], start=k):
+        depth += (token == opening) - (token == closing)
+        if depth == 0:
+            return position == len(lowered) - 1
+    return False
+
+# For a row-local "SELECT ... FROM table [WHERE ...]", the table, the columns it copies unchanged
+# (lowercased; None for "*") and the (expression, alias) of each derived column; None for other shapes
+def derived_columns(q):
+    match = SINGLE_TABLE_SELECT_PATTERN.match(q)
+    if match is None or not row_local(q):
+        return None
+    copied, expressions = set(), []
+    for item in split_select_list(match.group(1)):
+        if item == "*":
+            copied = None
+        elif re.fullmatch(r"\w+", item):
+            if copied is not None:
+                copied.add(item.lower())
+        else:
+            derived = re.fullmatch(r"(.+?)\s+AS\s+(\w+)", item, re.IGNORECASE | re.S)
+            if derived is not None:
+                expressions.append((derived.group(1).strip(), derived.group(2)))
+    return match.group(2), copied, expressions
+
+# Table each name or alias in the FROM, JOIN and UPDATE clauses refers to, keyed by lowercase name
+# (e.g. {"d": "temp_twenty_one", "temp_twenty_one": "temp_twenty_one"})
+def table_aliases(q):
+    tokens = sql_tokens(q)
+    lowered = [token.lower() for token in tokens]
+    aliases = {}
+    for k in range(len(tokens) - 1):
+        if lowered[k] not in ("from", "join", "update"):
+            continue
+        j = k + 1
+        while j < len(tokens) and tokens[j] != "(":
+            if j + 2 < len(tokens) and tokens[j + 1] == ".":
+                j += 2
+            name = tokens[j]
+            if name.lower() in CLAUSE_KEYWORDS:
+                break
+            aliases[name.lower()] = name
+            j += 1
+            if j < len(tokens) and lowered[j] == "as":
+                j += 1
+            if j < len(tokens) and lowered[j] not in CLAUSE_KEYWORDS and tokens[j] not in (",", ")", ";"):
+                aliases[lowered[j]] = name
+                j += 1
+            if lowered[k] == "from" and j < len(tokens) and tokens[j] == ",":
+                j += 1
+                continue
+            break
+    return aliases
+
+# Columns compared between two tables with "=" (a.x = b.y), as the key each table is looked up by:
+# {"patients": {("subject_id",)}, "temp_sixteen": {("subject_id",)}} for
+# patients.subject_id = temp_sixteen.subject_id. Names are lowercase table names or aliases.
+def equality_keys(q):
+    tokens = sql_tokens(q)
+    lowered = [token.lower() for token in tokens]
+    pairs = {}
+    for k in range(len(tokens) - 6):
+        if tokens[k + 1] == "." and tokens[k + 3] == "=" and tokens[k + 5] == ".":
+            left, right = lowered[k], lowered[k + 4]
+            if left != right:
+                pairs.setdefault((left, right), []).append((lowered[k + 2], lowered[k + 6]))
+    keys = {}
+    for (left, right), columns in pairs.items():
+        keys.setdefault(left, set()).add(tuple(dict.fromkeys(col for col, _ in columns)))
+        keys.setdefault(right, set()).add(tuple(dict.fromkeys(col for _, col in columns)))
+    return keys
+
+# "NOT EXISTS (" opening a subquery
+NOT_EXISTS_PATTERN = re.compile(r"\bNOT\s+EXISTS\s*\(", re.IGNORECASE)
+
+# The subquery of NOT EXISTS: one filtered table, optionally aliased
+FILTERED_TABLE_PATTERN = re.compile(
+    r"\s*SELECT\s+.+?\s+FROM\s+(\w+)(?:\s+(?:AS\s+)?(?!WHERE\b)(\w+))?\s+WHERE\s+(.+?)\s*", re.IGNORECASE | re.S
+)
+
+# A condition comparing two qualified columns: "a.x = b.y"
+COLUMN_EQUALITY_PATTERN = re.compile(r"\s*(\w+)\.(\w+)\s*=\s*(\w+)\.(\w+)\s*")
+
+# Words that make a NOT EXISTS subquery more than a filter over one table joined to the outer row by equalities
+NOT_EXISTS_BLOCKERS = {
+    "join", "natural", "union", "except", "intersect", "group", "having", "order", "limit", "window", "or", "between",
+}
+
+# The anti-join equivalent to one NOT EXISTS subquery (its text between the parentheses), or None
+# when it has another shape. See decorrelate_not_exists.
+def anti_join(body, masked_body, table_columns, outer_columns):
+    tokens = [token.lower() for token in sql_tokens(body)]
+    match = FILTERED_TABLE_PATTERN.fullmatch(masked_body)
+    if match is None or tokens.count("select") != 1 or NOT_EXISTS_BLOCKERS & set(tokens):
+        return None
+    table, alias = match.group(1), match.group(2)
+    inner = alias or table
+    inner_columns = table_columns(table)
+    if inner_columns is None:
+        return None
+    inner_columns = {col.lower() for col in inner_columns}
+    keys, filters = [], []
+    for start, end in conjunct_spans(masked_body[match.start(3):match.end(3)]):
+        start, end = match.start(3) + start, match.start(3) + end
+        equality = COLUMN_EQUALITY_PATTERN.fullmatch(masked_body[start:end])
+        if equality and (equality.group(1).lower() == inner.lower()) != (equality.group(3).lower() == inner.lower()):
+            if equality.group(1).lower() == inner.lower():
+                keys.append((f"{equality.group(3)}.{equality.group(4)}", f"{inner}.{equality.group(2)}"))
+            else:
+                keys.append((f"{equality.group(1)}.{equality.group(2)}", f"{inner}.{equality.group(4)}"))
+            continue
+        # Any other condition may only read the subquery's own table
+        term = sql_tokens(body[start:end])
+        qualifiers = {term[k].lower() for k in range(len(term) - 1) if term[k + 1] == "."}
+        names = {
+            token.lower() for k, token in enumerate(term)
+            if re.fullmatch(r"[A-Za-z_]\w*", token) and term[k + 1:k + 2] != ["("] and term[k - 1:k] != ["."]
+        }
+        if qualifiers - {inner.lower()} or names & (outer_columns - inner_columns):
+            return None
+        filters.append(f"({body[start:end].strip()})")
+    if not keys:
+        return None
+    outer_keys = [outer for outer, _ in keys]
+    inner_keys = [inner_key for _, inner_key in keys]
+    lhs = outer_keys[0] if len(keys) == 1 else f"({', '.join(outer_keys)})"
+    source = f"{table} AS {alias}" if alias else table
+    where = " AND ".join(filters + [f"{inner_key} IS NOT NULL" for inner_key in inner_keys])
+    missing = " OR ".join(f"{outer} IS NULL" for outer in outer_keys)
+    return f"({lhs} NOT IN (SELECT {', '.join(inner_keys)} FROM {source} WHERE {where}) OR {missing})"
+
+# Rewrite "NOT EXISTS (SELECT ... FROM t WHERE <filters> AND t.x = outer.x AND ...)" into the set-based
+# "(outer.x, ...) NOT IN (SELECT t.x, ... FROM t WHERE <filters> AND t.x IS NOT NULL ...) OR outer.x IS NULL ...".
+# SQLite evaluates the correlated form once per outer row; the NOT IN list is built once and probed,
+# so the statement becomes a hash-style anti-join. The NULL terms keep NOT EXISTS semantics: a missing
+# key matches nothing. table_columns(name) returns a table's columns (None if unknown), so filters that
+# would read the outer row are recognized and such subqueries are left as written.
+def decorrelate_not_exists(q, table_columns):
+    masked = mask_literals(q)
+    if not NOT_EXISTS_PATTERN.search(masked):
+        return q
+    outer_columns = set()
+    for name in statement_tables(q)["reads"]:
+        outer_columns |= {col.lower() for col in table_columns(name) or []}
+    for match in reversed(list(NOT_EXISTS_PATTERN.finditer(masked))):
+        close_at = closing_paren(masked, match.end() - 1)
+        if close_at is None:
+            continue
+        replacement = anti_join(q[match.end():close_at], masked[match.end():close_at], table_columns, outer_columns)
+        if replacement is not None:
+            q = q[:match.start()] + replacement + q[close_at + 1:]
+            masked = masked[:match.start()] + mask_literals(replacement) + masked[close_at + 1:]
+    return q
+
+# Replace dotted MIMIC table names with the aliases registered in the engine
+def apply_alias_map(sql, alias_map):
+    for original, alias in alias_map.items():
+        sql = sql.replace(original, alias)
+    return sql
+
+# Tables one statement reads, writes (any change, including DROP), creates and drops.
+# Reads are the tables named after FROM/JOIN (plus the target of DELETE/UPDATE/ALTER/INSERT);
+# when known_tables is given, names that are not tables (e.g. CTE names) are left out.
+def statement_tables(q, known_tables=None):
+    tokens = sql_tokens(q)
+    lowered = [token.lower() for token in tokens]
+    reads, writes, creates, drops = set(), set(), set(), set()
+    if not lowered:
+        return {"reads": reads, "writes": writes, "creates": creates, "drops": drops}
+    kind = lowered[0]
+    start = 1
+    if kind in ("create", "drop", "alter"):
+        k = 1
+        while k < len(lowered) and lowered[k] in ("temp", "temporary", "table", "if", "not", "exists"):
+            k += 1
+        if k < len(tokens) and "table" in lowered[1:k]:
+            target = tokens[k]
+            writes.add(target)
+            if kind == "create":
+                creates.add(target)
+            elif kind == "drop":
+                drops.add(target)
+            else:
+                reads.add(target)
+            start = k + 1
+    elif kind in ("delete", "insert") and len(tokens) > 2:
+        target = tokens[2] if lowered[1] in ("from", "into") else tokens[1]
+        writes.add(target)
+        reads.add(target)
+        start = 3
+    elif kind == "update" and len(tokens) > 1:
+        writes.add(tokens[1])
+        reads.add(tokens[1])
+        start = 2
+    cte_names = {lowered[k] for k in range(len(lowered) - 2) if lowered[k + 1] == "as" and lowered[k + 2] == "("}
+    for k in range(start, len(tokens) - 1):
+        if lowered[k] not in ("from", "join"):
+            continue
+        j = k + 1
+        while j < len(tokens):
+            if tokens[j] == "(":
+                break
+            name = tokens[j]
+            if j + 2 < len(tokens) and tokens[j + 1] == ".":
+                # schema-qualified name such as base.table
+                j += 2
+                name = tokens[j]
+            if name.lower() not in cte_names and name.lower() not in CLAUSE_KEYWORDS:
+                reads.add(name)
+            j += 1
+            # skip an optional alias, then continue through comma-separated FROM lists
+            if j < len(tokens) and lowered[j] == "as":
+                j += 1
+            if j < len(tokens) and lowered[j] not in CLAUSE_KEYWORDS and tokens[j] not in (",", ")", ";"):
+                j += 1
+            if lowered[k] == "from" and j < len(tokens) and tokens[j] == ",":
+                j += 1
+                continue
+            break
+    # SQLite table names are case-insensitive
+    reads, writes, creates, drops = [{name.lower() for name in names} for names in (reads, writes, creates, drops)]
+    if known_tables is not None:
+        known = {name.lower() for name in known_tables} | writes
+        reads = {name for name in reads if name in known}
+    return {"reads": reads, "writes": writes, "creates": creates, "drops": drops}
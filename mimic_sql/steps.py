@@ -0,0 +1,64 @@
+from mimic_sql.engine import run_dml
+from mimic_sql.profiling import StepProfiler
+from mimic_sql.sql_parse import split_statements
+
+# --- Step Execution ---
+
+def run_step(sql_query, engine, result_cache=None, transform=None):
+    """
+    Run one step's statements (table names already aliased) and return its messages,
+    a ResultHandle for its last SELECT (None if it has none) and the profile of each statement.
+    Statements run against a persistent SQLEngine, so temp tables stay inside it between
+    statements and steps, and SELECT results are only read back a page at a time.
+    DELETE, UPDATE and ALTER TABLE statements change the engine's tables in place.
+    CREATE results are looked up in result_cache when one is given; transform prepares the
+    rows fetched from the SELECT result for display.
+    Nothing here touches Streamlit, so steps can run on a background worker or from the command line.
+    """
+    messages = []
+    log = messages.append
+    step_result = None
+    profiler = StepProfiler(engine)
+    for q in split_statements(sql_query):
+        q_upper = q.upper()
+        with profiler.statement(q):
+            if q_upper.startswith("DROP TABLE IF EXISTS"):
+                drop_table_name = q.split()[-1]
+                if engine.is_base_table(drop_table_name):
+                    log(f"Warning: `{drop_table_name}` is a shared read-only base table and cannot be dropped.")
+                elif engine.has_table(drop_table_name):
+                    engine.execute(q)
+                    log(f"🗑️ `{drop_table_name}` DROP.")
+            elif q_upper.startswith("CREATE TEMP TABLE") or q_upper.startswith("CREATE TABLE"):
+                temp_table_name = q.split("AS")[0].split()[-1]
+                if engine.has_table(temp_table_name):
+                    engine.execute(f'DROP TABLE "{temp_table_name}"')
+                engine.execute(q, cache=result_cache)
+                if engine.last_from_cache:
+                    log(f"⚡ CREATE complete: Table {temp_table_name} restored from the result cache.")
+                else:
+                    log(f"✅ CREATE complete: Table {temp_table_name} created.")
+            elif q_upper.startswith(("ALTER TABLE", "UPDATE", "DELETE")):
+                # Data changes run in place inside the SQL engine
+                log(run_dml(engine, q))
+            elif q_upper.startswith("SELECT"):
+                # The result stays in the engine; only the rows that are read become a DataFrame
+                step_result = engine.result(q, transform=transform)
+                log(f"✅ SELECT complete: Query executed successfully ({step_result.num_rows:,} rows).")
+            else:
+                log("Warning: Statement not supported. Only DROP, CREATE, ALTER, UPDATE, DELETE, and SELECT are supported.")
+        # Show how SQLite ran the statement, so slow steps can be traced to scans, index use and reuse
+        statement = profiler.statements[-1]
+        if statement["served_from"]:
+            log(f"♻️ Rows shown from `{statement['served_from']}`, which was just built by the same SELECT.")
+        for table_name, column in statement["reused_columns"]:
+            log(f"♻️ Reused `{table_name}`.`{column}` instead of evaluating its expression again.")
+        for table_name, columns in statement["indexes_created"]:
+            log(f"📇 Index created on `{table_name}` ({', '.join(columns)}) for lookups by key.")
+        if statement["query_plan"]:
+            plan = "\n".join(statement["query_plan"])
+            log(f"🧭 Query plan:\n```\n{plan}\n```")
+    log(profiler.summary())
+    if result_cache is not None:
+        log(result_cache.summary())
+    return messages, step_result, profiler.statements
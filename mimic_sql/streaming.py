@@ -0,0 +1,156 @@
+import os
+import sqlite3
+from mimic_sql.engine import SQLEngine
+from mimic_sql.profiling import profile_summary
+from mimic_sql.result_cache import combine_fingerprints
+from mimic_sql.sql_parse import (
+    create_select, normalize_sql, referenced_base_columns, row_local, split_statements, statement_tables
+)
+from mimic_sql.steps import run_step
+
+# Rows of the streamed table processed at a time; override with MIMIC_SQL_STREAM_CHUNK_ROWS
+DEFAULT_CHUNK_ROWS = 250_000
+
+# Arrow tables with more rows than this are streamed instead of loaded; override with MIMIC_SQL_STREAM_ROWS
+DEFAULT_STREAM_ROWS = 2_000_000
+
+# Profile fields added up over the chunks a statement ran on
+SUMMED_PROFILE_FIELDS = ["wall_seconds", "engine_seconds", "convert_seconds", "rows_in", "rows_out", "engine_bytes_delta"]
+
+# --- Settings ---
+
+# Rows per chunk
+def stream_chunk_rows():
+    return max(1, int(os.environ.get("MIMIC_SQL_STREAM_CHUNK_ROWS", DEFAULT_CHUNK_ROWS)))
+
+# Row count above which a table is streamed
+def stream_row_threshold():
+    return int(os.environ.get("MIMIC_SQL_STREAM_ROWS", DEFAULT_STREAM_ROWS))
+
+# --- Streaming Runs ---
+
+# Why the steps cannot be streamed over a table (None when they can): every statement except the
+# displayed SELECTs must be row-local, read only the streamed table or tables the steps created
+# before it, and change only tables the steps create. step_sql maps step index -> aliased SQL.
+def streaming_problem(step_sql, table_name):
+    statements = [
+        (i, q, statement_tables(q)) for i, sql_query in sorted(step_sql.items())
+        for q in split_statements(sql_query) if not q.upper().startswith("SELECT")
+    ]
+    creates = {name.lower() for _, _, tables in statements for name in tables["creates"]}
+    created = set()
+    for i, q, tables in statements:
+        created |= {name.lower() for name in tables["creates"]}
+        if not row_local(q):
+            return f"step {i} combines rows: {normalize_sql(q)[:80]}"
+        reads = {name.lower() for name in tables["reads"]} - created - {table_name.lower()}
+        if reads:
+            return f"step {i} reads {', '.join(sorted(reads))}, which is not streamed"
+        writes = {name.lower() for name in tables["writes"]} - creates
+        if writes:
+            return f"step {i} changes {', '.join(sorted(writes))}, which it did not create"
+    return None
+
+# Add the profiles of one chunk's statements to the totals of earlier chunks
+def add_profiles(totals, statements):
+    if not totals:
+        return [dict(entry) for entry in statements]
+    for total, entry in zip(totals, statements):
+        for field in SUMMED_PROFILE_FIELDS:
+            if entry[field] is not None:
+                total[field] = round((total[field] or 0) + entry[field], 4)
+        if entry["peak_rss_delta_bytes"] is not None:
+            total["peak_rss_delta_bytes"] = max(total["peak_rss_delta_bytes"] or 0, entry["peak_rss_delta_bytes"])
+    return totals
+
+def stream_steps(step_sql, table_name, source, engine, chunk_rows=None, should_stop=None, progress=None,
+                 chunk_transform=None, display_transform=None):
+    """
+    Run steps that passed streaming_problem() over a large table one chunk of rows at a time.
+    source is the table as a (memory-mapped) pyarrow Table; only the columns the steps use are read.
+    Each chunk is loaded into a small worker engine, the steps' statements other than SELECT run there,
+    and the tables they create are appended to the session engine's tables of the same names, so memory
+    holds one chunk plus the rows the steps keep rather than the whole table. Once every chunk is done,
+    each step's SELECT statements run on the session engine for display.
+    should_stop() is checked between chunks; progress(rows_done, total_rows) is called after each one.
+    chunk_transform, when given, prepares every chunk DataFrame (tables prepared at ingest need none);
+    display_transform(i), when given, returns the transform for the rows of step i's SELECT result.
+    Warnings a statement gave on any chunk (e.g. a failed UPDATE) are kept and shown with the step's
+    messages, along with how many chunks gave them.
+    Returns {step index: (messages, ResultHandle or None, statement profiles)} like run_step.
+    """
+    chunk_rows = chunk_rows or stream_chunk_rows()
+    steps = sorted(step_sql)
+    stream_sql = {i: ";\n".join(q for q in split_statements(step_sql[i]) if not q.upper().startswith("SELECT")) for i in steps}
+    created = []
+    for i in steps:
+        for q in split_statements(stream_sql[i]):
+            created += [name for name in statement_tables(q)["creates"] if name not in created]
+    columns = referenced_base_columns(" ".join(stream_sql.values()), {table_name: source.column_names}, created)
+    source = source.select(columns.get(table_name) or source.column_names)
+    # Earlier versions of the created tables are replaced, as a normal run would
+    for name in created:
+        if engine.has_session_table(name):
+            engine.execute(f'DROP TABLE "{name}"')
+    profiles = {i: [] for i in steps}
+    # Per step: each warning its statements gave and the number of chunks that gave it
+    warnings = {i: {} for i in steps}
+    num_chunks = 0
+    for offset in range(0, max(source.num_rows, 1), chunk_rows):
+        if should_stop is not None and should_stop():
+            for name in created:
+                if engine.has_session_table(name):
+                    engine.execute(f'DROP TABLE "{name}"')
+            raise sqlite3.OperationalError("interrupted")
+        df = source.slice(offset, chunk_rows).to_pandas()
+        if chunk_transform is not None:
+            df = chunk_transform(df)
+        worker = SQLEngine()
+        try:
+            worker.register(table_name, df)
+            del df
+            for i in steps:
+                messages, _, statements = run_step(stream_sql[i], worker)
+                profiles[i] = add_profiles(profiles[i], statements)
+                for message in messages:
+                    if message.startswith("Warning"):
+                        warnings[i][message] = warnings[i].get(message, 0) + 1
+            for name in created:
+                if worker.has_session_table(name):
+                    engine.append_table(name, worker.snapshot_table(name), temp=worker.table_schema(name) == "temp")
+        finally:
+            worker.close()
+        num_chunks += 1
+        if progress is not None:
+            progress(min(offset + chunk_rows, source.num_rows), source.num_rows)
+    # The streamed tables' contents follow from the source table and the statements that built them
+    stream_key = combine_fingerprints(engine.table_fingerprint(table_name) or "", *(normalize_sql(stream_sql[i]) for i in steps))
+    for name in created:
+        if engine.has_session_table(name):
+            engine.fingerprints[name.lower()] = combine_fingerprints(stream_key, name.lower())
+    # A table no later statement changed, built from tables no later statement changed, holds its
+    # SELECT's rows over the whole source table, so display SELECTs repeating it can be served from it
+    statements = [q for i in steps for q in split_statements(stream_sql[i])]
+    for k, q in enumerate(statements):
+        select_sql = create_select(q)
+        if select_sql is None:
+            continue
+        later_writes = {name.lower() for later in statements[k + 1:] for name in statement_tables(later)["writes"]}
+        tables = statement_tables(q)
+        if not later_writes & {name.lower() for name in tables["creates"] | tables["reads"]}:
+            engine.record_created(next(iter(tables["creates"])), select_sql)
+    outputs = {}
+    for i in steps:
+        step_tables = [name for q in split_statements(stream_sql[i]) for name in statement_tables(q)["creates"]]
+        messages = [
+            f"🌊 `{name}` streamed from `{table_name}` in {num_chunks} chunks of up to {chunk_rows:,} rows "
+            f"({engine.row_count(name):,} rows)."
+            for name in step_tables if engine.has_session_table(name)
+        ]
+        messages += [f"{message} (in {count} of {num_chunks} chunks)" for message, count in warnings[i].items()]
+        select_sql = ";\n".join(q for q in split_statements(step_sql[i]) if q.upper().startswith("SELECT"))
+        transform = display_transform(i) if display_transform is not None else None
+        select_messages, step_result, statements = run_step(select_sql, engine, transform=transform)
+        statements = profiles[i] + statements
+        outputs[i] = (messages + select_messages[:-1] + [profile_summary(statements)], step_result, statements)
+    return outputs
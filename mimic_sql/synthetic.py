@@ -0,0 +1,440 @@
+import argparse
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from mimic_sql.data_store import ARROW_EXTENSION, CODE_SET_SUFFIX, PREPARED_METADATA_KEY, discover_tables
+from mimic_sql.examples import DISEASE_DATA_DIR
+
+# Patients per unit of scale: scale 1 has as many patients as the shipped patients table, and
+# full MIMIC-IV (about 300,000 patients) is roughly scale 6
+PATIENTS_PER_SCALE = 50_000
+
+# Patients generated (and written) at a time; memory use grows with this, not with the scale
+DEFAULT_CHUNK_PATIENTS = 50_000
+
+# Per-patient and per-visit rates taken from the full MIMIC-IV 2.x row counts
+ADMISSIONS_PER_PATIENT = 1.44
+MAX_ADMISSIONS = 50
+DIAGNOSES_PER_ADMISSION = 11.0
+MAX_SEQ_NUM = 39
+ED_ARRIVAL_SHARE = 0.65
+ED_ONLY_VISITS_PER_PATIENT = 0.5
+ED_DIAGNOSES_PER_STAY = 2.1
+MAX_ED_SEQ_NUM = 9
+PRESCRIPTIONS_PER_ADMISSION = 35.7
+DEATH_SHARE = 0.1
+FEMALE_SHARE = 0.53
+ICD10_SHARE = 0.45
+
+# Share of diagnosis rows coded with one of the patient's conditions (the rest are background codes)
+CONDITION_CODE_SHARE = 0.3
+
+# Share of patients with each code-set condition; code sets not listed use DEFAULT_PREVALENCE
+CONDITION_PREVALENCE = {
+    "hypertension_icd_codes": 0.35,
+    "heart_type_disease_icd_codes": 0.3,
+    "hyperlipidemia_icd_codes": 0.25,
+    "diabetes_icd_codes": 0.2,
+    "all_psychiatric_disorders_icd_codes": 0.2,
+    "neurological_type_disease_icd_codes": 0.1,
+    "ischemic_stroke_icd_codes": 0.04,
+    "psychosis_icd_codes": 0.03,
+    "hemorrhagic_stroke_icd_codes": 0.015,
+}
+DEFAULT_PREVALENCE = 0.05
+
+# Distinct background (non code-set) ICD codes per version; they are drawn with Zipf-like frequencies
+BACKGROUND_CODES = 8_000
+
+# Common drugs: name, dose unit, usual doses and relative frequency. The first Step 1 search
+# terms (aspirin, warfarin, clopidogrel, ...) are included so the drug pipeline finds rows.
+COMMON_DRUGS = [
+    ("Insulin", "UNIT", ["2", "4", "6", "8", "10"], 57),
+    ("0.9% Sodium Chloride", "mL", ["1000", "500", "250", "100"], 35),
+    ("Potassium Chloride", "mEq", ["10", "20", "40"], 34),
+    ("Sodium Chloride 0.9%  Flush", "mL", ["3", "10"], 34),
+    ("Acetaminophen", "mg", ["325", "500", "650", "1000"], 28),
+    ("Furosemide", "mg", ["20", "40", "80"], 24),
+    ("Heparin", "UNIT", ["5000", "1000", "25000"], 20),
+    ("Magnesium Sulfate", "gm", ["1", "2", "4"], 20),
+    ("Docusate Sodium", "mg", ["100"], 18),
+    ("5% Dextrose", "mL", ["250", "500", "1000"], 18),
+    ("Senna", "TAB", ["1", "2"], 16),
+    ("Ondansetron", "mg", ["4", "8"], 14),
+    ("Pantoprazole", "mg", ["40"], 14),
+    ("Metoprolol Tartrate", "mg", ["12.5", "25", "50"], 14),
+    ("Bisacodyl", "mg", ["5", "10"], 12),
+    ("Polyethylene Glycol", "g", ["17"], 12),
+    ("Oxycodone (Immediate Release)", "mg", ["5", "10"], 12),
+    ("Vancomycin", "mg", ["1000", "1250", "1500"], 10),
+    ("Atorvastatin", "mg", ["10", "20", "40", "80"], 10),
+    ("Aspirin", "mg", ["81", "325"], 10),
+    ("Lorazepam", "mg", ["0.5", "1", "2"], 8),
+    ("Lisinopril", "mg", ["5", "10", "20", "40"], 8),
+    ("Amlodipine", "mg", ["5", "10"], 8),
+    ("Morphine Sulfate", "mg", ["2", "4"], 6),
+    ("Enoxaparin Sodium", "mg", ["30", "40", "60", "80"], 6),
+    ("Simvastatin", "mg", ["10", "20", "40"], 6),
+    ("Metformin (Glucophage)", "mg", ["500", "850", "1000"], 6),
+    ("Ceftriaxone", "gm", ["1", "2"], 6),
+    ("Albuterol 0.083% Neb Soln", "NEB", ["1"], 5),
+    ("Hydromorphone (Dilaudid)", "mg", ["0.5", "1", "2"], 5),
+    ("Warfarin", "mg", ["1", "2", "2.5", "5"], 4),
+    ("Clopidogrel", "mg", ["75", "300"], 4),
+    ("Ipratropium Bromide Neb", "NEB", ["1"], 4),
+    ("Haloperidol", "mg", ["0.5", "1", "2", "5"], 4),
+    ("Olanzapine", "mg", ["2.5", "5", "10"], 4),
+    ("Quetiapine Fumarate", "mg", ["25", "50", "100"], 4),
+    ("Dextrose 50%", "mL", ["25", "50"], 4),
+    ("Aspirin EC", "mg", ["81", "325"], 3),
+    ("Apixaban", "mg", ["2.5", "5"], 3),
+    ("Spironolactone", "mg", ["25", "50"], 3),
+    ("Rivaroxaban", "mg", ["10", "15", "20"], 2),
+    ("Influenza Vaccine Quadrivalent", "mL", ["0.5"], 2),
+    ("Nicotine Patch", "mg", ["7", "14", "21"], 2),
+    ("Dabigatran Etexilate", "mg", ["75", "150"], 1),
+    ("Cilostazol", "mg", ["50", "100"], 0.5),
+]
+
+# Rarely prescribed drugs with made-up names fill the long tail of distinct drug names
+RARE_DRUGS = 900
+RARE_DRUG_WEIGHT = 0.1
+RARE_DRUG_UNITS = ["mg", "mg", "mg", "mL", "mcg", "UNIT", "TAB", "CAP", "gm", "mEq", "Appl", "BAG", "PTCH", "mg/kg"]
+
+# Shares of prescription rows with no dose, a zero dose, no stop time, or a stop time before the start
+MISSING_DOSE_SHARE = 0.0006
+ZERO_DOSE_SHARE = 0.004
+MISSING_STOP_SHARE = 0.00025
+STOP_BEFORE_START_SHARE = 0.01
+
+# Table files written to the disease and drug data directories
+DISEASE_TABLES = ["mimiciv_hosp.patients", "mimiciv_hosp.admissions", "mimiciv_hosp.diagnoses_icd", "mimic_ed.edstays", "mimic_ed.diagnosis"]
+DRUG_TABLES = ["mimiciv_hosp.prescriptions"]
+
+# Arrow schemas matching the column names and (once read back into pandas) the dtypes of the shipped .pkl files
+TABLE_SCHEMAS = {
+    "mimiciv_hosp.patients": pa.schema([
+        ("subject_id", pa.int64()), ("gender", pa.string()), ("anchor_age", pa.int64()),
+        ("anchor_year", pa.int64()), ("dod", pa.date32()),
+    ]),
+    "mimiciv_hosp.admissions": pa.schema([("subject_id", pa.int64()), ("admittime", pa.timestamp("ns"))]),
+    "mimiciv_hosp.diagnoses_icd": pa.schema([
+        ("subject_id", pa.int64()), ("seq_num", pa.int64()), ("icd_code", pa.string()), ("icd_version", pa.int64()),
+    ]),
+    "mimic_ed.edstays": pa.schema([("subject_id", pa.int64()), ("intime", pa.timestamp("ns"))]),
+    "mimic_ed.diagnosis": pa.schema([
+        ("subject_id", pa.int64()), ("seq_num", pa.int64()), ("icd_code", pa.string()), ("icd_version", pa.int64()),
+    ]),
+    "mimiciv_hosp.prescriptions": pa.schema([
+        ("subject_id", pa.int64()), ("drug", pa.string()), ("dose_val_rx", pa.string()), ("dose_unit_rx", pa.string()),
+        ("starttime", pa.timestamp("ns")), ("stoptime", pa.timestamp("ns")),
+    ]),
+}
+
+MINUTE_NS = 60 * 10**9
+HOUR_NS = 60 * MINUTE_NS
+DAY_NS = 24 * HOUR_NS
+YEAR_NS = 365 * DAY_NS
+
+# First subject_id, and the largest gap between consecutive ones (MIMIC ids are sparse 8-digit numbers)
+FIRST_SUBJECT_ID = 10_000_000
+MAX_SUBJECT_ID_GAP = 60
+
+# --- Vectorized Helpers ---
+
+# Position of each row within its group, for groups of the given sizes laid out one after another
+def group_positions(counts):
+    starts = np.cumsum(counts) - counts
+    return np.arange(counts.sum()) - np.repeat(starts, counts)
+
+# Start of each year as int64 nanoseconds since the epoch
+def year_start_ns(years):
+    return (np.asarray(years) - 1970).astype("datetime64[Y]").astype("datetime64[ns]").astype(np.int64)
+
+# Round nanosecond timestamps down to a unit (minutes for admissions, hours for prescriptions)
+def floor_ns(values, unit):
+    return values - values % unit
+
+# Pick one value per row from a string vocabulary, as an Arrow string array
+def take_strings(vocabulary, indices):
+    return pc.take(pa.array(vocabulary, pa.string()), pa.array(indices, pa.int64()))
+
+# --- ICD Codes ---
+
+class DiagnosisCoder:
+    """
+    Draws ICD codes for diagnosis rows. Every patient gets a set of conditions (one per *_icd_codes
+    code set, at CONDITION_PREVALENCE), and a share of their diagnosis rows is coded with a code from
+    one of their conditions' sets, so the cohort steps find cases, controls and comorbidities and a
+    patient's codes recur across visits. Other rows get background codes that are in no code set.
+    Code set values are stripped of whitespace, as the disease page does when it loads them.
+    """
+
+    def __init__(self, code_sets, seed=0):
+        rng = np.random.default_rng(seed)
+        self.names = sorted(code_sets)
+        self.prevalence = np.array([CONDITION_PREVALENCE.get(name, DEFAULT_PREVALENCE) for name in self.names])
+        # Codes of each (code set, version), as numpy object arrays
+        self.set_codes = {}
+        known = {9: set(), 10: set()}
+        for k, name in enumerate(self.names):
+            df = code_sets[name]
+            codes = df["icd_code"].astype(str).str.replace(r"\s+", "", regex=True)
+            for version in (9, 10):
+                values = codes[df["icd_version"] == version].unique()
+                self.set_codes[k, version] = np.array(values, dtype=object)
+                known[version].update(values)
+        self.background = {version: self.background_vocabulary(version, known[version], rng) for version in (9, 10)}
+        weights = 1.0 / np.arange(1, BACKGROUND_CODES + 1) ** 1.1
+        self.background_weights = weights / weights.sum()
+
+    # Made-up ICD-9 (digits, or V + digits) or ICD-10 (letter + digits) codes that are in no code set
+    def background_vocabulary(self, version, exclude, rng):
+        vocabulary = []
+        seen = set(exclude)
+        while len(vocabulary) < BACKGROUND_CODES:
+            if version == 9:
+                digits = str(rng.integers(1, 99_999)).zfill(rng.integers(3, 6))
+                code = ("V" + digits[1:4]) if rng.random() < 0.1 else digits
+            else:
+                code = chr(ord("A") + rng.integers(0, 26)) + str(rng.integers(0, 10**rng.integers(2, 5))).zfill(2)
+            if code not in seen:
+                seen.add(code)
+                vocabulary.append(code)
+        return np.array(vocabulary, dtype=object)
+
+    # Which conditions each of n patients has, as an (n, code sets) boolean matrix
+    def patient_conditions(self, n, rng):
+        return rng.random((n, len(self.names))) < self.prevalence
+
+    # ICD codes for diagnosis rows, given each row's patient conditions and ICD version
+    def draw(self, conditions, versions, rng):
+        codes = np.empty(len(versions), dtype=object)
+        # Condition rows pick one of the patient's conditions at random
+        scores = rng.random(conditions.shape, dtype=np.float32) * conditions
+        chosen = scores.argmax(axis=1)
+        use_condition = conditions.any(axis=1) & (rng.random(len(versions)) < CONDITION_CODE_SHARE)
+        for version in (9, 10):
+            in_version = versions == version
+            for k in range(len(self.names)):
+                rows = np.flatnonzero(use_condition & in_version & (chosen == k))
+                pool = self.set_codes[k, version]
+                if len(pool) == 0:
+                    use_condition[rows] = False
+                    continue
+                codes[rows] = pool[rng.integers(0, len(pool), len(rows))]
+            rows = np.flatnonzero(~use_condition & in_version)
+            codes[rows] = self.background[version][rng.choice(BACKGROUND_CODES, len(rows), p=self.background_weights)]
+        return pa.array(codes, pa.string())
+
+# Load the *_icd_codes tables of a data directory, returning them with the files they came from
+def load_code_sets(codes_dir):
+    code_sets, files = {}, {}
+    for table_name, path in discover_tables(codes_dir).items():
+        if not table_name.endswith(CODE_SET_SUFFIX):
+            continue
+        if path.endswith(ARROW_EXTENSION):
+            df = pa.ipc.open_file(path).read_pandas()
+        else:
+            df = pd.read_pickle(path)
+        code_sets[table_name] = df
+        files[table_name] = path
+    return code_sets, files
+
+# --- Prescriptions ---
+
+# Drug names, units, dose lists and sampling probabilities: the common drugs plus a made-up long tail
+def drug_vocabulary(seed=0):
+    rng = np.random.default_rng(seed)
+    stems = ["ab", "cal", "dor", "fen", "lo", "mar", "nex", "pra", "ro", "sta", "tel", "vi", "xo", "zan"]
+    suffixes = ["mab", "pril", "olol", "statin", "azole", "cillin", "pine", "done", "mide", "tinib", "vir", "zepam"]
+    drugs = list(COMMON_DRUGS)
+    names = {name.lower() for name, _, _, _ in drugs}
+    while len(drugs) < len(COMMON_DRUGS) + RARE_DRUGS:
+        name = ("".join(rng.choice(stems, rng.integers(1, 3))) + rng.choice(suffixes)).capitalize()
+        if rng.random() < 0.3:
+            name += f" {rng.choice(['Oral Solution', 'Cream', 'Inhaler', 'IV', 'Sulfate', 'HCl'])}"
+        if name.lower() in names:
+            continue
+        names.add(name.lower())
+        doses = [str(dose) for dose in sorted(rng.choice([1, 2, 5, 10, 25, 50, 100, 250, 500], rng.integers(1, 4), replace=False))]
+        drugs.append((name, str(rng.choice(RARE_DRUG_UNITS)), doses, RARE_DRUG_WEIGHT))
+    weights = np.array([weight for _, _, _, weight in drugs], dtype=float)
+    dose_counts = np.array([len(doses) for _, _, doses, _ in drugs])
+    return {
+        "names": np.array([name for name, _, _, _ in drugs], dtype=object),
+        "units": np.array([unit for _, unit, _, _ in drugs], dtype=object),
+        # Every drug's doses one after another; drug k's start at dose_offsets[k]
+        "doses": np.array([dose for _, _, doses, _ in drugs for dose in doses], dtype=object),
+        "dose_offsets": np.cumsum(dose_counts) - dose_counts,
+        "dose_counts": dose_counts,
+        "p": weights / weights.sum(),
+    }
+
+# Prescription rows for the given admissions (patient ids and admit times)
+def generate_prescriptions(subject_ids, admittimes, drugs, rng):
+    counts = rng.poisson(PRESCRIPTIONS_PER_ADMISSION, len(admittimes))
+    admission = np.repeat(np.arange(len(admittimes)), counts)
+    n = len(admission)
+    drug = rng.choice(len(drugs["names"]), n, p=drugs["p"])
+    dose = drugs["dose_offsets"][drug] + (rng.random(n) * drugs["dose_counts"][drug]).astype(np.int64)
+    missing = rng.random(n) < MISSING_DOSE_SHARE
+    zero = rng.random(n) < ZERO_DOSE_SHARE
+    dose_val_rx = pc.if_else(pa.array(zero), "0", take_strings(drugs["doses"], dose))
+    dose_val_rx = pc.if_else(pa.array(missing), pa.scalar(None, pa.string()), dose_val_rx)
+    dose_unit_rx = pc.if_else(pa.array(missing), pa.scalar(None, pa.string()), take_strings(drugs["units"], drug))
+    starttime = floor_ns(admittimes[admission] + rng.integers(0, 6 * DAY_NS, n), HOUR_NS)
+    duration = floor_ns(rng.exponential(30 * HOUR_NS, n).astype(np.int64), HOUR_NS)
+    duration = np.where(rng.random(n) < STOP_BEFORE_START_SHARE, -rng.integers(1, 24, n) * HOUR_NS, duration)
+    stoptime = pa.array(starttime + duration, pa.timestamp("ns"), mask=rng.random(n) < MISSING_STOP_SHARE)
+    return pa.table({
+        "subject_id": pa.array(subject_ids[admission], pa.int64()),
+        "drug": take_strings(drugs["names"], drug),
+        "dose_val_rx": dose_val_rx,
+        "dose_unit_rx": dose_unit_rx,
+        "starttime": pa.array(starttime, pa.timestamp("ns")),
+        "stoptime": stoptime,
+    }, schema=TABLE_SCHEMAS["mimiciv_hosp.prescriptions"])
+
+# --- Patients and Visits ---
+
+# Diagnosis rows (seq_num 1..n per visit) for visits of the given patients
+def generate_diagnoses(table_name, subject_ids, patients, versions, counts, conditions, coder, rng):
+    visit = np.repeat(np.arange(len(counts)), counts)
+    return pa.table({
+        "subject_id": pa.array(subject_ids[patients[visit]], pa.int64()),
+        "seq_num": pa.array(group_positions(counts) + 1, pa.int64()),
+        "icd_code": coder.draw(conditions[patients[visit]], versions[visit], rng),
+        "icd_version": pa.array(versions[visit], pa.int64()),
+    }, schema=TABLE_SCHEMAS[table_name])
+
+# Every table's rows for n patients whose subject_ids follow after_id
+def generate_chunk(n, after_id, coder, drugs, rng):
+    subject_ids = after_id + np.cumsum(rng.integers(1, MAX_SUBJECT_ID_GAP + 1, n))
+    anchor_age = np.clip(np.round(rng.normal(50, 20, n)), 18, 91).astype(np.int64)
+    anchor_year = rng.integers(2110, 2201, n)
+    anchor_start = year_start_ns(anchor_year)
+    conditions = coder.patient_conditions(n, rng)
+
+    # Hospital admissions within a decade of the anchor year, in time order per patient
+    admission_counts = np.minimum(rng.negative_binomial(1, 1 / (1 + ADMISSIONS_PER_PATIENT), n), MAX_ADMISSIONS)
+    admission_patient = np.repeat(np.arange(n), admission_counts)
+    admittime = floor_ns(anchor_start[admission_patient] + rng.integers(0, 10 * YEAR_NS, len(admission_patient)), MINUTE_NS)
+    order = np.lexsort((admittime, admission_patient))
+    admission_patient, admittime = admission_patient[order], admittime[order]
+    admission_version = np.where(rng.random(len(admittime)) < ICD10_SHARE, 10, 9)
+    diagnosis_counts = np.minimum(1 + rng.poisson(DIAGNOSES_PER_ADMISSION - 1, len(admittime)), MAX_SEQ_NUM)
+
+    # ED stays: most admissions arrive through the ED a few hours earlier, and some visits stay ED-only
+    via_ed = rng.random(len(admittime)) < ED_ARRIVAL_SHARE
+    ed_only_counts = rng.poisson(ED_ONLY_VISITS_PER_PATIENT, n)
+    ed_only_patient = np.repeat(np.arange(n), ed_only_counts)
+    stay_patient = np.concatenate([admission_patient[via_ed], ed_only_patient])
+    intime = np.concatenate([
+        admittime[via_ed] - rng.integers(1, 13, via_ed.sum()) * HOUR_NS,
+        anchor_start[ed_only_patient] + rng.integers(0, 10 * YEAR_NS, len(ed_only_patient)),
+    ])
+    intime = floor_ns(intime, MINUTE_NS)
+    order = np.argsort(stay_patient, kind="stable")
+    stay_patient, intime = stay_patient[order], intime[order]
+    stay_version = np.where(rng.random(len(intime)) < ICD10_SHARE, 10, 9)
+    ed_diagnosis_counts = np.minimum(1 + rng.poisson(ED_DIAGNOSES_PER_STAY - 1, len(intime)), MAX_ED_SEQ_NUM)
+
+    # Deaths some time after the patient's last admission (or anchor year without admissions)
+    last_event = anchor_start.copy()
+    np.maximum.at(last_event, admission_patient, admittime)
+    died = rng.random(n) < DEATH_SHARE
+    dod = (last_event + rng.integers(0, 2 * YEAR_NS, n)).astype("datetime64[ns]").astype("datetime64[D]")
+
+    tables = {
+        "mimiciv_hosp.patients": pa.table({
+            "subject_id": pa.array(subject_ids, pa.int64()),
+            "gender": take_strings(np.array(["F", "M"], dtype=object), (rng.random(n) >= FEMALE_SHARE).astype(np.int64)),
+            "anchor_age": pa.array(anchor_age, pa.int64()),
+            "anchor_year": pa.array(anchor_year, pa.int64()),
+            "dod": pa.array(dod, pa.date32(), mask=~died),
+        }, schema=TABLE_SCHEMAS["mimiciv_hosp.patients"]),
+        "mimiciv_hosp.admissions": pa.table({
+            "subject_id": pa.array(subject_ids[admission_patient], pa.int64()),
+            "admittime": pa.array(admittime, pa.timestamp("ns")),
+        }, schema=TABLE_SCHEMAS["mimiciv_hosp.admissions"]),
+        "mimiciv_hosp.diagnoses_icd": generate_diagnoses(
+            "mimiciv_hosp.diagnoses_icd", subject_ids, admission_patient, admission_version, diagnosis_counts, conditions, coder, rng
+        ),
+        "mimic_ed.edstays": pa.table({
+            "subject_id": pa.array(subject_ids[stay_patient], pa.int64()),
+            "intime": pa.array(intime, pa.timestamp("ns")),
+        }, schema=TABLE_SCHEMAS["mimic_ed.edstays"]),
+        "mimic_ed.diagnosis": generate_diagnoses(
+            "mimic_ed.diagnosis", subject_ids, stay_patient, stay_version, ed_diagnosis_counts, conditions, coder, rng
+        ),
+        "mimiciv_hosp.prescriptions": generate_prescriptions(subject_ids[admission_patient], admittime, drugs, rng),
+    }
+    return tables, int(subject_ids[-1]) if n else after_id
+
+# --- Writing ---
+
+# Generate synthetic disease and drug data directories under out_dir, chunk_patients patients at a time.
+# Tables are written as Arrow files the pages and `python -m mimic_sql.benchmark` read like ingested
+# tables; the code sets of codes_dir are copied unchanged. Returns the rows written per table file.
+def generate(out_dir, scale=1.0, seed=0, chunk_patients=DEFAULT_CHUNK_PATIENTS, codes_dir=DISEASE_DATA_DIR):
+    code_sets, code_set_files = load_code_sets(codes_dir)
+    if not code_sets:
+        raise ValueError(f"no *{CODE_SET_SUFFIX} tables found in {codes_dir}")
+    coder = DiagnosisCoder(code_sets, seed)
+    drugs = drug_vocabulary(seed)
+    rng = np.random.default_rng(seed)
+    disease_dir = os.path.join(out_dir, "diseases_data")
+    drug_dir = os.path.join(out_dir, "drugs_data")
+    os.makedirs(disease_dir, exist_ok=True)
+    os.makedirs(drug_dir, exist_ok=True)
+    for path in code_set_files.values():
+        shutil.copy(path, disease_dir)
+
+    paths = {name: os.path.join(disease_dir, name + ARROW_EXTENSION) for name in DISEASE_TABLES}
+    paths.update({name: os.path.join(drug_dir, name + ARROW_EXTENSION) for name in DRUG_TABLES})
+    # Generated values are already clean and typed, so loading skips the disease page's preparation
+    metadata = {PREPARED_METADATA_KEY: b"true"}
+    sinks, writers = {}, {}
+    rows = dict.fromkeys(paths, 0)
+    try:
+        for name, path in paths.items():
+            sinks[name] = pa.OSFile(path + ".tmp", "wb")
+            writers[name] = pa.ipc.new_file(sinks[name], TABLE_SCHEMAS[name].with_metadata(metadata))
+        total_patients = int(round(scale * PATIENTS_PER_SCALE))
+        last_id = FIRST_SUBJECT_ID
+        for start in range(0, total_patients, chunk_patients):
+            tables, last_id = generate_chunk(min(chunk_patients, total_patients - start), last_id, coder, drugs, rng)
+            for name, table in tables.items():
+                writers[name].write_table(table.replace_schema_metadata(metadata))
+                rows[name] += table.num_rows
+    finally:
+        for name in writers:
+            writers[name].close()
+        for sink in sinks.values():
+            sink.close()
+    for path in paths.values():
+        os.replace(path + ".tmp", path)
+    return {paths[name]: count for name, count in rows.items()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic MIMIC-IV-like disease and drug tables for load testing.")
+    parser.add_argument("out_dir", help="directory to create diseases_data/ and drugs_data/ in")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help=f"data size in units of {PATIENTS_PER_SCALE:,} patients (full MIMIC-IV is about 6)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed; the same seed and scale give the same data")
+    parser.add_argument("--chunk-patients", type=int, default=DEFAULT_CHUNK_PATIENTS,
+                        help="patients generated at a time (bounds memory use)")
+    parser.add_argument("--codes-dir", default=DISEASE_DATA_DIR, help="directory holding the *_icd_codes code sets")
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    for path, num_rows in generate(args.out_dir, args.scale, args.seed, args.chunk_patients, args.codes_dir).items():
+        print(f"✅ {path}: {num_rows:,} rows")
+    print(f"Generated in {time.perf_counter() - start:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -1,274 +1,169 @@
 import streamlit as st
-import os
-import re
 import pandas as pd
-from pandasql import sqldf
+from mimic_sql.data_store import dataframes_bytes, discover_tables, format_bytes
+from mimic_sql.engine import SQLEngine
+from mimic_sql.examples import (
+    DISEASE_DATA_DIR, DISEASE_QUERIES, DISEASE_QUERY_NAMES, DISEASE_QUERY_SUBTITLES, build_disease_store,
+    disease_table_alias
+)
+from mimic_sql.jobs import PipelineJob, submit_job
+from mimic_sql.pipeline import PipelineState, pipeline_tables, step_schedule
+from mimic_sql.profiling import profile_json, profile_table
+from mimic_sql.result_cache import shared_result_cache
+from mimic_sql.results import DEFAULT_PAGE_SIZE, PAGE_SIZES, page_count
+from mimic_sql.sql_parse import apply_alias_map
+from mimic_sql.steps import run_step
 
 # --- Helper Functions (Common) ---
 
-# Clean whitespace characters from all object columns in DataFrame
-def clean_df(df):
-    # Remove extra whitespace from string columns
-    for col in df.select_dtypes(include='object').columns:
-        df[col] = df[col].apply(lambda x: re.sub(r'\s+', '', x) if isinstance(x, str) else x)
-    return df
-
-# Convert only non-numeric columns with time/date keywords to datetime
-def convert_time_columns(df):
+# Convert only non-numeric columns with time/date keywords to datetime; problems are added to warnings
+def convert_time_columns(df, warnings):
     time_keywords = ['time', 'date', 'datetime']
     for col in df.columns:
         if any(keyword in col.lower() for keyword in time_keywords) and not pd.api.types.is_numeric_dtype(df[col]):
             try:
                 df[col] = pd.to_datetime(df[col], errors='coerce')
             except Exception as e:
-                st.write(f"Warning: Failed to convert column '{col}': {e}")
+                warnings.append(f"Warning: Failed to convert column '{col}': {e}")
     return df
 
-# Convert specific columns (with_psychosis and E) to boolean type
-def convert_bool_columns(df):
+# Convert specific columns (with_psychosis and E) to boolean type; problems are added to warnings
+def convert_bool_columns(df, warnings):
     if 'with_psychosis' in df.columns:
         df['with_psychosis'] = df['with_psychosis'].replace({'TRUE': True, 'FALSE': False})
         try:
             df['with_psychosis'] = df['with_psychosis'].astype(bool)
         except Exception as e:
-            st.write(f"Warning: Cannot convert with_psychosis to boolean: {e}")
+            warnings.append(f"Warning: Cannot convert with_psychosis to boolean: {e}")
     if 'E' in df.columns:
         df['E'] = df['E'].replace({'TRUE': True, 'FALSE': False})
         try:
             df['E'] = df['E'].astype(bool)
         except Exception as e:
-            st.write(f"Warning: Cannot convert E to boolean: {e}")
+            warnings.append(f"Warning: Cannot convert E to boolean: {e}")
     return df
 
-# --- Original simulate_delete (unchanged) ---
-def simulate_delete(q, data_dict):
-    q_upper = q.upper()
-    if "DELETE FROM TEMP_EIGHT" in q_upper and "JOIN TEMP_NINE" in q_upper:
-        if "temp_eight" in data_dict and "temp_nine" in data_dict:
-            df_temp_eight = data_dict["temp_eight"]
-            df_temp_nine = data_dict["temp_nine"]
-            merged = pd.merge(df_temp_eight, df_temp_nine, on="subject_id", suffixes=("", "_nine"))
-            to_delete = merged.loc[
-                (merged["last_date"] == merged["index_date"]) & (merged["with_psychosis"].isin([True, 'TRUE'])),
-                "subject_id"
-            ].unique()
-            filtered_df = df_temp_eight[~df_temp_eight["subject_id"].isin(to_delete)]
-            data_dict["temp_eight"] = filtered_df
-            st.write("✅ DELETE complete: Deleted subject_ids meeting the condition from temp_eight")
-        else:
-            st.write("Warning: Cannot find temp_eight or temp_nine in data_dict")
-    elif "DELETE FROM TEMP_ELEVEN" in q_upper and "JOIN TEMP_TEN" in q_upper:
-        if "temp_eleven" in data_dict and "temp_ten" in data_dict:
-            df_temp_eleven = data_dict["temp_eleven"]
-            df_temp_ten = data_dict["temp_ten"]
-            merged = pd.merge(df_temp_eleven, df_temp_ten, on="subject_id", suffixes=("", "_ten"))
-            to_delete = merged.loc[
-                merged["first_date_ischemic_stroke"] == merged["index_date"],
-                "subject_id"
-            ].unique()
-            filtered_df = df_temp_eleven[~df_temp_eleven["subject_id"].isin(to_delete)]
-            data_dict["temp_eleven"] = filtered_df
-            st.write("✅ DELETE complete: Deleted subject_ids meeting the condition from temp_eleven")
-        else:
-            st.write("Warning: Cannot find temp_eleven or temp_ten in data_dict")
-    elif "DELETE FROM TEMP_EIGHTEEN" in q_upper and "NOT EXISTS" in q_upper:
-        if "temp_eighteen" in data_dict:
-            df_temp_eighteen = data_dict["temp_eighteen"]
-            def should_delete(row):
-                if row["with_psychosis"] in [False, 'FALSE']:
-                    sub = df_temp_eighteen[
-                        (df_temp_eighteen["gender"] == row["gender"]) &
-                        (df_temp_eighteen["age"] == row["age"]) &
-                        (df_temp_eighteen["with_psychosis"].isin([True, 'TRUE']))
-                    ]
-                    return sub.empty
-                return False
-            mask = df_temp_eighteen.apply(should_delete, axis=1)
-            filtered_df = df_temp_eighteen[~mask]
-            data_dict["temp_eighteen"] = filtered_df
-            st.write("✅ DELETE complete: Deleted rows meeting the condition from temp_eighteen")
-        else:
-            st.write("Warning: Cannot find temp_eighteen in data_dict")
-    else:
-        pattern = r"DELETE\s+FROM\s+(\w+)\s+WHERE\s+(\w+)\s+IN\s+\(SELECT\s+(\w+)\s+FROM\s+(\w+)\)"
-        match = re.match(pattern, q, re.IGNORECASE)
-        if match:
-            table_name = match.group(1)
-            col = match.group(2)
-            inner_col = match.group(3)
-            inner_table = match.group(4)
-            if table_name in data_dict and inner_table in data_dict:
-                df_table = data_dict[table_name]
-                df_inner = data_dict[inner_table]
-                filtered_df = df_table[~df_table[col].isin(df_inner[inner_col])]
-                data_dict[table_name] = filtered_df
-                st.write(f"✅ DELETE complete: Deleted rows from {table_name} where {col} exists in {inner_table}")
-            else:
-                st.write(f"Warning: Cannot find {table_name} or {inner_table} in data_dict")
-        else:
-            pattern_simple = r"DELETE\s+FROM\s+(\w+)\s+WHERE\s+(.+)"
-            match_simple = re.match(pattern_simple, q, re.IGNORECASE)
-            if match_simple:
-                table_name = match_simple.group(1)
-                condition = match_simple.group(2)
-                if table_name in data_dict:
-                    df_table = data_dict[table_name]
-                    try:
-                        mask = df_table.eval(condition)
-                        filtered_df = df_table[~mask]
-                        data_dict[table_name] = filtered_df
-                        st.write(f"✅ DELETE complete: Deleted rows from {table_name} that meet the condition '{condition}'")
-                    except Exception as e:
-                        st.write(f"Warning: Delete operation failed, condition parsing error: {e}")
-                else:
-                    st.write(f"Warning: Cannot find {table_name} in data_dict")
-            else:
-                st.write("Warning: DELETE statement format not supported, currently only supports specific formats.")
-
 # --- Disease-Specific SQL Execution Function ---
-def execute_all_all(indices, alias_map, data_dict):
-    """
-    Execute SQL queries for disease-specific operations.
-    This function captures messages printed during SQL execution (including from simulate_delete)
-    by temporarily overriding st.write. The captured messages and data output are stored in session_state.
-    """
+
+# Run one disease step's statements (table names already aliased) with this page's display preparation
+def run_disease_step(i, sql_query, engine, result_cache):
+    return run_step(sql_query, engine, result_cache, transform=display_transform(i))
+
+# Prepare rows fetched from a step's SELECT result for display. The first page is fetched on the
+# job's worker thread, so this only changes the DataFrame; conversion problems are kept with it and
+# shown by the script (see display_warnings).
+def display_transform(i):
+    def transform(df):
+        warnings = []
+        df = convert_time_columns(df, warnings)
+        df = convert_bool_columns(df, warnings)
+        if i == 27 and "admit_year" in df.columns:
+            try:
+                df["admit_year"] = df["admit_year"].astype(float)
+            except Exception as e:
+                warnings.append(f"Warning: Converting admit_year to float64 failed: {e}")
+        df.attrs["warnings"] = warnings
+        return df
+    return transform
+
+# Conversion problems display_transform recorded on fetched rows
+def display_warnings(df):
+    return df.attrs.get("warnings", [])
+
+# Store a finished step's messages and data output in session_state
+def apply_step_output(i, sql_query, messages, step_result, profile):
+    if step_result is not None:
+        messages = messages + display_warnings(step_result.first_page)
+    st.session_state[f"query_message_{i}"] = messages
+    st.session_state[f"query_profile_{i}"] = profile
+    st.session_state.setdefault("pipeline_profile", {})[i] = profile
+    if step_result is not None:
+        st.session_state[f"query_result_{i}"] = step_result
+    # Remember what this step ran with, so later "Execute All" runs can skip it while it is up to date
+    st.session_state["pipeline_state"].record_run(i, sql_query)
+
+# Let go of the results of steps about to re-run, so the engine need not keep their rows
+def release_results(indices):
     for i in indices:
-        # Initialize log for this query
-        st.session_state[f"query_message_{i}"] = []
-        # Capture messages by overriding st.write locally
-        original_write = st.write
-        captured_messages = []
-        def capture_write(*args, **kwargs):
-            # Capture messages as strings
-            msg = " ".join(str(arg) for arg in args)
-            captured_messages.append(msg)
-        st.write = capture_write
+        st.session_state[f"query_result_{i}"] = None
 
-        sql_query = st.session_state[f"last_query_{i}"]
+# Run steps synchronously inside the script run (single-step buttons and the table tests)
+def execute_all_all(indices, alias_map, engine):
+    result_cache = shared_result_cache()
+    release_results(indices)
+    for i in indices:
         # Replace table names using alias_map
-        for original, alias in alias_map.items():
-            sql_query = sql_query.replace(original, alias)
-        queries = [q.strip() for q in sql_query.split(";") if q.strip()]
-        for q in queries:
-            q_upper = q.upper()
-            if q_upper.startswith("DROP TABLE IF EXISTS"):
-                drop_table_name = q.split()[-1]
-                if drop_table_name in data_dict:
-                    del data_dict[drop_table_name]
-                    st.write(f"🗑️ `{drop_table_name}` DROP.")
-            elif q_upper.startswith("CREATE TEMP TABLE") or q_upper.startswith("CREATE TABLE"):
-                temp_table_name = q.split("AS")[0].split()[-1]
-                temp_query = q.split("AS", 1)[1].strip()
-                if temp_table_name in data_dict:
-                    del data_dict[temp_table_name]
-                result_df = sqldf(temp_query, {**locals(), **data_dict})
-                result_df = convert_time_columns(result_df)
-                data_dict[temp_table_name] = result_df
-                st.write(f"✅ CREATE complete: Table {temp_table_name} created.")
-            elif q_upper.startswith("ALTER TABLE"):
-                tokens = q.split()
-                table_name = tokens[2]
-                col_match = re.search(r'ADD COLUMN\s+["\']?(\w+)["\']?\s+(\w+)', q, re.IGNORECASE)
-                if col_match:
-                    col_name = col_match.group(1)
-                    if table_name in data_dict:
-                        df = data_dict[table_name]
-                        if col_name not in df.columns:
-                            df[col_name] = None
-                            data_dict[table_name] = df
-                            st.write(f"📝 ALTER TABLE: Added column {col_name} to {table_name}.")
-                    else:
-                        st.write(f"Warning: Table {table_name} not found in data_dict.")
-                else:
-                    st.write("Warning: ALTER TABLE statement format not supported.")
-            elif q_upper.startswith("UPDATE"):
-                if "SET EVENT_DATE =" in q_upper and "FROM TEMP_FIFTEEN" in q_upper:
-                    tokens = q.strip().split()
-                    table_name = tokens[1]
-                    if table_name in data_dict and "event_date" in data_dict[table_name].columns:
-                        df = data_dict[table_name]
-                        if "temp_fifteen" in data_dict:
-                            df_fifteen = data_dict["temp_fifteen"]
-                            if "subject_id" in df_fifteen.columns and "admit_year" in df_fifteen.columns:
-                                def update_event_date(row):
-                                    if pd.isnull(row["event_date"]):
-                                        subject = row["subject_id"]
-                                        match = df_fifteen[df_fifteen["subject_id"] == subject]
-                                        if not match.empty:
-                                            year_val = match.iloc[0]["admit_year"]
-                                            return pd.to_datetime(f"{year_val}-12-31", errors='coerce')
-                                    return row["event_date"]
-                                df["event_date"] = df.apply(update_event_date, axis=1)
-                                data_dict[table_name] = df
-                                st.write(f"📝 UPDATE: event_date in {table_name} updated based on temp_fifteen.admit_year.")
-                            else:
-                                st.write("Warning: temp_fifteen missing subject_id or admit_year columns.")
-                        else:
-                            st.write("Warning: temp_fifteen table not found in data_dict.")
-                    else:
-                        st.write(f"Warning: Table {table_name} or event_date column not found in data_dict.")
-                elif "SET EVENT_DATE =" in q_upper and "DEATH_DATE" in q_upper:
-                    tokens = q.strip().split()
-                    table_name = tokens[1]
-                    if table_name in data_dict and "event_date" in data_dict[table_name].columns:
-                        df = data_dict[table_name]
-                        if "mimiciv_hosp_patients" in data_dict:
-                            patients_df = data_dict["mimiciv_hosp_patients"]
-                            patients_death = patients_df[pd.notnull(patients_df["dod"])].copy()
-                            patients_death["death_date"] = pd.to_datetime(patients_death["dod"], errors='coerce').dt.date
-                            def update_event_date(row):
-                                if pd.isnull(row["event_date"]):
-                                    subj = row["subject_id"]
-                                    match = patients_death[patients_death["subject_id"] == subj]
-                                    if not match.empty:
-                                        return pd.to_datetime(match.iloc[0]["death_date"])
-                                return row["event_date"]
-                            df["event_date"] = df.apply(update_event_date, axis=1)
-                            data_dict[table_name] = df
-                            st.write(f"📝 UPDATE: event_date in {table_name} updated based on mimiciv_hosp_patients.dod.")
-                        else:
-                            st.write("Warning: mimiciv_hosp_patients table not found in data_dict.")
-                    else:
-                        st.write(f"Warning: Table {table_name} or event_date column not found in data_dict.")
-                else:
-                    tokens = q.strip().split()
-                    table_name = tokens[1]
-                    if table_name in data_dict:
-                        df = data_dict[table_name]
-                        if "event_date" in df.columns and "index_date" in df.columns:
-                            df["event_date"] = pd.to_datetime(df["event_date"], errors='coerce')
-                            df["index_date"] = pd.to_datetime(df["index_date"], errors='coerce')
-                            diff = (df["event_date"] - df["index_date"]).dt.days
-                            df["T"] = diff  # keep NA if calculation fails
-                            data_dict[table_name] = df
-                            st.write(f"📝 UPDATE: T column in {table_name} updated, type: {df['T'].dtype}.")
-                        else:
-                            st.write(f"Warning: event_date or index_date columns not found in {table_name}.")
-                    else:
-                        st.write(f"Warning: Table {table_name} not found in data_dict.")
-            elif q_upper.startswith("DELETE"):
-                # Call the original simulate_delete (which uses st.write)
-                simulate_delete(q, data_dict)
-            elif q_upper.startswith("SELECT"):
-                result_df = sqldf(q, {**locals(), **data_dict})
-                result_df = convert_time_columns(result_df)
-                result_df = convert_bool_columns(result_df)
-                if i == 27 and "admit_year" in result_df.columns:
-                    try:
-                        result_df["admit_year"] = result_df["admit_year"].astype(float)
-                    except Exception as e:
-                        st.write(f"Warning: Converting admit_year to float64 failed: {e}")
-                result_df.index = range(1, len(result_df) + 1)
-                st.session_state[f"query_result_{i}"] = result_df
-                st.write("✅ SELECT complete: Query executed successfully.")
-            else:
-                st.write("Warning: Statement not supported. Only DROP, CREATE, ALTER, UPDATE, DELETE, and SELECT are supported.")
-
-        # Restore original st.write and save captured messages
-        st.write = original_write
-        st.session_state[f"query_message_{i}"] = captured_messages
+        sql_query = apply_alias_map(st.session_state[f"last_query_{i}"], alias_map)
+        messages, step_result, profile = run_disease_step(i, sql_query, engine, result_cache)
+        apply_step_output(i, sql_query, messages, step_result, profile)
     st.rerun()
 
+# Submit steps to the shared worker pool; the page polls the job and shows results as steps finish
+def start_pipeline_job(indices, alias_map, engine, labels):
+    result_cache = shared_result_cache()
+    release_results(indices)
+    step_sql = {i: apply_alias_map(st.session_state[f"last_query_{i}"], alias_map) for i in indices}
+    # Steps that do not depend on each other run at the same time
+    schedule = step_schedule(step_sql, pipeline_tables(step_sql, engine))
+    def run_job_step(i, step_engine):
+        return (step_sql[i],) + run_disease_step(i, step_sql[i], step_engine, result_cache)
+    return submit_job(PipelineJob(indices, run_job_step, engine, labels, schedule))
+
+# Poll the background run: copy finished steps into the page, show progress and offer cancellation
+@st.fragment(run_every=1)
+def pipeline_progress():
+    job = st.session_state.get("pipeline_job")
+    if job is None:
+        return
+    # Read the status before collecting, so steps finishing in between are collected on the next poll
+    active = job.is_active()
+    finished = job.collect()
+    for i, (sql_query, messages, step_result, profile) in finished:
+        apply_step_output(i, sql_query, messages, step_result, profile)
+    if active:
+        st.caption(st.session_state.get("pipeline_status", ""))
+        st.progress(job.progress(), text=job.describe())
+        if st.button("⏹️ Cancel run", key="cancel_pipeline_job"):
+            job.cancel()
+        if finished:
+            # Redraw the whole page so the new step results appear
+            st.rerun(scope="app")
+    else:
+        st.session_state["pipeline_job"] = None
+        st.session_state["pipeline_status"] = f"{st.session_state.get('pipeline_status', '')} {job.describe()}".strip()
+        st.rerun(scope="app")
+
+# --- Paged Result Display ---
+
+# Show a result one page at a time: the row count and columns up front, then only the rows of the
+# requested page are read from the engine and sent to the browser
+def show_result(key, result):
+    st.caption(f"{result.num_rows:,} rows × {len(result.columns)} columns")
+    with st.expander("Columns"):
+        st.dataframe(result.column_types(), use_container_width=True, hide_index=True)
+    sort_col, order_col, size_col, page_col = st.columns(4)
+    sort_by = sort_col.selectbox("Sort by", ["(table order)"] + result.columns, key=f"{key}_sort_by")
+    descending = order_col.selectbox("Order", ["Ascending", "Descending"], key=f"{key}_order") == "Descending"
+    page_size = size_col.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE), key=f"{key}_page_size")
+    num_pages = page_count(result.num_rows, page_size)
+    # A new result or page size can leave the remembered page past the end
+    if st.session_state.get(f"{key}_page", 1) > num_pages:
+        st.session_state[f"{key}_page"] = num_pages
+    page = page_col.number_input(f"Page (of {num_pages:,})", min_value=1, max_value=num_pages, step=1, key=f"{key}_page")
+    sort_by = sort_by if sort_by in result.columns else None
+    df = result.page(page - 1, page_size, sort_by, descending)
+    for warning in display_warnings(df):
+        st.write(warning)
+    st.dataframe(df, use_container_width=True)
+
+# --- Shared Base Tables ---
+
+# Load the disease base tables once per server process; every session attaches the same read-only store.
+# Tables ingested as Arrow files are memory-mapped and only the referenced columns are loaded.
+@st.cache_resource(show_spinner="Loading MIMIC-IV disease tables...")
+def load_base_tables(table_files):
+    return build_disease_store(table_files)
+
 # --- Disease-Specific Web Display Function ---
 def show():
     # Custom CSS for button styling
@@ -282,554 +177,48 @@ def show():
     """, unsafe_allow_html=True)
 
     # Directory containing the PKL disease data files
-    PKL_DIR = f"MIMIC_IV_data/diseases_data"
+    PKL_DIR = DISEASE_DATA_DIR
     
-    # Initialize session_state data dictionary if not present
-    if "data_dict" not in st.session_state:
-        st.session_state["data_dict"] = {}
-    data_dict = st.session_state["data_dict"]
-
-    # List all PKL files in the specified directory
-    pkl_files = [f for f in os.listdir(PKL_DIR) if f.endswith(".pkl")]
-    if not pkl_files:
+    # List all PKL files (or their ingested Arrow versions) in the specified directory
+    table_files = discover_tables(PKL_DIR)
+    if not table_files:
         st.error(f"❌ No PKL files were found in `{PKL_DIR}`.")
         return
 
-    # Define query names and detailed subtitles for each SQL query step
-    query_names = [
-        "SQL statement for the admissions table",
-        "SQL statement for the diagnoses_icd table",
-        "SQL statement for the patients table",
-        "SQL statement for the diagnosis table",
-        "SQL statement for the edstays table",
-        "SQL statement for the diabetes_icd_codes table",
-        "SQL statement for the heart_type_disease_icd_codes table",
-        "SQL statement for the hemorrhagic_stroke_icd_codes table",
-        "SQL statement for the hyperlipidemia_icd_codes table",
-        "SQL statement for the hypertension_icd_codes table",
-        "SQL statement for the ischemic_stroke_icd_codes table",
-        "SQL statement for the neurological_type_disease_icd_codes table",
-        "SQL statement for the psychosis_icd_codes table",
-        "Step 1",
-        "Step 2",
-        "Step 3",
-        "Step 4",
-        "Step 5",
-        "Step 6",
-        "Step 7",
-        "Step 8",
-        "Step 9",
-        "Step 10",
-        "Step 11",
-        "Step 12",
-        "Step 13",
-        "Step 14",
-        "Step 15",
-        "Step 16",
-        "Step 17",
-        "Step 18",
-        "Step 19",
-        "Step 20",
-        "Step 21",
-        "Step 22",
-        "Step 23"
-    ]
+    # Shared read-only base tables, loaded once per server process
+    base_store = load_base_tables(tuple(table_files.items()))
+    for error in base_store.errors:
+        st.error(error)
 
-    query_names_subtitle = [
-        # SQL Step One.
-        """Use NATURAL JOIN to combine hosp (diagnoses_icd, admissions). 
-        &#35; Produces the complete hosp table (IDs not deduplicated).""",
-        # SQL Step Two.
-        "Use DISTINCT to filter out duplicate subject_id. # Save hosp's subject_id to temp_two (extract required IDs).",
-        # SQL Step Three.
-        "Use NATURAL JOIN to combine ed (diagnosis, edstays). # Produces the complete ed table (IDs not deduplicated).",
-        # SQL Step Four.
-        """Use subject_id from temp_two (hosp) as a query condition for temp_three (ed). 
-        &#35; Find in ed those with the same subject_id as in hosp.""",
-        # SQL Step Five.
-        """Use UNION ALL to merge temp_one (hosp) + temp_four (ed). 
-        &#35; Produces the complete combined hosp + ed table (IDs not deduplicated).""",
-        # SQL Step Six.
-        """1.Use psychosis_icd_codes to query temp_five (case) for records of patients with psychosis.
-            \n2.Use GROUP BY subject_id to group records, ensuring no duplicate subject_id.
-            \n3.Use MIN(admit_date) to find the earliest admission date.""",
-        # SQL Step Seven.
-        """1.Use GROUP BY subject_id to group records, ensuring no duplicate subject_id.
-            \n2.Use MIN(admit_date) to find the earliest admission date.
-            \n3.Execute a DELETE FROM command to expunge all patient records related to psychiatric disorders.""",
-        # SQL Step Eight.
-        """1.Use SELECT *, 'TRUE' AS with_psychosis to add a with_psychosis column with value TRUE (for case group).
-            \n2.Use SELECT *, 'FALSE' AS with_psychosis to add a with_psychosis column with value FALSE (for control group).
-            \n3.Use UNION ALL to combine hosp + ed.""",
-        # SQL Step Nine.
-        """1.Use GROUP BY subject_id to group records, ensuring no duplicate subject_id.
-            \n2.Use MAX(admit_date) to find the last admission date.
-            \n3.Use DELETE FROM to remove records where psychosis is TRUE
-            and the earliest admission date equals the last admission date.""",
-        # SQL Step Ten.
-        """1.Use ischemic_stroke_icd_codes to query temp_five (entire) for records of patients with ischemic stroke.
-            \n2.Use GROUP BY subject_id to group records, ensuring no duplicate subject_id.
-            \n3.Use MIN(admit_date) to find the earliest admission date.""",
-        # SQL Step Eleven.
-        """1.Create table temp_eleven by importing data from temp_nine using CREATE TABLE.
-            \n2.Use DELETE FROM temp_nine to remove records where the earliest hospital admission date equals
-            the ischemic stroke earliest hospital admission date.""",
-        # SQL Step Twelve.
-        """1.Use the ID column from temp_eleven to fetch records from temp_ten with matching IDs 
-            and where the event date (first occurrence) is closest to the earliest admission date.
-            \n2.Use LEFT JOIN to retain all records from temp_eleven; if there is no corresponding event_date, display as NULL.""",
-        # SQL Step Thirteen.
-        "Check if the event_date column is NULL; if not NULL, set the new column E to TRUE, otherwise FALSE.",
-        # SQL Step Fourteen.
-        """1.For records in temp_thirteen where event_date is NULL, fill in with the patient's death date.
-            \n2.Use UPDATE to change the event_date in temp_fourteen from NULL to the patients' death_date.""",
-        # SQL Step Fifteen.
-        """1.Create table temp_fifteen containing the latest admission year for each subject_id.
-            \n2.Use UNION ALL to combine hosp + ed.
-            \n3.Use GROUP BY subject_id to group records, ensuring no duplicate subject_id.""",
-        # SQL Step Sixteen.
-        """1.Create table temp_sixteen to read all records from temp_fourteen.
-            \n2.Use UPDATE to set the event_date in temp_sixteen (where it is NULL) to last_year/12/31.""",
-        # SQL Step Seventeen.
-        """1.Create table temp_seventeen to read all records from temp_sixteen.
-            \n2.Use a subquery to calculate gender (male = 1, female = 0) by matching subject_id.
-            \n3.Use a subquery to calculate age (based on index_date) by matching subject_id.""",
-        # SQL Step Eighteen.
-        """1.Create table temp_eighteen to read all records from temp_seventeen.
-            \n2.Delete entire rows from the control group (with_psychosis = FALSE) 
-            that do not have a matching gender and age in the case group (with_psychosis = TRUE).""",
-        # SQL Step Nineteen.
-        """1.Create table temp_nineteen to read all records from temp_eighteen.
-            \n2.Use ALTER TABLE to modify the structure of the existing temp_nineteen table (add column T).
-            \n3.Use UPDATE to update the T column in temp_nineteen.""",
-        # SQL Step Twenty.
-        """1.Create table temp_twenty to read all records from temp_nineteen.
-            \n2.Use DELETE to remove records from temp_twenty where the T column is less than or equal to 0.""",
-        # SQL Step Twenty-One.
-        """1.Drop the existing temp_twenty_one table (if any) and create a new temporary table temp_twenty_one
-            to store subject_id, admit_date (as DATE), icd_code and icd_version from both the hospital and ED sources.
-            \n2.Use UNION ALL to vertically merge the two result-sets: one from mimiciv_hosp.diagnoses_icd
-            joined with mimiciv_hosp.admissions, and one from mimic_ed.diagnosis joined with mimic_ed.edstays.
-            \n3.Finally, select all rows from the newly created temp_twenty_one to verify its contents.""",
-        # SQL Step Twenty-Two.
-        """1.Create table temp_twenty_two by reading from temp_twenty_one and performing a new SELECT query.
-            \n2.Use LEFT JOIN on subject_id so that every patient in temp_twenty is retained.
-            \n3.For each disease category, first apply an inner CASE that returns 1 whenever a diagnosis’s admit_date
-            falls between the patient’s index_date and event_date and the icd_code belongs to that category, otherwise 0.
-            \n4.Wrap each of those inner cases in SUM(…) to count how many times each patient met that disease condition,
-            and surround the SUM in COALESCE(…, 0) to turn any NULL (i.e. no matching rows) into 0.
-            \n5.Classify disease presence per patient using(CASE WHEN the count of matching diagnoses > 0 THEN 'TRUE' ELSE 'FALSE' END),
-            where 'TRUE' explicitly means that at least one diagnosis occurred between the patient’s index_date and event_date.
-            \n6.Repeat steps 3–5 for each of the hypertension, heart‑type, neurological, diabetes, and hyperlipidemia ICD code sets.
-            \n7.Group all aggregated results by t.subject_id so that each row represents one patient.""",
-        # SQL Step Twenty-Three.
-        """1.Create table temp_twenty_three to store the merged data from temp_twenty and temp_twenty_two.
-            \n2.Use LEFT JOIN to merge temp_twenty and temp_twenty_two based on subject_id."""
-    ]
+    # Initialize the session's persistent SQL engine if not present
+    if "sql_engine" not in st.session_state:
+        st.session_state["sql_engine"] = SQLEngine(base=base_store)
+    engine = st.session_state["sql_engine"]
 
-    default_sql_queries = [
-        "SELECT subject_id, admittime FROM mimiciv_hosp.admissions;",
-        "SELECT subject_id, seq_num, icd_code, icd_version FROM mimiciv_hosp.diagnoses_icd;",
-        "SELECT subject_id, gender, anchor_age, anchor_year, dod FROM mimiciv_hosp.patients;",
-        "SELECT subject_id, seq_num, icd_code, icd_version FROM mimic_ed.diagnosis;",
-        "SELECT subject_id, intime FROM mimic_ed.edstays;",
-        "SELECT icd_code, icd_version FROM diabetes_icd_codes;",
-        "SELECT icd_code, icd_version FROM heart_type_disease_icd_codes;",
-        "SELECT icd_code, icd_version FROM hemorrhagic_stroke_icd_codes;",
-        "SELECT icd_code, icd_version FROM hyperlipidemia_icd_codes;",
-        "SELECT icd_code, icd_version FROM hypertension_icd_codes;",
-        "SELECT icd_code, icd_version FROM ischemic_stroke_icd_codes;",
-        "SELECT icd_code, icd_version FROM neurological_type_disease_icd_codes;",
-        "SELECT icd_code, icd_version FROM psychosis_icd_codes;",
-        # SQL Step One
-        f"""DROP TABLE IF EXISTS temp_one;
-CREATE TEMP TABLE temp_one AS
-SELECT subject_id, DATE(admittime) AS admit_date, icd_code, icd_version
-FROM mimiciv_hosp.diagnoses_icd
-NATURAL JOIN mimiciv_hosp.admissions;
-SELECT * FROM temp_one;""",
-        # SQL Step Two
-        f"""DROP TABLE IF EXISTS temp_two;
-CREATE TEMP TABLE temp_two AS
-SELECT DISTINCT subject_id
-FROM temp_one;
-SELECT * FROM temp_two;""",
-        # SQL Step Three
-        f"""DROP TABLE IF EXISTS temp_three;
-CREATE TEMP TABLE temp_three AS
-SELECT subject_id, DATE(intime) AS admit_date, icd_code, icd_version
-FROM mimic_ed.diagnosis
-NATURAL JOIN mimic_ed.edstays;
-SELECT * FROM temp_three;""",
-        # SQL Step Four
-        f"""DROP TABLE IF EXISTS temp_four;
-CREATE TABLE temp_four AS
-SELECT * FROM temp_three
-WHERE subject_id IN (SELECT subject_id FROM temp_two);
-SELECT * FROM temp_four;""",
-        # SQL Step Five
-        f"""DROP TABLE IF EXISTS temp_five;
-CREATE TABLE temp_five AS
-SELECT * FROM temp_one
-UNION ALL
-SELECT * FROM temp_four;
-SELECT * FROM temp_five;""",
-        # SQL Step Six
-        f"""DROP TABLE IF EXISTS temp_six;
-CREATE TABLE temp_six AS
-SELECT subject_id, MIN(admit_date) AS index_date
-FROM (
-SELECT * FROM temp_five
-WHERE (icd_version = 10
-AND icd_code IN (SELECT icd_code FROM psychosis_icd_codes WHERE icd_version = 10))
-OR (icd_version = 9
-AND icd_code IN (SELECT icd_code FROM psychosis_icd_codes WHERE icd_version = 9))
-) AS all_diagnoses
-GROUP BY subject_id;
-SELECT * FROM temp_six;""",
-        # SQL Step Seven #pgadmin 4 SQL differences
-        f"""DROP TABLE IF EXISTS temp_seven;
-CREATE TABLE temp_seven AS
-SELECT subject_id, MIN(admit_date) AS index_date
-FROM temp_five
-GROUP BY subject_id;
-DELETE FROM temp_seven
-WHERE subject_id IN (SELECT subject_id FROM temp_six);
-DELETE FROM temp_seven
-WHERE subject_id IN (
-SELECT DISTINCT subject_id
-FROM temp_five
-WHERE (icd_version = 10
-AND icd_code IN (
-SELECT icd_code
-FROM all_psychiatric_disorders_icd_codes
-WHERE icd_version = 10))
-OR (icd_version = 9
-AND icd_code IN (
-SELECT icd_code
-FROM all_psychiatric_disorders_icd_codes
-WHERE icd_version = 9)));
-SELECT * FROM temp_seven;""",
-        # SQL Step Eight #pgadmin 4 SQL differences
-        f"""DROP TABLE IF EXISTS temp_eight;
-CREATE TEMP TABLE temp_eight AS
-SELECT *, 'TRUE' AS with_psychosis FROM temp_six
-UNION ALL
-SELECT *, 'FALSE' AS with_psychosis FROM temp_seven;
-SELECT * FROM temp_eight;""",
-        # SQL Step Nine #pgadmin 4 SQL differences
-        f"""DROP TABLE IF EXISTS temp_nine;
-CREATE TABLE temp_nine AS
-SELECT subject_id, MAX(admit_date) AS last_date
-FROM temp_five
-GROUP BY subject_id;
-DELETE FROM temp_eight
-WHERE subject_id IN (
-SELECT temp_eight.subject_id
-FROM temp_eight
-JOIN temp_nine 
-ON temp_eight.subject_id = temp_nine.subject_id
-WHERE temp_nine.last_date = temp_eight.index_date
-AND temp_eight.with_psychosis = 'TRUE');
-DROP TABLE IF EXISTS temp_nine;
-CREATE TABLE temp_nine AS
-SELECT * FROM temp_eight;
-SELECT * FROM temp_nine;""",
-        # SQL Step Ten
-        f"""DROP TABLE IF EXISTS temp_ten;
-CREATE TABLE temp_ten AS
-SELECT subject_id, MIN(admit_date) AS first_date_ischemic_stroke
-FROM (
-SELECT * FROM temp_five
-WHERE (icd_version = 10
-AND icd_code IN (SELECT icd_code FROM ischemic_stroke_icd_codes WHERE icd_version = 10))
-OR (icd_version = 9
-AND icd_code IN (SELECT icd_code FROM ischemic_stroke_icd_codes WHERE icd_version = 9))
-) AS all_diagnoses_first_date_ischemic_stroke
-GROUP BY subject_id;
-SELECT * FROM temp_ten;""",
-        # SQL Step Eleven
-        f"""DROP TABLE IF EXISTS temp_eleven;
-CREATE TABLE temp_eleven AS
-SELECT * FROM temp_nine;
-DELETE FROM temp_eleven
-WHERE subject_id IN (
-SELECT temp_eleven.subject_id
-FROM temp_eleven
-JOIN temp_ten 
-ON temp_eleven.subject_id = temp_ten.subject_id
-WHERE temp_ten.first_date_ischemic_stroke = temp_eleven.index_date);
-SELECT * FROM temp_eleven;""",
-        # SQL Step Twelve
-        f"""DROP TABLE IF EXISTS temp_twelve;
-CREATE TABLE temp_twelve AS
-SELECT 
-temp_eleven.subject_id,
-temp_eleven.with_psychosis,
-temp_eleven.index_date,
-IS_after_index_date.first_date_ischemic_stroke AS event_date
-FROM temp_eleven
-LEFT JOIN (
-SELECT 
-temp_ten.subject_id, 
-temp_ten.first_date_ischemic_stroke
-FROM temp_ten
-JOIN temp_eleven ON temp_ten.subject_id = temp_eleven.subject_id
-WHERE temp_ten.first_date_ischemic_stroke > temp_eleven.index_date
-) AS IS_after_index_date
-ON temp_eleven.subject_id = IS_after_index_date.subject_id;
-SELECT * FROM temp_twelve;""",
-        # SQL Step Thirteen
-        f"""DROP TABLE IF EXISTS temp_thirteen;
-CREATE TABLE temp_thirteen AS
-SELECT *, CASE 
-WHEN event_date IS NOT NULL THEN 'TRUE' 
-ELSE 'FALSE' END AS "E"
-FROM temp_twelve;
-SELECT * FROM temp_thirteen;""",
-        # SQL Step Fourteen
-        f"""DROP TABLE IF EXISTS temp_fourteen;
-CREATE TABLE temp_fourteen AS
-SELECT * FROM temp_thirteen;
-UPDATE temp_fourteen
-SET event_date = patients_death_date.death_date
-FROM (
-SELECT 
-mimiciv_hosp.patients.subject_id, 
-DATE(mimiciv_hosp.patients.dod) AS death_date
-FROM mimiciv_hosp.patients 
-WHERE mimiciv_hosp.patients.dod IS NOT NULL
-) patients_death_date
-WHERE temp_fourteen.subject_id = patients_death_date.subject_id
-AND temp_fourteen.event_date IS NULL;
-SELECT * FROM temp_fourteen;""",
-        # SQL Step Fifteen #pgadmin 4 SQL differences
-        f"""DROP TABLE IF EXISTS temp_fifteen;
-CREATE TABLE temp_fifteen AS
-SELECT 
-subject_id, 
-MAX(admit_year) AS admit_year
-FROM (
-SELECT subject_id, strftime('%Y', admittime) AS admit_year
-FROM mimiciv_hosp.diagnoses_icd NATURAL JOIN mimiciv_hosp.admissions
-UNION ALL
-SELECT 
-subject_id, 
-strftime('%Y', intime) AS admit_year
-FROM mimic_ed.diagnosis NATURAL JOIN mimic_ed.edstays
-) AS all_diagnoses
-GROUP BY subject_id;
-SELECT * FROM temp_fifteen;""",
-        # SQL Step Sixteen #pgadmin 4 SQL differences
-        f"""DROP TABLE IF EXISTS temp_sixteen;
-CREATE TABLE temp_sixteen AS
-SELECT * FROM temp_fourteen;
-UPDATE temp_sixteen
-SET event_date = (
-SELECT date(temp_fifteen.admit_year || '-12-31')
-FROM temp_fifteen
-WHERE temp_fifteen.subject_id = temp_sixteen.subject_id)
-WHERE event_date IS NULL;
-SELECT * FROM temp_sixteen;""",
-        # SQL Step Seventeen #pgadmin 4 SQL differences
-        f"""DROP TABLE IF EXISTS temp_seventeen;
-CREATE TABLE temp_seventeen AS
-SELECT temp_sixteen.*, (SELECT CASE WHEN patients.gender = 'M' THEN 1 ELSE 0 END
-FROM mimiciv_hosp.patients AS patients
-WHERE patients.subject_id = temp_sixteen.subject_id) AS gender,
-(SELECT (CAST(strftime('%Y', temp_sixteen.index_date) AS INTEGER) - (patients.anchor_year - patients.anchor_age))
-FROM mimiciv_hosp.patients AS patients
-WHERE patients.subject_id = temp_sixteen.subject_id) AS age
-FROM temp_sixteen;
-SELECT subject_id, gender, event_date, index_date, with_psychosis, "E", age
-FROM temp_seventeen;""",
-        # SQL Step Eighteen
-        f"""DROP TABLE IF EXISTS temp_eighteen;
-CREATE TABLE temp_eighteen AS
-SELECT * FROM temp_seventeen;
-DELETE FROM temp_eighteen
-WHERE with_psychosis = FALSE
-AND NOT EXISTS (
-SELECT 1
-FROM temp_eighteen temp_eighteen_case
-WHERE with_psychosis = TRUE
-AND temp_eighteen.gender = temp_eighteen_case.gender
-AND temp_eighteen.age = temp_eighteen_case.age);
-SELECT subject_id, gender, event_date, index_date, with_psychosis, "E", age 
-FROM temp_eighteen;""",
-        # SQL Step Nineteen - Update T column (if calculation fails, keep NA)
-        f"""DROP TABLE IF EXISTS temp_nineteen;
-CREATE TABLE temp_nineteen AS
-SELECT * FROM temp_eighteen;
-ALTER TABLE temp_nineteen
-ADD COLUMN "T" INTEGER;
-UPDATE temp_nineteen
-SET "T" = (event_date - index_date);
-SELECT subject_id, gender, event_date, index_date, with_psychosis, "E", age, "T"
-FROM temp_nineteen;""",
-        # SQL Step Twenty - Delete rows with T column value <= 0 #pgadmin 4 SQL differences
-        f"""DROP TABLE IF EXISTS temp_twenty;
-CREATE TABLE temp_twenty AS
-SELECT subject_id, gender, event_date, index_date, with_psychosis, "E", age, "T"
-FROM temp_nineteen;
-DELETE FROM temp_twenty
-WHERE T <= 0;
-SELECT * FROM temp_twenty;""",
-        # SQL Step Twenty-One
-        f"""DROP TABLE IF EXISTS temp_twenty_one;
-CREATE TEMP TABLE temp_twenty_one AS
-SELECT subject_id,DATE(admittime) AS admit_date,icd_code,icd_version
-FROM mimiciv_hosp.diagnoses_icd
-NATURAL JOIN mimiciv_hosp.admissions
-UNION ALL
-SELECT subject_id,DATE(intime) AS admit_date,icd_code,icd_version
-FROM mimic_ed.diagnosis
-NATURAL JOIN mimic_ed.edstays;
-SELECT * FROM temp_twenty_one;""",
-        # SQL Step Twenty-Two - Use WITH and LEFT JOIN to consolidate disease counts #pgadmin 4 SQL differences
-        f"""DROP TABLE IF EXISTS temp_twenty_two;
-CREATE TABLE temp_twenty_two AS
-SELECT t.subject_id,
-CASE WHEN SUM(CASE 
-WHEN d.admit_date BETWEEN t.index_date AND t.event_date
-AND d.icd_code IN (
-SELECT icd_code 
-FROM hypertension_icd_codes 
-WHERE icd_version = d.icd_version)
-THEN 1 ELSE 0 END) > 0
-THEN 'TRUE' ELSE 'FALSE'
-END AS with_hypertension,
-SUM(CASE 
-WHEN d.admit_date BETWEEN t.index_date AND t.event_date
-AND d.icd_code IN (
-SELECT icd_code 
-FROM hypertension_icd_codes 
-WHERE icd_version = d.icd_version)
-THEN 1 ELSE 0 END) AS hypertension_times,
-CASE WHEN SUM(CASE 
-WHEN d.admit_date BETWEEN t.index_date AND t.event_date
-AND d.icd_code IN (
-SELECT icd_code 
-FROM heart_type_disease_icd_codes 
-WHERE icd_version = d.icd_version)
-THEN 1 ELSE 0 END) > 0
-THEN 'TRUE' ELSE 'FALSE'
-END AS with_heart_type_disease,
-SUM(CASE 
-WHEN d.admit_date BETWEEN t.index_date AND t.event_date
-AND d.icd_code IN (
-SELECT icd_code 
-FROM heart_type_disease_icd_codes 
-WHERE icd_version = d.icd_version)
-THEN 1 ELSE 0 END) AS heart_type_disease_times,
-CASE WHEN SUM(CASE 
-WHEN d.admit_date BETWEEN t.index_date AND t.event_date
-AND d.icd_code IN (
-SELECT icd_code 
-FROM neurological_type_disease_icd_codes 
-WHERE icd_version = d.icd_version)
-THEN 1 ELSE 0 END) > 0
-THEN 'TRUE' ELSE 'FALSE'
-END AS with_neurological_type_disease,
-SUM(CASE WHEN d.admit_date BETWEEN t.index_date AND t.event_date
-AND d.icd_code IN (
-SELECT icd_code 
-FROM neurological_type_disease_icd_codes 
-WHERE icd_version = d.icd_version)
-THEN 1 ELSE 0 END) AS neurological_type_disease_times,
-CASE WHEN SUM(CASE 
-WHEN d.admit_date BETWEEN t.index_date AND t.event_date
-AND d.icd_code IN (
-SELECT icd_code 
-FROM diabetes_icd_codes 
-WHERE icd_version = d.icd_version)
-THEN 1 ELSE 0 END) > 0
-THEN 'TRUE' ELSE 'FALSE'
-END AS with_diabetes,
-SUM(CASE WHEN d.admit_date BETWEEN t.index_date AND t.event_date
-AND d.icd_code IN (
-SELECT icd_code 
-FROM diabetes_icd_codes 
-WHERE icd_version = d.icd_version)
-THEN 1 ELSE 0 END) AS diabetes_times,
-CASE WHEN SUM(CASE 
-WHEN d.admit_date BETWEEN t.index_date AND t.event_date
-AND d.icd_code IN (
-SELECT icd_code 
-FROM hyperlipidemia_icd_codes 
-WHERE icd_version = d.icd_version)
-THEN 1 ELSE 0 END) > 0
-THEN 'TRUE' ELSE 'FALSE'
-END AS with_hyperlipidemia,
-SUM(CASE WHEN d.admit_date BETWEEN t.index_date AND t.event_date
-AND d.icd_code IN (
-SELECT icd_code 
-FROM hyperlipidemia_icd_codes 
-WHERE icd_version = d.icd_version)
-THEN 1 ELSE 0 END) AS hyperlipidemia_times
-FROM temp_twenty AS t
-LEFT JOIN temp_twenty_one AS d
-ON t.subject_id = d.subject_id
-GROUP BY t.subject_id;
-SELECT * FROM temp_twenty_two;""",
-        # SQL Step Twenty-Three
-        f"""DROP TABLE IF EXISTS temp_twenty_three;
-CREATE TABLE temp_twenty_three AS
-SELECT
-temp_twenty.subject_id,
-temp_twenty.gender,
-temp_twenty.age,
-temp_twenty.with_psychosis,
-temp_twenty.index_date,
-temp_twenty.event_date,
-temp_twenty."T",
-temp_twenty."E",
-temp_twenty_two.with_hypertension,
-temp_twenty_two.with_heart_type_disease,
-temp_twenty_two.with_neurological_type_disease,
-temp_twenty_two.with_diabetes,
-temp_twenty_two.with_hyperlipidemia,
-temp_twenty_two.hypertension_times,
-temp_twenty_two.heart_type_disease_times,
-temp_twenty_two.neurological_type_disease_times,
-temp_twenty_two.diabetes_times,
-temp_twenty_two.hyperlipidemia_times
-FROM temp_twenty
-LEFT JOIN temp_twenty_two
-ON temp_twenty.subject_id = temp_twenty_two.subject_id;
-SELECT * FROM temp_twenty_three;"""
-    ]
+    # Track which steps are up to date for incremental "Execute All" runs
+    if "pipeline_state" not in st.session_state:
+        st.session_state["pipeline_state"] = PipelineState()
+    pipeline = st.session_state["pipeline_state"]
 
     # Initialize session state keys for each query if not already set
     for i in range(36):
         if f"query_result_{i}" not in st.session_state:
             st.session_state[f"query_result_{i}"] = None
         if f"last_query_{i}" not in st.session_state:
-            st.session_state[f"last_query_{i}"] = default_sql_queries[i]
+            st.session_state[f"last_query_{i}"] = DISEASE_QUERIES[i]
+
+    # While a background run is using the engine, the page avoids waiting on it and disables new runs
+    job = st.session_state.get("pipeline_job")
+    running = job is not None and job.is_active()
 
     # Build alias mapping for PKL files (replace '.' with '_' in table names)
     alias_map = {}
     table_info = []
-    for pkl_file in os.listdir(PKL_DIR):
-        if pkl_file.endswith(".pkl"):
-            original_table_name = os.path.splitext(pkl_file)[0]
-            alias_table_name = original_table_name.replace(".", "_")
-            if alias_table_name not in data_dict:
-                try:
-                    df = pd.read_pickle(os.path.join(PKL_DIR, pkl_file))
-                    if isinstance(df, pd.DataFrame):
-                        df = clean_df(df)
-                        for col in df.columns:
-                            if any(keyword in col.lower() for keyword in ['time', 'date', 'datetime']):
-                                try:
-                                    df[col] = pd.to_datetime(df[col], errors='coerce').astype("datetime64[ns]")
-                                except Exception as e:
-                                    st.write(f"Warning: Failed to convert {col}: {e}")
-                        data_dict[alias_table_name] = df
-                except Exception as e:
-                    st.error(f"❌ Unable to read {pkl_file}: {e}")
-            alias_map[original_table_name] = alias_table_name
-            table_info.append({"Table Name": original_table_name, "Record Count": len(data_dict[alias_table_name])})
+    for original_table_name in table_files:
+        alias_table_name = disease_table_alias(original_table_name)
+        alias_map[original_table_name] = alias_table_name
+        if base_store.has_table(alias_table_name):
+            table_info.append({"Table Name": original_table_name, "Record Count": base_store.row_count(alias_table_name)})
 
     def sort_tables(table):
         name = table["Table Name"]
@@ -844,8 +233,17 @@ SELECT * FROM temp_twenty_three;"""
     table_info_df.index = range(1, len(table_info_df) + 1)
 
     st.title("📊 Disease-Specific SQL Queries")
-    if data_dict:
+    if table_info:
         st.success(f"✅ Successfully loaded {len(table_info)} tables!")
+        if running:
+            session_memory = "measured again when the run finishes"
+        else:
+            session_bytes = engine.session_bytes() + dataframes_bytes(st.session_state[f"query_result_{i}"] for i in range(36))
+            session_memory = f"{format_bytes(session_bytes)} this session (temp tables and query results)"
+        st.caption(
+            f"🧠 Memory: {format_bytes(base_store.shared_bytes())} shared base tables (loaded once per server process) · "
+            f"{session_memory}"
+        )
         st.subheader("📋 Queryable Tables")
         st.dataframe(table_info_df, use_container_width=True)
         # Create an HTML anchor for "Back to Top"
@@ -855,57 +253,85 @@ SELECT * FROM temp_twenty_three;"""
         # Two main tabs: one for Table Test and one for Specific Diseases Query Steps
         tab1, tab2 = st.tabs(["Specific Diseases Query Steps", "Table Test"])
         with tab2:
-            if st.button("▶️ Execute All SQL Sequentially 📚"):
-                execute_all_all(range(0, 13), alias_map, data_dict)
+            if st.button("▶️ Execute All SQL Sequentially 📚", disabled=running):
+                execute_all_all(range(0, 13), alias_map, engine)
             for i in range(13):
-                st.subheader(f"🔎 {query_names[i]}")
+                st.subheader(f"🔎 {DISEASE_QUERY_NAMES[i]}")
                 num_lines = st.session_state[f"last_query_{i}"].count("\n") + 1
                 input_height = max(100, num_lines * 25)
                 sql_query = st.text_area(
-                    f"Please enter {query_names[i]}",
+                    f"Please enter {DISEASE_QUERY_NAMES[i]}",
                     st.session_state[f"last_query_{i}"],
                     height=input_height
                 )
                 if sql_query != st.session_state[f"last_query_{i}"]:
                     st.session_state[f"last_query_{i}"] = sql_query
-                if st.button(f"👉 Execute SQL", key=f"btn_{i}"):
-                    execute_all_all([i], alias_map, data_dict)
+                if st.button(f"👉 Execute SQL", key=f"btn_{i}", disabled=running):
+                    execute_all_all([i], alias_map, engine)
                 # Display two sub-tabs: Data output and Messages
                 sub_tabs = st.tabs(["Data output", "Messages"])
                 with sub_tabs[0]:
-                    if isinstance(st.session_state[f"query_result_{i}"], pd.DataFrame):
-                        st.dataframe(st.session_state[f"query_result_{i}"], use_container_width=True)
+                    if st.session_state[f"query_result_{i}"] is not None:
+                        show_result(f"query_result_{i}", st.session_state[f"query_result_{i}"])
                     # else:
                     #     st.write("No data output available.")
                 with sub_tabs[1]:
                     for msg in st.session_state.get(f"query_message_{i}", []):
                         st.write(msg)
+                    if st.session_state.get(f"query_profile_{i}"):
+                        st.dataframe(profile_table(st.session_state[f"query_profile_{i}"]), use_container_width=True)
         
         with tab1:
-            if st.button("▶️ Execute All SQL Sequentially 📗"):
-                execute_all_all(range(13, 36), alias_map, data_dict)
+            if st.button("▶️ Execute All SQL Sequentially 📗", disabled=running):
+                # Only re-run steps that are stale (edited, never run or fed by a changed table) and their dependents
+                step_sql = {i: apply_alias_map(st.session_state[f"last_query_{i}"], alias_map) for i in range(13, 36)}
+                stale_steps = pipeline.plan(step_sql, engine)
+                if stale_steps:
+                    rerun_names = ", ".join(DISEASE_QUERY_NAMES[i] for i in stale_steps)
+                    st.session_state["pipeline_status"] = f"♻️ {len(stale_steps)} of {len(step_sql)} steps to re-run: {rerun_names}."
+                    # The steps run on a background worker; results appear below as each step finishes
+                    labels = {i: DISEASE_QUERY_NAMES[i] for i in stale_steps}
+                    st.session_state["pipeline_profile"] = {}
+                    st.session_state["pipeline_job"] = start_pipeline_job(stale_steps, alias_map, engine, labels)
+                else:
+                    st.session_state["pipeline_status"] = "✅ All steps were up to date; nothing was re-run."
+            if st.session_state.get("pipeline_job") is not None:
+                pipeline_progress()
+            elif st.session_state.get("pipeline_status"):
+                st.caption(st.session_state["pipeline_status"])
+            if st.session_state.get("pipeline_profile"):
+                # Every statement's timings, row counts and memory changes from the latest run, as JSON
+                st.download_button(
+                    "⬇️ Download run profile (JSON)",
+                    profile_json(st.session_state["pipeline_profile"], dict(enumerate(DISEASE_QUERY_NAMES))),
+                    file_name="disease_pipeline_profile.json",
+                    mime="application/json",
+                    disabled=running
+                )
             for i in range(13, 36):
-                st.subheader(f"🔎 {query_names[i]}")
+                st.subheader(f"🔎 {DISEASE_QUERY_NAMES[i]}")
                 num_lines = st.session_state[f"last_query_{i}"].count("\n") + 1
                 input_height = max(100, num_lines * 25)
                 sql_query = st.text_area(
-                    f"{query_names_subtitle[i-13]}",
+                    f"{DISEASE_QUERY_SUBTITLES[i-13]}",
                     st.session_state[f"last_query_{i}"],
                     height=input_height
                 )
                 if sql_query != st.session_state[f"last_query_{i}"]:
                     st.session_state[f"last_query_{i}"] = sql_query
-                if st.button(f"👉 Execute SQL", key=f"btn_{i}"):
-                    execute_all_all([i], alias_map, data_dict)
+                if st.button(f"👉 Execute SQL", key=f"btn_{i}", disabled=running):
+                    execute_all_all([i], alias_map, engine)
                 sub_tabs = st.tabs(["Data output", "Messages"])
                 with sub_tabs[0]:
-                    if isinstance(st.session_state[f"query_result_{i}"], pd.DataFrame):
-                        st.dataframe(st.session_state[f"query_result_{i}"], use_container_width=True)
+                    if st.session_state[f"query_result_{i}"] is not None:
+                        show_result(f"query_result_{i}", st.session_state[f"query_result_{i}"])
                     # else:
                     #     st.write("No data output available.")
                 with sub_tabs[1]:
                     for msg in st.session_state.get(f"query_message_{i}", []):
                         st.write(msg)
+                    if st.session_state.get(f"query_profile_{i}"):
+                        st.dataframe(profile_table(st.session_state[f"query_profile_{i}"]), use_container_width=True)
 
     st.markdown("""
     <style>
@@ -1,89 +1,178 @@
 import streamlit as st
-import os
-import re
 import pandas as pd
-from pandasql import sqldf
-
-# --- Logging Function ---
-def log_message(query_index, message):
-    key = f"drug_message_{query_index}"
-    if key not in st.session_state:
-        st.session_state[key] = []
-    st.session_state[key].append(message)
+from mimic_sql.data_store import dataframes_bytes, discover_tables, format_bytes
+from mimic_sql.engine import SQLEngine
+from mimic_sql.examples import (
+    DRUG_DATA_DIR, DRUG_QUERIES, DRUG_QUERY_NAMES, DRUG_QUERY_SUBTITLES, PRESCRIPTIONS_TABLE, build_drug_store,
+    drug_table_alias
+)
+from mimic_sql.jobs import PipelineJob, submit_job
+from mimic_sql.pipeline import PipelineState, pipeline_tables, step_schedule
+from mimic_sql.profiling import profile_json, profile_table
+from mimic_sql.result_cache import shared_result_cache
+from mimic_sql.results import DEFAULT_PAGE_SIZE, PAGE_SIZES, page_count
+from mimic_sql.sql_parse import apply_alias_map
+from mimic_sql.steps import run_step
+from mimic_sql.streaming import stream_row_threshold, stream_steps, streaming_problem
 
 # --- Helper Functions (Common) ---
 
-# Convert only non-numeric columns to datetime
-def convert_time_columns(df):
+# Convert only non-numeric columns to datetime; problems are added to warnings
+def convert_time_columns(df, warnings):
     time_keywords = ['time', 'date', 'datetime']
     for col in df.columns:
         if any(keyword in col.lower() for keyword in time_keywords) and not pd.api.types.is_numeric_dtype(df[col]):
             try:
                 df[col] = pd.to_datetime(df[col], errors='coerce')
             except Exception as e:
-                log_message(-1, f"Warning: Failed to convert column '{col}': {e}")
+                warnings.append(f"Warning: Failed to convert column '{col}': {e}")
     return df
 
-# Simulate DELETE statements
-def simulate_delete(q, data_dict, query_index):
-    pattern_simple = r"DELETE\s+FROM\s+(\w+)\s+WHERE\s+(.+)"
-    match_simple = re.match(pattern_simple, q, re.IGNORECASE)
-    if match_simple:
-        table_name = match_simple.group(1)
-        condition = match_simple.group(2)
-        # Convert SQL's "=" to Pandas' "==" syntax.
-        condition = condition.replace(" = ", " == ")
-        if table_name in data_dict:
-            df_table = data_dict[table_name]
-            try:
-                mask = df_table.eval(condition)
-                filtered_df = df_table[~mask]
-                data_dict[table_name] = filtered_df
-                log_message(query_index, f"✅ DELETE complete: Deleted rows from {table_name} meeting condition '{condition}'")
-            except Exception as e:
-                log_message(query_index, f"Warning: Delete operation failed, condition parsing error: {e}")
-        else:
-            log_message(query_index, f"Warning: Cannot find {table_name} in data_dict")
-    else:
-        log_message(query_index, "Warning: DELETE statement format not supported, currently only supports DELETE FROM <table> WHERE <condition> format.")
-
 # --- Drug-Specific SQL Execution Function ---
-def drug_execute_all_all(indices, alias_map, data_dict):
+
+# Run one drug step's statements (table names already aliased) with this page's display preparation
+def run_drug_step(i, sql_query, engine, result_cache):
+    return run_step(sql_query, engine, result_cache, transform=display_transform(i))
+
+# Prepare rows fetched from a step's SELECT result for display. The first page is fetched on the
+# job's worker thread, so this only changes the DataFrame; conversion problems are kept with it and
+# shown by the script (see display_warnings).
+def display_transform(i):
+    def transform(df):
+        warnings = []
+        if i == 0:
+            if "starttime" in df.columns:
+                df["starttime"] = pd.to_datetime(df["starttime"], errors="coerce")
+            if "stoptime" in df.columns:
+                df["stoptime"] = pd.to_datetime(df["stoptime"], errors="coerce")
+        df = convert_time_columns(df, warnings)
+        df.attrs["warnings"] = warnings
+        return df
+    return transform
+
+# Conversion problems display_transform recorded on fetched rows
+def display_warnings(df):
+    return df.attrs.get("warnings", [])
+
+# Let go of the results of steps about to re-run, so the engine need not keep their rows
+def release_drug_results(indices):
     for i in indices:
-        # Initialize the log for this query.
-        st.session_state[f"drug_message_{i}"] = []
-        sql_query = st.session_state[f"drug_last_query_{i}"]
-        for original, alias in alias_map.items():
-            sql_query = sql_query.replace(original, alias)
-        queries = [q.strip() for q in sql_query.split(";") if q.strip()]
-        for q in queries:
-            if q.upper().startswith("DROP TABLE IF EXISTS"):
-                drop_table_name = q.split()[-1]
-                if drop_table_name in data_dict:
-                    del data_dict[drop_table_name]
-                    log_message(i, f"🗑️ `{drop_table_name}` DROP.")
-            elif q.upper().startswith("CREATE TEMP TABLE") or q.upper().startswith("CREATE TABLE"):
-                temp_table_name = q.split("AS")[0].split()[-1]
-                temp_query = q.split("AS", 1)[1].strip()
-                if temp_table_name in data_dict:
-                    del data_dict[temp_table_name]
-                data_dict[temp_table_name] = sqldf(temp_query, locals() | data_dict)
-                log_message(i, f"✅ CREATE complete: Table {temp_table_name} created.")
-            elif q.upper().startswith("DELETE"):
-                simulate_delete(q, data_dict, i)
-            elif q.upper().startswith("SELECT"):
-                result_df = sqldf(q, locals() | data_dict)
-                if i == 0:
-                    if "starttime" in result_df.columns:
-                        result_df["starttime"] = pd.to_datetime(result_df["starttime"], errors="coerce")
-                    if "stoptime" in result_df.columns:
-                        result_df["stoptime"] = pd.to_datetime(result_df["stoptime"], errors="coerce")
-                result_df = convert_time_columns(result_df)
-                result_df.index = range(1, len(result_df) + 1)
-                st.session_state[f"drug_query_result_{i}"] = result_df
-                log_message(i, "✅ SELECT complete: Query executed successfully.")
+        st.session_state[f"drug_query_result_{i}"] = None
+
+# Store a finished step's messages and data output in session_state
+def apply_drug_step_output(i, sql_query, messages, step_result, profile):
+    if step_result is not None:
+        messages = messages + display_warnings(step_result.first_page)
+    st.session_state[f"drug_message_{i}"] = messages
+    st.session_state[f"drug_query_profile_{i}"] = profile
+    st.session_state.setdefault("drug_pipeline_profile", {})[i] = profile
+    if step_result is not None:
+        st.session_state[f"drug_query_result_{i}"] = step_result
+    st.session_state["drug_pipeline_state"].record_run(i, sql_query)
+
+# Run steps synchronously inside the script run (single-step buttons)
+def drug_execute_all_all(indices, alias_map, engine):
+    # CREATE and SELECT results are looked up in the process-wide result cache before running
+    result_cache = shared_result_cache()
+    release_drug_results(indices)
+    for i in indices:
+        sql_query = apply_alias_map(st.session_state[f"drug_last_query_{i}"], alias_map)
+        messages, step_result, profile = run_drug_step(i, sql_query, engine, result_cache)
+        apply_drug_step_output(i, sql_query, messages, step_result, profile)
     st.rerun()
 
+# Submit steps to the shared worker pool; the page polls the job and shows results as steps finish
+def start_drug_pipeline_job(indices, alias_map, engine, labels):
+    result_cache = shared_result_cache()
+    release_drug_results(indices)
+    step_sql = {i: apply_alias_map(st.session_state[f"drug_last_query_{i}"], alias_map) for i in indices}
+    # Steps that do not depend on each other run at the same time
+    schedule = step_schedule(step_sql, pipeline_tables(step_sql, engine))
+    def run_job_step(i, step_engine):
+        return (step_sql[i],) + run_drug_step(i, step_sql[i], step_engine, result_cache)
+    return submit_job(PipelineJob(indices, run_job_step, engine, labels, schedule))
+
+# Whether a run of these steps should stream prescriptions in chunks: the table is an Arrow file too
+# big to load whole, Step 1 (which reads it) is re-run, and every step works one row at a time
+def should_stream_drug_steps(step_sql, base_store):
+    source = base_store.arrow_sources.get(PRESCRIPTIONS_TABLE)
+    if source is None or source.num_rows <= stream_row_threshold() or 1 not in step_sql:
+        return False
+    return streaming_problem(step_sql, PRESCRIPTIONS_TABLE) is None
+
+# Stream prescriptions through the steps on the shared worker pool, a chunk at a time; every step's
+# output is ready when the stream ends, and cancelling stops before the next chunk
+def start_drug_streaming_job(indices, alias_map, engine, labels):
+    release_drug_results(indices)
+    step_sql = {i: apply_alias_map(st.session_state[f"drug_last_query_{i}"], alias_map) for i in indices}
+    outputs = {}
+    def report(rows_done, total_rows):
+        job.detail = f"🌊 {rows_done:,} of {total_rows:,} prescriptions streamed"
+    def stream_job_step(i, step_engine):
+        if not outputs:
+            outputs.update(stream_steps(
+                step_sql, PRESCRIPTIONS_TABLE, step_engine.base.arrow_sources[PRESCRIPTIONS_TABLE], step_engine,
+                should_stop=job.cancel_event.is_set, progress=report, display_transform=display_transform
+            ))
+        return (step_sql[i],) + outputs[i]
+    job = PipelineJob(indices, stream_job_step, engine, labels)
+    return submit_job(job)
+
+# Poll the background run: copy finished steps into the page, show progress and offer cancellation
+@st.fragment(run_every=1)
+def drug_pipeline_progress():
+    job = st.session_state.get("drug_pipeline_job")
+    if job is None:
+        return
+    # Read the status before collecting, so steps finishing in between are collected on the next poll
+    active = job.is_active()
+    finished = job.collect()
+    for i, (sql_query, messages, step_result, profile) in finished:
+        apply_drug_step_output(i, sql_query, messages, step_result, profile)
+    if active:
+        st.caption(st.session_state.get("drug_pipeline_status", ""))
+        st.progress(job.progress(), text=job.describe())
+        if st.button("⏹️ Cancel run", key="cancel_drug_pipeline_job"):
+            job.cancel()
+        if finished:
+            # Redraw the whole page so the new step results appear
+            st.rerun(scope="app")
+    else:
+        st.session_state["drug_pipeline_job"] = None
+        st.session_state["drug_pipeline_status"] = f"{st.session_state.get('drug_pipeline_status', '')} {job.describe()}".strip()
+        st.rerun(scope="app")
+
+# --- Paged Result Display ---
+
+# Show a result one page at a time: the row count and columns up front, then only the rows of the
+# requested page are read from the engine and sent to the browser
+def show_result(key, result):
+    st.caption(f"{result.num_rows:,} rows × {len(result.columns)} columns")
+    with st.expander("Columns"):
+        st.dataframe(result.column_types(), use_container_width=True, hide_index=True)
+    sort_col, order_col, size_col, page_col = st.columns(4)
+    sort_by = sort_col.selectbox("Sort by", ["(table order)"] + result.columns, key=f"{key}_sort_by")
+    descending = order_col.selectbox("Order", ["Ascending", "Descending"], key=f"{key}_order") == "Descending"
+    page_size = size_col.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE), key=f"{key}_page_size")
+    num_pages = page_count(result.num_rows, page_size)
+    # A new result or page size can leave the remembered page past the end
+    if st.session_state.get(f"{key}_page", 1) > num_pages:
+        st.session_state[f"{key}_page"] = num_pages
+    page = page_col.number_input(f"Page (of {num_pages:,})", min_value=1, max_value=num_pages, step=1, key=f"{key}_page")
+    sort_by = sort_by if sort_by in result.columns else None
+    df = result.page(page - 1, page_size, sort_by, descending)
+    for warning in display_warnings(df):
+        st.write(warning)
+    st.dataframe(df, use_container_width=True)
+
+# --- Shared Base Tables ---
+
+# Load the drug base tables once per server process; every session attaches the same read-only store.
+# Tables ingested as Arrow files are memory-mapped and only the referenced columns are loaded.
+@st.cache_resource(show_spinner="Loading MIMIC-IV drug tables...")
+def load_drug_base_tables(table_files):
+    return build_drug_store(table_files)
+
 # --- Drug-Specific Web Display Function ---
 def show():
     st.markdown("""
@@ -95,137 +184,44 @@ def show():
     </style>
     """, unsafe_allow_html=True)
 
-    PKL_DIR = "MIMIC_IV_data/drugs_data"
+    PKL_DIR = DRUG_DATA_DIR
 
-    if "drug_data_dict" not in st.session_state:
-        st.session_state["drug_data_dict"] = {}
-    data_dict = st.session_state["drug_data_dict"]
-
-    pkl_files = [f for f in os.listdir(PKL_DIR) if f.endswith(".pkl")]
-    if not pkl_files:
+    table_files = discover_tables(PKL_DIR)
+    if not table_files:
         st.error(f"❌ No PKL files were found in `{PKL_DIR}`.")
         return
 
-    query_names = [
-        "SQL Statement for the prescriptions table",  
-        "Step 1",
-        "Step 2",
-        "Step 3",
-        "Step 4",
-        "Step 5",
-        "Step 6",
-        "Step 7"
-    ]
+    base_store = load_drug_base_tables(tuple(table_files.items()))
+    for error in base_store.errors:
+        st.error(error)
+
+    if "drug_sql_engine" not in st.session_state:
+        st.session_state["drug_sql_engine"] = SQLEngine(base=base_store)
+    engine = st.session_state["drug_sql_engine"]
 
-    query_names_subtitle = [
-        """Uniform casing for drug names and extended search for identical names
-        (Using the mimic_hosp.prescriptions table for querying).""",
-        "The drug unit is MG (using the table from Step 1 for querying).",
-        "The drug dose is not NULL (using the table from Step 2 for querying).",
-        "The start and end times of drug usage are not NULL (using the table from Step 3 for querying).",
-        """1.Add the hours_diff column to store the duration from the start to the end of drug usage (in hours).
-            \n2.Use ABS to ensure that the values in the hours_diff column are converted to absolute values,
-            preventing negative values (Using the table from Step 4 for querying).""",
-        "Change all 0 values in the hours_diff column to 1 (Using the table from Step 5 for querying).",
-        "Delete entire rows where the dose_val_rx column contains a value of 0 (Using the table from Step 6 for querying)."
-    ]
+    # Track which steps are up to date for incremental "Execute All" runs
+    if "drug_pipeline_state" not in st.session_state:
+        st.session_state["drug_pipeline_state"] = PipelineState()
+    pipeline = st.session_state["drug_pipeline_state"]
 
-    default_sql_queries = [
-        "SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime FROM mimiciv_hosp.prescriptions;",
-        """DROP TABLE IF EXISTS temp_one;
-CREATE TEMP TABLE temp_one AS
-SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime
-FROM mimiciv_hosp.prescriptions
-WHERE LOWER(drug) LIKE LOWER('aspirin%')
-OR LOWER(drug) LIKE LOWER('warfarin%')
-OR LOWER(drug) LIKE LOWER('clopidogrel%')
-OR LOWER(drug) LIKE LOWER('apixaban%')
-OR LOWER(drug) LIKE LOWER('rivaroxaban%')
-OR LOWER(drug) LIKE LOWER('dabigatran etexilate%')
-OR LOWER(drug) LIKE LOWER('cilostazol%')
-OR LOWER(drug) LIKE LOWER('enoxaparin%');
-SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime
-FROM temp_one;""",
-        """DROP TABLE IF EXISTS temp_two;
-CREATE TEMP TABLE temp_two AS
-SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime
-FROM temp_one
-WHERE dose_unit_rx = 'mg';
-SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime
-FROM temp_one
-WHERE dose_unit_rx = 'mg';""",
-        """DROP TABLE IF EXISTS temp_three;
-CREATE TEMP TABLE temp_three AS
-SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime
-FROM temp_two
-WHERE dose_val_rx IS NOT NULL;
-SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime
-FROM temp_two
-WHERE dose_val_rx IS NOT NULL;""",
-        """DROP TABLE IF EXISTS temp_four;
-CREATE TEMP TABLE temp_four AS
-SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime
-FROM temp_three
-WHERE (starttime IS NOT NULL AND stoptime IS NOT NULL);
-SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime
-FROM temp_three
-WHERE (starttime IS NOT NULL AND stoptime IS NOT NULL);""",
-        """DROP TABLE IF EXISTS temp_five;
-CREATE TEMP TABLE temp_five AS
-SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime,
-ABS((julianday(stoptime) - julianday(starttime)) * 24) AS hours_diff
-FROM temp_four;
-SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime,
-ABS((julianday(stoptime) - julianday(starttime)) * 24) AS hours_diff
-FROM temp_four;""",
-        """DROP TABLE IF EXISTS temp_six;
-CREATE TEMP TABLE temp_six AS
-SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime,
-CASE 
-WHEN ABS((julianday(stoptime) - julianday(starttime)) * 24) = 0 
-THEN 1 
-ELSE ABS((julianday(stoptime) - julianday(starttime)) * 24)
-END AS hours_diff
-FROM temp_five;
-SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime,
-CASE 
-WHEN ABS((julianday(stoptime) - julianday(starttime)) * 24) = 0 
-THEN 1 
-ELSE ABS((julianday(stoptime) - julianday(starttime)) * 24)
-END AS hours_diff
-FROM temp_five;""",
-        """DROP TABLE IF EXISTS temp_seven;
-CREATE TEMP TABLE temp_seven AS
-SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime, hours_diff
-FROM temp_six;
-DELETE FROM temp_seven
-WHERE dose_val_rx = '0';
-SELECT subject_id, drug, dose_val_rx, dose_unit_rx, starttime, stoptime, hours_diff
-FROM temp_seven;"""
-    ]
+    # While a background run is using the engine, the page avoids waiting on it and disables new runs
+    job = st.session_state.get("drug_pipeline_job")
+    running = job is not None and job.is_active()
 
     # Initialize drug-specific session state keys
     for i in range(8):
         if f"drug_query_result_{i}" not in st.session_state:
             st.session_state[f"drug_query_result_{i}"] = None
         if f"drug_last_query_{i}" not in st.session_state:
-            st.session_state[f"drug_last_query_{i}"] = default_sql_queries[i]
+            st.session_state[f"drug_last_query_{i}"] = DRUG_QUERIES[i]
 
     alias_map = {}
     table_info = []
-    for pkl_file in os.listdir(PKL_DIR):
-        if pkl_file.endswith(".pkl"):
-            original_table_name = os.path.splitext(pkl_file)[0]
-            alias_table_name = original_table_name.replace(".", "_dot_") if "." in original_table_name else original_table_name
-            if alias_table_name not in data_dict:
-                try:
-                    df = pd.read_pickle(os.path.join(PKL_DIR, pkl_file))
-                    if isinstance(df, pd.DataFrame):
-                        data_dict[alias_table_name] = df
-                except Exception as e:
-                    st.error(f"❌ Unable to read {pkl_file}: {e}")
-            alias_map[original_table_name] = alias_table_name
-            table_info.append({"Table Name": original_table_name, "Record Count": len(data_dict[alias_table_name])})
+    for original_table_name in table_files:
+        alias_table_name = drug_table_alias(original_table_name)
+        alias_map[original_table_name] = alias_table_name
+        if base_store.has_table(alias_table_name):
+            table_info.append({"Table Name": original_table_name, "Record Count": base_store.row_count(alias_table_name)})
 
     def sort_tables(table):
         name = table["Table Name"]
@@ -240,9 +236,18 @@ FROM temp_seven;"""
     table_info_df.index = range(1, len(table_info_df) + 1)
 
     st.title("📊 Drug-Specific SQL Queries")
-    if data_dict:
+    if table_info:
         st.subheader("📋 Queryable Tables")
         st.dataframe(table_info_df, use_container_width=True)
+        if running:
+            session_memory = "measured again when the run finishes"
+        else:
+            session_bytes = engine.session_bytes() + dataframes_bytes(st.session_state[f"drug_query_result_{i}"] for i in range(8))
+            session_memory = f"{format_bytes(session_bytes)} this session (temp tables and query results)"
+        st.caption(
+            f"🧠 Memory: {format_bytes(base_store.shared_bytes())} shared base tables (loaded once per server process) · "
+            f"{session_memory}"
+        )
         # Create an HTML anchor for "Back to Top"
         st.markdown("<a name='top'></a>", unsafe_allow_html=True)
         st.markdown("")
@@ -251,50 +256,102 @@ FROM temp_seven;"""
         
         with main_tab2:
             for i in range(0, 1):
-                st.subheader(f"🔎 {query_names[i]}")
+                st.subheader(f"🔎 {DRUG_QUERY_NAMES[i]}")
                 num_lines = st.session_state[f"drug_last_query_{i}"].count("\n") + 1
                 input_height = max(100, num_lines * 25)
                 sql_query = st.text_area(
-                    f"Please enter {query_names[i]}",
+                    f"Please enter {DRUG_QUERY_NAMES[i]}",
                     st.session_state[f"drug_last_query_{i}"],
                     height=input_height
                 )
                 if sql_query != st.session_state[f"drug_last_query_{i}"]:
                     st.session_state[f"drug_last_query_{i}"] = sql_query
-                if st.button(f"👉 Execute SQL", key=f"drug_btn_{i}"):
-                    drug_execute_all_all([i], alias_map, data_dict)
+                if st.button(f"👉 Execute SQL", key=f"drug_btn_{i}", disabled=running):
+                    drug_execute_all_all([i], alias_map, engine)
                 # 顯示兩個子標籤頁：Data output 與 Messages
                 tabs = st.tabs(["Data output", "Messages"])
                 with tabs[0]:
-                    if isinstance(st.session_state[f"drug_query_result_{i}"], pd.DataFrame):
-                        st.dataframe(st.session_state[f"drug_query_result_{i}"], use_container_width=True)
+                    if st.session_state[f"drug_query_result_{i}"] is not None:
+                        show_result(f"drug_query_result_{i}", st.session_state[f"drug_query_result_{i}"])
                 with tabs[1]:
                     for msg in st.session_state.get(f"drug_message_{i}", []):
                         st.write(msg)
+                    if st.session_state.get(f"drug_query_profile_{i}"):
+                        st.dataframe(profile_table(st.session_state[f"drug_query_profile_{i}"]), use_container_width=True)
+
+            # Case-insensitive drug-name prefix search, answered from the prebuilt index
+            st.subheader("💊 Drug Name Search")
+            search_text = st.text_input("Drug name prefixes (comma-separated)", "aspirin, warfarin")
+            prefixes = [prefix.strip() for prefix in search_text.split(",") if prefix.strip()]
+            drug_index = base_store.prefix_indexes.get((PRESCRIPTIONS_TABLE, "drug"))
+            if prefixes and drug_index is not None:
+                counts = drug_index.value_counts(prefixes)
+                st.caption(f"{len(counts)} drug names match, {sum(counts.values())} prescriptions in total.")
+                counts_df = pd.DataFrame({"Drug Name (lowercase)": list(counts), "Prescriptions": list(counts.values())})
+                counts_df.index = range(1, len(counts_df) + 1)
+                st.dataframe(counts_df, use_container_width=True)
+                if st.button("👉 Show matching prescriptions", key="drug_search_btn", disabled=running):
+                    st.session_state["drug_search_result"] = engine.search_prefixes(
+                        PRESCRIPTIONS_TABLE, "drug", prefixes,
+                        ["subject_id", "drug", "dose_val_rx", "dose_unit_rx", "starttime", "stoptime"],
+                        transform=display_transform(0)
+                    )
+                if st.session_state.get("drug_search_result") is not None:
+                    show_result("drug_search_result", st.session_state["drug_search_result"])
         
         with main_tab1:
-            if st.button("▶️ Execute All SQL Sequentially 📙"):
-                drug_execute_all_all(range(1, 8), alias_map, data_dict)
+            if st.button("▶️ Execute All SQL Sequentially 📙", disabled=running):
+                # Only re-run steps that are stale and the steps that depend on them
+                step_sql = {i: apply_alias_map(st.session_state[f"drug_last_query_{i}"], alias_map) for i in range(1, 8)}
+                stale_steps = pipeline.plan(step_sql, engine)
+                if stale_steps:
+                    rerun_names = ", ".join(DRUG_QUERY_NAMES[i] for i in stale_steps)
+                    st.session_state["drug_pipeline_status"] = f"♻️ {len(stale_steps)} of {len(step_sql)} steps to re-run: {rerun_names}."
+                    # The steps run on a background worker; results appear below as each step finishes
+                    labels = {i: DRUG_QUERY_NAMES[i] for i in stale_steps}
+                    st.session_state["drug_pipeline_profile"] = {}
+                    if should_stream_drug_steps({i: step_sql[i] for i in stale_steps}, base_store):
+                        st.session_state["drug_pipeline_status"] += " Prescriptions are streamed in chunks."
+                        st.session_state["drug_pipeline_job"] = start_drug_streaming_job(stale_steps, alias_map, engine, labels)
+                    else:
+                        st.session_state["drug_pipeline_job"] = start_drug_pipeline_job(stale_steps, alias_map, engine, labels)
+                else:
+                    st.session_state["drug_pipeline_status"] = "✅ All steps were up to date; nothing was re-run."
+            if st.session_state.get("drug_pipeline_job") is not None:
+                drug_pipeline_progress()
+            elif st.session_state.get("drug_pipeline_status"):
+                st.caption(st.session_state["drug_pipeline_status"])
+            if st.session_state.get("drug_pipeline_profile"):
+                # Every statement's timings, row counts and memory changes from the latest run, as JSON
+                st.download_button(
+                    "⬇️ Download run profile (JSON)",
+                    profile_json(st.session_state["drug_pipeline_profile"], dict(enumerate(DRUG_QUERY_NAMES))),
+                    file_name="drug_pipeline_profile.json",
+                    mime="application/json",
+                    disabled=running
+                )
             for i in range(1, 8):
-                st.subheader(f"🔎 {query_names[i]}")
+                st.subheader(f"🔎 {DRUG_QUERY_NAMES[i]}")
                 num_lines = st.session_state[f"drug_last_query_{i}"].count("\n") + 1
                 input_height = max(100, num_lines * 25)
                 sql_query = st.text_area(
-                    f"{query_names_subtitle[i-1]}",
+                    f"{DRUG_QUERY_SUBTITLES[i-1]}",
                     st.session_state[f"drug_last_query_{i}"],
                     height=input_height
                 )
                 if sql_query != st.session_state[f"drug_last_query_{i}"]:
                     st.session_state[f"drug_last_query_{i}"] = sql_query
-                if st.button(f"👉 Execute SQL", key=f"drug_btn_{i}"):
-                    drug_execute_all_all([i], alias_map, data_dict)
+                if st.button(f"👉 Execute SQL", key=f"drug_btn_{i}", disabled=running):
+                    drug_execute_all_all([i], alias_map, engine)
                 tabs = st.tabs(["Data output", "Messages"])
                 with tabs[0]:
-                    if isinstance(st.session_state[f"drug_query_result_{i}"], pd.DataFrame):
-                        st.dataframe(st.session_state[f"drug_query_result_{i}"], use_container_width=True)
+                    if st.session_state[f"drug_query_result_{i}"] is not None:
+                        show_result(f"drug_query_result_{i}", st.session_state[f"drug_query_result_{i}"])
                 with tabs[1]:
                     for msg in st.session_state.get(f"drug_message_{i}", []):
                         st.write(msg)
+                    if st.session_state.get(f"drug_query_profile_{i}"):
+                        st.dataframe(profile_table(st.session_state[f"drug_query_profile_{i}"]), use_container_width=True)
 
     st.markdown("""
     <style>
@@ -0,0 +1,145 @@
+import pandas as pd
+import pytest
+from mimic_sql.batch import batch_steps, open_engine
+from mimic_sql.benchmark import read_table_file
+from mimic_sql.data_store import BaseTableStore, discover_tables, parse_time_columns
+from mimic_sql.engine import SQLEngine
+from mimic_sql.examples import EXAMPLE_PIPELINES, prepare_disease_table
+from mimic_sql.sql_parse import apply_alias_map, split_statements, sqlite_dialect
+from mimic_sql.steps import run_step
+
+# --- Fixture Database ---
+
+# A few patients with admissions, diagnoses and prescriptions, small enough to check by hand.
+# Text values repeat the patterns the SQL rewrites look for, so a rewrite touching literals shows up.
+PATIENTS = pd.DataFrame({
+    "subject_id": [1, 2, 3, 4, 5, 6],
+    "gender": ["F", "M", "F", "M", None, "F"],
+    "anchor_age": [30, 45, 30, 45, 50, None],
+    "dod": ["2150-03-01", None, "2151-01-15", None, None, "2150-06-30"],
+})
+
+ADMISSIONS = pd.DataFrame({
+    "subject_id": [1, 1, 2, 3, 4, 6],
+    "hadm_id": [10, 11, 20, 30, 40, 60],
+    "admittime": [
+        "2150-01-01 08:00", "2150-02-01 09:30", "2149-05-05 00:00", "2150-12-24 12:00", "2148-01-01 00:00", "2150-06-01 00:00",
+    ],
+    "note": ["flag = TRUE", "dischdate - admitdate", "x", "NATURAL JOIN", "y", None],
+})
+
+DIAGNOSES = pd.DataFrame({
+    "subject_id": [1, 1, 2, 3, 4, 6, 6],
+    "hadm_id": [10, 11, 20, 30, 40, 60, 60],
+    "icd_code": ["F20", "I63", "F20", "E11", "I61", "F25", "Z00"],
+    "icd_version": [10, 10, 9, 10, 10, 10, 10],
+})
+
+PSYCHOSIS_CODES = pd.DataFrame({"icd_code": ["F20", "F25", "295"], "icd_version": [10, 10, 9]})
+STROKE_CODES = pd.DataFrame({"icd_code": ["I63", "I61"], "icd_version": [10, 10]})
+
+PRESCRIPTIONS = pd.DataFrame({
+    "subject_id": [1, 2, 2, 3, 4, 6],
+    "hadm_id": [10, 20, 20, 30, 40, 60],
+    "drug": ["Olanzapine", "olanzapine 5mg", "Haloperidol", "Insulin", "Olanzapine%", None],
+})
+
+TABLES = {
+    "patients": PATIENTS,
+    "admissions": ADMISSIONS,
+    "diagnoses_icd": DIAGNOSES,
+    "psychosis_icd_codes": PSYCHOSIS_CODES,
+    "ischemic_stroke_icd_codes": STROKE_CODES,
+    "prescriptions": PRESCRIPTIONS,
+}
+
+# Shared base tables for the fixture, with the code-set index and drug prefix index the pages build
+@pytest.fixture
+def store():
+    store = BaseTableStore(transform=parse_time_columns)
+    for name, df in TABLES.items():
+        store.register(name, df.copy())
+    store.build_code_set_index()
+    store.build_prefix_index("prescriptions", "drug")
+    return store
+
+# A session engine on the fixture's base tables
+@pytest.fixture
+def engine(store):
+    return SQLEngine(base=store)
+
+# --- Comparing Results ---
+
+# Rows of a statement run exactly as written, in a stable order
+def plain_rows(engine, q):
+    with engine.lock:
+        return sorted(engine.conn.execute(q).fetchall(), key=repr)
+
+# The statement as the engine runs it, after its dialect translation and rewrites
+def engine_sql(engine, q):
+    with engine.lock:
+        return engine.prepare(sqlite_dialect(q, engine.date_columns(q)))
+
+# Rows of a statement run through the engine with all of its rewrites, in the same order
+def engine_rows(engine, q):
+    return plain_rows(engine, engine_sql(engine, q))
+
+# --- Example Pipeline Runs ---
+
+# Per-table preparation the pages apply to each pipeline's bundled files before running steps
+REFERENCE_TRANSFORMS = {"disease": prepare_disease_table, "drug": None}
+
+# Map from a pipeline's bundled table files to their engine names
+def example_alias_map(pipeline):
+    spec = EXAMPLE_PIPELINES[pipeline]
+    return {table_name: spec["alias"](table_name) for table_name in discover_tables(spec["data_dir"])}
+
+# The pipeline's default (label, SQL) steps with engine table names, up to and including the step labelled last
+def example_steps(pipeline, last=None):
+    alias_map = example_alias_map(pipeline)
+    steps = []
+    for label, sql_query in batch_steps(pipeline):
+        steps.append((label, apply_alias_map(sql_query, alias_map)))
+        if label == last:
+            break
+    return steps
+
+# A private engine holding whole copies of the pipeline's bundled tables, as the original pages kept them
+def reference_engine(pipeline):
+    spec = EXAMPLE_PIPELINES[pipeline]
+    transform = REFERENCE_TRANSFORMS[pipeline]
+    reference = SQLEngine()
+    for table_name, path in discover_tables(spec["data_dir"]).items():
+        df = read_table_file(path)
+        reference.register(spec["alias"](table_name), transform(df) if transform else df)
+    return reference
+
+# Run a step's statements exactly as written, after the dialect translation only: none of the engine's
+# rewrites, indexes, shared joins or caches. SELECTs only display rows, so they are skipped.
+def run_reference_sql(reference, sql_query):
+    for q in split_statements(sql_query):
+        if not q.upper().startswith("SELECT"):
+            with reference.lock:
+                reference.conn.execute(sqlite_dialect(q, reference.date_columns(q)))
+
+# Rows of every session table, by lowercase name
+def session_rows(engine):
+    return {name.lower(): plain_rows(engine, f'SELECT * FROM "{name}"') for name in engine.session_tables()}
+
+# The disease pipeline run step by step through run_step on the bundled data, shared by the tests reading it
+@pytest.fixture(scope="session")
+def disease_run():
+    engine, _ = open_engine("disease")
+    for _, sql_query in example_steps("disease"):
+        run_step(sql_query, engine)
+    yield engine
+    engine.close()
+
+# The disease steps through Step 21 on the reference engine. Step 22's correlated code-set lists take
+# minutes without the code-set index, so tests compare it on a subset of subjects instead.
+@pytest.fixture(scope="session")
+def disease_reference():
+    reference = reference_engine("disease")
+    for _, sql_query in example_steps("disease", last="Step 21"):
+        run_reference_sql(reference, sql_query)
+    return reference
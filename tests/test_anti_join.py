@@ -0,0 +1,56 @@
+import pandas as pd
+from conftest import engine_rows, engine_sql, plain_rows
+from mimic_sql.engine import SQLEngine
+
+# Cases and controls with NULL and mixed-type keys, as the Step 18 match exclusion sees them
+COHORT = pd.DataFrame({
+    "subject_id": [1, 2, 3, 4, 5, 6, 7, 8],
+    "gender": ["F", "F", "M", "M", None, None, "F", "M"],
+    "age": [30, 30, 45, 50, 30, 30, None, "45"],
+    "with_psychosis": ["TRUE", "FALSE", "TRUE", "FALSE", "TRUE", "FALSE", "FALSE", "FALSE"],
+})
+
+MATCH_EXCLUSION = """SELECT subject_id FROM temp_eighteen
+WHERE with_psychosis = 'FALSE'
+AND NOT EXISTS (
+SELECT 1
+FROM temp_eighteen temp_eighteen_case
+WHERE with_psychosis = 'TRUE'
+AND temp_eighteen.gender = temp_eighteen_case.gender
+AND temp_eighteen.age = temp_eighteen_case.age)"""
+
+# A control with one NULL key part matches no case, and a case's NULL key must not empty the NOT IN list
+def test_match_exclusion_with_null_and_mixed_type_keys(engine):
+    engine.register("temp_eighteen", COHORT)
+    assert "NOT IN (SELECT temp_eighteen_case.gender" in engine_sql(engine, MATCH_EXCLUSION)
+    assert engine_rows(engine, MATCH_EXCLUSION) == plain_rows(engine, MATCH_EXCLUSION) == [(4,), (6,), (7,)]
+
+# The DELETE reads the table it deletes from, so the key list has to be taken before any row goes
+def test_match_exclusion_delete_leaves_same_rows(engine, store):
+    reference = SQLEngine(base=store)
+    delete = MATCH_EXCLUSION.replace("SELECT subject_id FROM temp_eighteen", "DELETE FROM temp_eighteen", 1)
+    for session in (engine, reference):
+        session.register("temp_eighteen", COHORT)
+    engine.execute(delete)
+    with reference.lock:
+        reference.conn.execute(delete)
+    q = "SELECT subject_id FROM temp_eighteen"
+    assert plain_rows(engine, q) == plain_rows(reference, q)
+
+def test_null_single_key_on_either_side(engine):
+    engine.register("temp_stays", pd.DataFrame({"subject_id": [1, 2, 3], "hadm_id": [10, None, 30]}))
+    engine.register("temp_excluded", pd.DataFrame({"hadm_id": [10, None]}))
+    q = (
+        "SELECT s.subject_id FROM temp_stays s WHERE NOT EXISTS "
+        "(SELECT 1 FROM temp_excluded x WHERE x.hadm_id = s.hadm_id)"
+    )
+    assert "NOT IN" in engine_sql(engine, q)
+    assert engine_rows(engine, q) == plain_rows(engine, q) == [(2,), (3,)]
+
+def test_filter_reading_outer_row_is_left_correlated(engine):
+    q = (
+        "SELECT a.hadm_id FROM admissions a WHERE NOT EXISTS "
+        "(SELECT 1 FROM patients p WHERE p.subject_id = a.subject_id AND p.dod < a.admittime)"
+    )
+    assert "NOT EXISTS" in engine_sql(engine, q)
+    assert engine_rows(engine, q) == plain_rows(engine, q)
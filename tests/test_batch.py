@@ -0,0 +1,78 @@
+import os
+import pyarrow.parquet as pq
+import pytest
+from mimic_sql.batch import batch_steps, cohort_sql, main, open_engine, parse_cohort, run_cohorts, split_cohort_steps
+from mimic_sql.benchmark import read_table_file
+from mimic_sql.examples import EXAMPLE_PIPELINES
+from mimic_sql.pipeline import pipeline_tables
+from mimic_sql.sql_parse import apply_alias_map
+from mimic_sql.steps import run_step
+
+DEFAULT_COHORT = parse_cohort("psychosis,all_psychiatric_disorders,ischemic_stroke")
+HEMORRHAGIC_COHORT = parse_cohort("psychosis,all_psychiatric_disorders,hemorrhagic_stroke")
+
+@pytest.fixture
+def disease():
+    engine, alias_map = open_engine("disease")
+    yield engine, alias_map
+    engine.close()
+
+# Rows of a DataFrame as text, in a stable order, so files and engine tables compare whatever their dtypes
+def text_rows(df):
+    return sorted(map(repr, df.astype(str).values.tolist()))
+
+# --- Batch Runs ---
+
+# The command line runs the disease steps and writes each named table as the engine built it
+def test_batch_run_writes_tables_of_the_pipeline_run(disease_run, tmp_path, capsys):
+    assert main(["disease", "--output-dir", str(tmp_path), "--output", "temp_seven", "--output", "temp_twenty_three", "--format", "arrow"]) == 0
+    assert sorted(os.listdir(tmp_path)) == ["temp_seven.arrow", "temp_twenty_three.arrow"]
+    for name in ("temp_seven", "temp_twenty_three"):
+        written = read_table_file(str(tmp_path / f"{name}.arrow"))
+        assert list(written.columns) == list(disease_run.read_table(name).columns)
+        assert text_rows(written) == text_rows(disease_run.read_table(name))
+    assert f"✅ temp_twenty_three: {disease_run.row_count('temp_twenty_three'):,} rows" in capsys.readouterr().out
+
+# A script may name tables by their file names; a failing statement exits with its error and writes nothing
+def test_batch_script_uses_file_names_and_reports_failures(tmp_path, capsys):
+    script = tmp_path / "cohort.sql"
+    script.write_text("CREATE TABLE temp_one AS SELECT subject_id, COUNT(*) AS n FROM mimiciv_hosp.admissions GROUP BY subject_id;")
+    out_dir = tmp_path / "out"
+    assert main(["disease", "--script", str(script), "--output", "temp_one", "--output-dir", str(out_dir)]) == 0
+    written = pq.read_table(out_dir / "temp_one.parquet").to_pandas()
+    assert written["n"].sum() == len(read_table_file("MIMIC_IV_data/diseases_data/mimiciv_hosp.admissions.pkl"))
+    script.write_text("CREATE TABLE temp_two AS SELECT no_such_column FROM mimiciv_hosp.admissions;")
+    assert main(["disease", "--script", str(script), "--output", "temp_two", "--output-dir", str(out_dir)]) == 1
+    assert "❌ OperationalError: no such column: no_such_column" in capsys.readouterr().err
+    assert sorted(os.listdir(out_dir)) == ["temp_one.parquet"]
+
+# --- Cohort Runs ---
+
+# The base joins and per-admission summaries (Steps 1-5, 15 and 21) read no code set and run once
+def test_disease_steps_split_into_shared_and_per_cohort(disease):
+    engine, alias_map = disease
+    steps = [(label, apply_alias_map(sql_query, alias_map)) for label, sql_query in batch_steps("disease")]
+    code_sets = {name.lower() for name in EXAMPLE_PIPELINES["disease"]["code_sets"].values()}
+    shared, per_cohort = split_cohort_steps(steps, code_sets, pipeline_tables(dict(enumerate(sql for _, sql in steps)), engine))
+    assert [label for label, _ in shared] == ["Step 1", "Step 2", "Step 3", "Step 4", "Step 5", "Step 15", "Step 21"]
+    assert len(per_cohort) == 16
+
+# A cohort run after another cohort, on the shared steps' tables, gives what a fresh full run gives
+def test_cohort_from_batch_matches_fresh_run(disease, tmp_path):
+    engine, alias_map = disease
+    output = EXAMPLE_PIPELINES["disease"]["output"]
+    written = run_cohorts(
+        "disease", engine, batch_steps("disease"), alias_map, [DEFAULT_COHORT, HEMORRHAGIC_COHORT], [output],
+        str(tmp_path), log=lambda message: None
+    )
+    path, num_rows = written["psychosis__hemorrhagic_stroke"][output]
+    assert num_rows == 929
+    fresh, _ = open_engine("disease")
+    try:
+        for _, sql_query in batch_steps("disease"):
+            run_step(cohort_sql(apply_alias_map(sql_query, alias_map), EXAMPLE_PIPELINES["disease"]["code_sets"], HEMORRHAGIC_COHORT), fresh)
+        expected = fresh.read_table(output)
+    finally:
+        fresh.close()
+    batch_rows = pq.read_table(path).to_pandas()
+    assert sorted(map(repr, batch_rows.astype(str).values.tolist())) == sorted(map(repr, expected.astype(str).values.tolist()))
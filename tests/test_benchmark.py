@@ -0,0 +1,19 @@
+import time
+from mimic_sql import benchmark
+from mimic_sql.examples import EXAMPLE_PIPELINES
+
+# With --repeat, a step's time, engine time and rows all come from its fastest run
+def test_repeated_steps_report_their_fastest_run(monkeypatch):
+    runs = []
+
+    def run_step(sql_query, engine):
+        runs.append(sql_query)
+        run = (len(runs) - 1) // len(EXAMPLE_PIPELINES["drug"]["steps"])
+        # The first run is the slow one
+        time.sleep(0.02 if run == 0 else 0)
+        return [], None, [{"engine_seconds": float(run + 1)}]
+
+    monkeypatch.setattr(benchmark, "run_step", run_step)
+    rows = benchmark.benchmark_pipeline("drug", repeat=2)
+    assert len(runs) == 2 * len(rows)
+    assert all(row["engine_seconds"] == 2.0 and row["seconds"] < 0.02 for row in rows)
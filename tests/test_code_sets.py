@@ -0,0 +1,102 @@
+import pandas as pd
+from conftest import engine_rows, engine_sql, example_steps, plain_rows, run_reference_sql
+from mimic_sql.engine import SQLEngine
+from mimic_sql.sql_parse import split_statements
+from mimic_sql.steps import run_step
+
+# --- Code-Set Membership ---
+
+CODE_SET_QUERY = """SELECT d.subject_id, d.icd_code FROM diagnoses_icd d
+WHERE d.icd_code IN (SELECT icd_code FROM psychosis_icd_codes WHERE icd_version = d.icd_version)
+OR d.icd_code IN (SELECT icd_code FROM ischemic_stroke_icd_codes WHERE icd_version = d.icd_version)"""
+
+# Codes count only under the ICD version they are listed for: subject 2's F20 is ICD-9
+def test_code_set_membership_matches_code_and_version(engine):
+    assert "icd_category_mask" in engine_sql(engine, CODE_SET_QUERY)
+    assert engine_rows(engine, CODE_SET_QUERY) == plain_rows(engine, CODE_SET_QUERY)
+    assert engine_rows(engine, CODE_SET_QUERY) == [(1, "F20"), (1, "I63"), (4, "I61"), (6, "F25")]
+
+# A code listed in several sets carries all of their bits in one mask
+def test_code_in_two_code_sets_passes_both_tests(engine, store):
+    store.register("schizophrenia_icd_codes", pd.DataFrame({"icd_code": ["F20", "F25"], "icd_version": [10, 9]}))
+    store.build_code_set_index()
+    q = (
+        "SELECT d.subject_id FROM diagnoses_icd d "
+        "WHERE d.icd_code IN (SELECT icd_code FROM psychosis_icd_codes WHERE icd_version = d.icd_version) "
+        "AND d.icd_code IN (SELECT icd_code FROM schizophrenia_icd_codes WHERE icd_version = d.icd_version)"
+    )
+    assert engine_sql(engine, q).count("icd_category_mask &") == 2
+    assert engine_rows(engine, q) == plain_rows(engine, q) == [(1,)]
+
+# The bits describe the base code sets, so a session table of the same name is read instead
+def test_session_code_set_is_read_instead_of_index(engine):
+    engine.execute("CREATE TABLE psychosis_icd_codes AS SELECT 'E11' AS icd_code, 10 AS icd_version")
+    assert "FROM psychosis_icd_codes WHERE" in engine_sql(engine, CODE_SET_QUERY)
+    assert engine_rows(engine, CODE_SET_QUERY) == plain_rows(engine, CODE_SET_QUERY)
+    assert engine_rows(engine, CODE_SET_QUERY) == [(1, "I63"), (3, "E11"), (4, "I61")]
+
+# Under NOT a NULL code's test stays NULL and drops the row, unless its version has no codes in the set
+def test_negated_code_set_membership_with_null_code(engine):
+    engine.register("temp_codes", pd.DataFrame({
+        "subject_id": [1, 2, 3, 4],
+        "icd_code": ["F20", None, "E11", None],
+        "icd_version": [10, 10, 10, 8],
+    }))
+    q = (
+        "SELECT d.subject_id FROM temp_codes d WHERE NOT d.icd_code IN "
+        "(SELECT icd_code FROM psychosis_icd_codes WHERE icd_version = d.icd_version)"
+    )
+    assert "icd_category_mask" in engine_sql(engine, q)
+    assert engine_rows(engine, q) == plain_rows(engine, q) == [(3,), (4,)]
+
+# A code set holding a NULL code makes IN give NULL for non-members, so it is left out of the index
+def test_code_set_with_null_code_is_not_indexed(store):
+    store.register("renal_icd_codes", pd.DataFrame({"icd_code": ["N18", None], "icd_version": [10, 10]}))
+    store.build_code_set_index()
+    assert "renal_icd_codes" not in store.code_set_bits and "psychosis_icd_codes" in store.code_set_bits
+
+# SELECT * and NATURAL JOIN would see a mask column added to the table, so each test looks its mask up
+def test_select_star_and_natural_join_look_masks_up_per_test(engine):
+    q = (
+        "SELECT * FROM diagnoses_icd d "
+        "WHERE d.icd_code IN (SELECT icd_code FROM psychosis_icd_codes WHERE icd_version = d.icd_version)"
+    )
+    assert "category_mask" in engine_sql(engine, q) and "icd_category_mask" not in engine_sql(engine, q)
+    assert engine.query(q).columns.tolist() == ["subject_id", "hadm_id", "icd_code", "icd_version"]
+    assert engine_rows(engine, q) == plain_rows(engine, q) == [(1, 10, "F20", 10), (6, 60, "F25", 10)]
+    q = (
+        "SELECT subject_id, admittime FROM diagnoses_icd AS d NATURAL JOIN admissions "
+        "WHERE NOT d.icd_code IN (SELECT icd_code FROM ischemic_stroke_icd_codes WHERE icd_version = d.icd_version)"
+    )
+    assert "category_mask" in engine_sql(engine, q)
+    assert engine_rows(engine, q) == plain_rows(engine, q)
+    assert len(engine_rows(engine, q)) == 5
+
+# --- Example Pipeline ---
+
+# Step 22 tests every diagnosis against five code sets; on the bundled data its rows are the ones the
+# subqueries give as written. The plain statement takes minutes on the whole cohort, so both run on its
+# first 60 subjects.
+def test_step_22_rows_unchanged(disease_run):
+    (_, step_22), = [(label, sql) for label, sql in example_steps("disease") if label == "Step 22"]
+    reference = SQLEngine()
+    session = SQLEngine(base=disease_run.base)
+    with disease_run.lock:
+        subjects = "SELECT subject_id FROM temp_twenty ORDER BY subject_id LIMIT 60"
+        tables = {
+            name: pd.read_sql_query(f"SELECT * FROM {name} WHERE subject_id IN ({subjects})", disease_run.conn)
+            for name in ("temp_twenty", "temp_twenty_one")
+        }
+        for name in disease_run.base.code_set_bits:
+            tables[name] = pd.read_sql_query(f"SELECT icd_code, icd_version FROM base.{name}", disease_run.conn)
+    for name, df in tables.items():
+        reference.register(name, df)
+        if name.startswith("temp_"):
+            session.register(name, df)
+    create = next(q for q in split_statements(step_22) if q.upper().startswith("CREATE"))
+    assert engine_sql(session, create).count("icd_category_mask &") == 10
+    run_step(step_22, session)
+    run_reference_sql(reference, step_22)
+    rows = plain_rows(session, "SELECT * FROM temp_twenty_two")
+    assert rows == plain_rows(reference, "SELECT * FROM temp_twenty_two")
+    assert len(rows) == 60 and any("TRUE" in row for row in rows)
@@ -0,0 +1,86 @@
+import re
+import pandas as pd
+from conftest import ADMISSIONS, DIAGNOSES, plain_rows
+from mimic_sql.data_store import BaseTableStore, discover_tables, remove_whitespace
+from mimic_sql.engine import SQLEngine
+from mimic_sql.examples import DISEASE_DATA_DIR
+from mimic_sql.ingest import ingest_directory
+from mimic_sql.steps import run_step
+
+# --- Table Preparation ---
+
+# The cleanup the disease page used to run: one Python regex call per cell of each object column
+def remove_whitespace_per_cell(df):
+    for col in df.select_dtypes(include='object').columns:
+        df[col] = df[col].apply(lambda x: re.sub(r'\s+', '', x) if isinstance(x, str) else x)
+    return df
+
+# Every character Python's \s matches is removed, missing values and non-string values are kept
+def test_whitespace_cleanup_matches_per_cell_regex():
+    df = pd.DataFrame({
+        "text": [" F20 ", "a\tb\nc", "\u00a0I63\u2028", "x\x1cy\x85z\u3000", None, ""],
+        "mixed": ["1 0", 10, None, " a", 2.5, "b\u200a"],
+        "number": [1, 2, 3, 4, 5, 6],
+    })
+    assert remove_whitespace(df.copy()).equals(remove_whitespace_per_cell(df.copy()))
+
+def test_bundled_disease_tables_clean_as_before():
+    for path in discover_tables(DISEASE_DATA_DIR).values():
+        df = pd.read_pickle(path)
+        assert remove_whitespace(df.copy()).equals(remove_whitespace_per_cell(df.copy())), path
+
+# --- Shared Base Tables ---
+
+# SQL table names are case-insensitive: a base table is found however a statement spells it
+def test_base_table_names_resolve_in_any_case(engine, store):
+    assert store.table_name("PATIENTS") == "patients" and store.table_name("no_such_table") is None
+    assert store.has_table("Diagnoses_ICD") and store.row_count("Diagnoses_ICD") == 7
+    assert engine.is_base_table("ADMISSIONS") and engine.row_count("ADMISSIONS") == 6
+    assert engine.known_columns("Patients") == ["subject_id", "gender", "anchor_age", "dod"]
+    messages, _, _ = run_step("DROP TABLE IF EXISTS PATIENTS", engine)
+    assert messages[0] == "Warning: `PATIENTS` is a shared read-only base table and cannot be dropped."
+
+# Sessions attach one store: each reads the same base rows and keeps its own step tables
+def test_sessions_share_base_tables_but_not_step_tables(engine, store):
+    other = SQLEngine(base=store)
+    run_step("CREATE TEMP TABLE temp_one AS SELECT subject_id FROM Patients WHERE gender = 'F'", engine)
+    run_step("CREATE TEMP TABLE temp_one AS SELECT subject_id FROM PATIENTS WHERE gender = 'M'", other)
+    assert plain_rows(engine, "SELECT * FROM temp_one") == [(1,), (3,), (6,)]
+    assert plain_rows(other, "SELECT * FROM temp_one") == [(2,), (4,)]
+    assert engine.session_tables() == other.session_tables() == ["temp_one"]
+    other.close()
+
+# --- Column-Projected Loading ---
+
+# Base tables from ingested Arrow files (as `python -m mimic_sql.ingest` writes them) and from the pickles
+def arrow_and_pickle_stores(data_dir):
+    for name, df in {"admissions": ADMISSIONS, "diagnoses_icd": DIAGNOSES}.items():
+        df.to_pickle(data_dir / f"{name}.pkl")
+    ingest_directory(str(data_dir))
+    stores = BaseTableStore(), BaseTableStore()
+    for name in ("admissions", "diagnoses_icd"):
+        stores[0].add_table(name, str(data_dir / f"{name}.arrow"))
+        stores[1].add_table(name, str(data_dir / f"{name}.pkl"))
+    return stores
+
+# Only the columns a statement names are copied in from the Arrow file (a name counts for every table
+# having such a column); SELECT * loads the rest
+def test_arrow_tables_load_only_referenced_columns(tmp_path):
+    arrow_store, pickle_store = arrow_and_pickle_stores(tmp_path)
+    assert arrow_store.loaded_columns == {"admissions": [], "diagnoses_icd": []}
+    steps = [
+        "CREATE TEMP TABLE temp_one AS SELECT a.subject_id, a.hadm_id, d.icd_code FROM admissions a "
+        "JOIN diagnoses_icd d ON d.hadm_id = a.hadm_id WHERE d.icd_version = 10",
+        "CREATE TEMP TABLE temp_two AS SELECT * FROM admissions WHERE subject_id IN (SELECT subject_id FROM temp_one)",
+    ]
+    engines = SQLEngine(base=arrow_store), SQLEngine(base=pickle_store)
+    run_step(steps[0], engines[0])
+    assert arrow_store.loaded_columns == {"admissions": ["subject_id", "hadm_id"], "diagnoses_icd": ["subject_id", "hadm_id", "icd_code", "icd_version"]}
+    run_step(steps[1], engines[0])
+    assert arrow_store.loaded_columns["admissions"] == ["subject_id", "hadm_id", "admittime", "note"]
+    for sql_query in steps:
+        run_step(sql_query, engines[1])
+    for name in ("temp_one", "temp_two"):
+        assert plain_rows(engines[0], f"SELECT * FROM {name}") == plain_rows(engines[1], f"SELECT * FROM {name}")
+    for engine in engines:
+        engine.close()
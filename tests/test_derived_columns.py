@@ -0,0 +1,84 @@
+import pytest
+from conftest import engine_rows, engine_sql, example_steps, plain_rows, reference_engine, run_reference_sql, session_rows
+from mimic_sql.batch import open_engine
+from mimic_sql.steps import run_step
+
+HOURS = "ABS((julianday(stoptime) - julianday(starttime)) * 24)"
+
+# Drug Steps 4-6 on the fixture: a table of drug periods, then one with their length in hours
+@pytest.fixture
+def periods(engine):
+    engine.execute(
+        "CREATE TEMP TABLE temp_four AS SELECT p.subject_id, p.drug, a.admittime AS starttime, "
+        "datetime(a.admittime, '+' || (p.subject_id * 6) || ' hours') AS stoptime "
+        "FROM base.prescriptions p JOIN base.admissions a ON a.hadm_id = p.hadm_id"
+    )
+    engine.execute(f"CREATE TEMP TABLE temp_five AS SELECT subject_id, drug, starttime, stoptime, {HOURS} AS hours_diff FROM temp_four")
+    return engine
+
+def test_repeated_expression_reads_stored_column(periods):
+    q = f"SELECT subject_id, CASE WHEN {HOURS} = 0 THEN 1 ELSE {HOURS} END AS hours_diff FROM temp_five"
+    assert "julianday" not in engine_sql(periods, q)
+    assert engine_rows(periods, q) == plain_rows(periods, q)
+    assert engine_rows(periods, q) == [(1, 6.0), (2, 12.0), (2, 12.0), (3, 18.0), (4, 24.0), (6, 36.0)]
+
+def test_create_as_select_reads_stored_column(periods):
+    periods.execute(f"CREATE TEMP TABLE temp_six AS SELECT subject_id, {HOURS} + 1 AS hours_after FROM temp_five WHERE subject_id < 3")
+    assert plain_rows(periods, "SELECT * FROM temp_six") == [(1, 7.0), (2, 13.0), (2, 13.0)]
+    assert periods.last_plan["reused"] == [["temp_five", "hours_diff"]]
+
+# Replacing the expression's text inside the literal would change the value shown
+def test_expression_inside_literal_stays_text(periods):
+    q = f"SELECT subject_id, '{HOURS}' AS formula FROM temp_five WHERE subject_id = 1 -- {HOURS}"
+    assert engine_sql(periods, q) == q
+    assert engine_rows(periods, q) == [(1, HOURS)]
+
+# Once an input column changes, the stored column no longer holds the expression's value
+def test_stored_column_is_not_read_after_its_inputs_change(periods):
+    periods.execute("UPDATE temp_five SET stoptime = datetime(starttime, '+1 hours') WHERE subject_id = 1")
+    q = f"SELECT subject_id, ROUND({HOURS}, 6) FROM temp_five WHERE subject_id <= 2"
+    assert "julianday" in engine_sql(periods, q)
+    assert engine_rows(periods, q) == plain_rows(periods, q) == [(1, 1.0), (2, 12.0), (2, 12.0)]
+
+# A column of the same name that was recomputed on the way into the table is a different input
+def test_stored_column_is_not_read_when_an_input_was_recomputed(engine):
+    engine.execute(
+        "CREATE TEMP TABLE temp_four AS SELECT subject_id, admittime AS starttime, "
+        "datetime(admittime, '+6 hours') AS stoptime FROM base.admissions"
+    )
+    engine.execute(
+        f"CREATE TEMP TABLE temp_five AS SELECT subject_id, starttime, datetime(stoptime, '+1 hours') AS stoptime, "
+        f"{HOURS} AS hours_diff FROM temp_four"
+    )
+    q = f"SELECT DISTINCT subject_id, ROUND({HOURS}, 6) FROM temp_five WHERE subject_id = 1"
+    assert "julianday" in engine_sql(engine, q)
+    assert engine_rows(engine, q) == plain_rows(engine, q) == [(1, 7.0)]
+
+def test_expression_on_aliased_table(periods):
+    q = "SELECT f.subject_id, ABS((julianday(f.stoptime) - julianday(f.starttime)) * 24) FROM temp_five f WHERE f.subject_id > 3"
+    assert engine_rows(periods, q) == plain_rows(periods, q) == [(4, 24.0), (6, 36.0)]
+
+# UPDATE assigns columns of the table it changes, so its expressions are always evaluated as written
+def test_update_is_not_rewritten(periods):
+    q = f"UPDATE temp_five SET hours_diff = {HOURS} * 2 WHERE subject_id = 1"
+    assert engine_sql(periods, q) == q
+    periods.execute(q)
+    assert plain_rows(periods, "SELECT hours_diff FROM temp_five WHERE subject_id = 1") == [(12.0,)]
+
+# --- Example Pipeline ---
+
+# Drug Steps 5 and 6 reuse hours_diff and Steps 2-6 show their rows from the tables just built, with
+# the same tables as the steps run as written
+def test_drug_pipeline_rows_unchanged():
+    engine, _ = open_engine("drug")
+    reference = reference_engine("drug")
+    try:
+        messages = []
+        for _, sql_query in example_steps("drug"):
+            messages += run_step(sql_query, engine)[0]
+            run_reference_sql(reference, sql_query)
+        assert any(message.startswith("♻️ Reused `temp_five`.`hours_diff`") for message in messages)
+        assert sum(message.startswith("♻️ Rows shown from") for message in messages) == 5
+        assert session_rows(engine) == {name: plain_rows(reference, f"SELECT * FROM {name}") for name in engine.session_tables()}
+    finally:
+        engine.close()
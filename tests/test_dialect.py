@@ -0,0 +1,46 @@
+import pandas as pd
+from conftest import engine_rows, engine_sql, plain_rows
+from mimic_sql.sql_parse import sqlite_dialect
+
+# --- Boolean Comparisons ---
+
+# Flags are stored as 'TRUE'/'FALSE' text or 1/0; a NULL flag is neither equal nor unequal to TRUE
+def test_boolean_comparison_matches_text_and_integer_flags(engine):
+    engine.register("flags", pd.DataFrame({"subject_id": [1, 2, 3, 4], "flag": ["TRUE", "FALSE", None, "TRUE"]}))
+    engine.register("bits", pd.DataFrame({"subject_id": [1, 2], "flag": [1, 0]}))
+    assert engine_rows(engine, "SELECT subject_id FROM flags WHERE flag = TRUE") == [(1,), (4,)]
+    assert engine_rows(engine, "SELECT subject_id FROM flags f WHERE f.flag <> TRUE") == [(2,)]
+    assert engine_rows(engine, "SELECT subject_id FROM bits WHERE flag = FALSE") == [(2,)]
+
+# SET flag = TRUE assigns a value; only the WHERE comparison is translated
+def test_update_assigning_true_stays_an_assignment(engine):
+    engine.register("flags", pd.DataFrame({"subject_id": [1, 2], "flag": [0, 0], "other": [1, 0]}))
+    q = "UPDATE flags SET flag = TRUE, other = 5 WHERE other = TRUE"
+    assert sqlite_dialect(q) == "UPDATE flags SET flag = TRUE, other = 5 WHERE other IN (1, 'TRUE')"
+    engine.execute(q)
+    assert plain_rows(engine, "SELECT subject_id, flag, other FROM flags") == [(1, 1, 5), (2, 0, 0)]
+
+# --- Date Differences ---
+
+# SQLite would subtract the leading years of the date text; days are counted instead, NULL dates give NULL
+def test_date_difference_counts_days_between_date_columns(engine):
+    engine.execute(
+        "CREATE TABLE temp_dates AS SELECT p.subject_id, p.dod AS event_date, a.admittime AS index_date "
+        "FROM patients p JOIN admissions a ON a.subject_id = p.subject_id"
+    )
+    q = "SELECT subject_id, event_date - index_date FROM temp_dates"
+    assert "julianday(event_date)" in engine_sql(engine, q)
+    assert engine_rows(engine, q) == [(1, 27), (1, 58), (2, None), (3, 21), (4, None), (6, 29)]
+
+def test_difference_of_counts_named_like_dates_stays_arithmetic(engine):
+    engine.register("counts", pd.DataFrame({"n_dates": [5, 7], "update_dates": [2, 3]}))
+    q = "SELECT n_dates - update_dates FROM counts"
+    assert engine_sql(engine, q) == q
+    assert engine_rows(engine, q) == [(3,), (4,)]
+
+# --- Literals ---
+
+def test_comparisons_and_differences_inside_literals_and_comments_stay_text(engine):
+    q = "SELECT hadm_id FROM admissions WHERE note = 'flag = TRUE' OR note = 'dischdate - admitdate' -- flag = TRUE"
+    assert sqlite_dialect(q, {"dischdate", "admitdate"}) == q
+    assert engine_rows(engine, q) == [(10,), (11,)]
@@ -0,0 +1,35 @@
+import pandas as pd
+from conftest import plain_rows
+
+# --- In-Place Statements ---
+
+# Step 7's second DELETE drops every control with an all_psychiatric_disorders code, as the step
+# describes. The original pages could not run a DELETE with a nested subquery: they showed a warning
+# and kept those controls. The engine runs it as written, so the controls are fewer from Step 7 on.
+def test_step_seven_drops_controls_with_psychiatric_codes(disease_run, disease_reference):
+    with_psychiatric_code = """SELECT s.subject_id FROM temp_seven s
+JOIN temp_five f ON f.subject_id = s.subject_id
+JOIN all_psychiatric_disorders_icd_codes c ON c.icd_code = f.icd_code AND c.icd_version = f.icd_version"""
+    assert plain_rows(disease_run, with_psychiatric_code) == []
+    kept_by_original_pages = "SELECT COUNT(DISTINCT subject_id) FROM temp_five WHERE subject_id NOT IN (SELECT subject_id FROM temp_six)"
+    assert plain_rows(disease_run, kept_by_original_pages) == [(1925 - 341,)]
+    assert plain_rows(disease_run, "SELECT COUNT(*) FROM temp_seven") == [(996,)]
+    assert plain_rows(disease_run, "SELECT * FROM temp_seven") == plain_rows(disease_reference, "SELECT * FROM temp_seven")
+
+# --- Event Date Backfill ---
+
+# Steps 14 and 16 fill a missing event_date with the patient's death date, then with Dec 31 of their
+# last admission year: the first row per subject_id, as the pages' per-row handlers looked it up
+def test_event_date_backfill_takes_first_death_date_then_last_admit_year(disease_run, disease_reference):
+    thirteen = disease_run.read_table("temp_thirteen")
+    death = disease_run.query("SELECT subject_id, dod FROM mimiciv_hosp_patients WHERE dod IS NOT NULL")
+    death_date = pd.Series(pd.to_datetime(death["dod"]).dt.strftime("%Y-%m-%d").to_numpy(), index=death["subject_id"])
+    fifteen = disease_run.read_table("temp_fifteen")
+    year_end = pd.Series((fifteen["admit_year"].astype(str) + "-12-31").to_numpy(), index=fifteen["subject_id"])
+    fourteen = thirteen["event_date"].fillna(thirteen["subject_id"].map(death_date[~death_date.index.duplicated()]))
+    sixteen = fourteen.fillna(thirteen["subject_id"].map(year_end[~year_end.index.duplicated()]))
+    assert fourteen.isna().sum() > sixteen.isna().sum() and thirteen["event_date"].isna().sum() > fourteen.isna().sum()
+    assert disease_run.read_table("temp_fourteen")["event_date"].tolist() == fourteen.tolist()
+    assert disease_run.read_table("temp_sixteen")["event_date"].tolist() == sixteen.tolist()
+    for name in ("temp_fourteen", "temp_sixteen"):
+        assert plain_rows(disease_run, f"SELECT * FROM {name}") == plain_rows(disease_reference, f"SELECT * FROM {name}")
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import plain_rows
+from mimic_sql.engine import SQLEngine
+from mimic_sql.steps import run_step
+
+# Subjects and their visits, big enough to be indexed; some subjects have no visits
+PEOPLE = pd.DataFrame({"subject_id": np.arange(2_000)})
+VISITS = pd.DataFrame({
+    "subject_id": np.random.default_rng(0).integers(0, 2_500, 6_000),
+    "year": np.random.default_rng(1).integers(2100, 2200, 6_000),
+})
+
+# Per-subject visit counts and last years, looked up once per subject
+COUNTS = """SELECT p.subject_id,
+(SELECT COUNT(*) FROM temp_visits v WHERE v.subject_id = p.subject_id) AS n,
+(SELECT MAX(v.year) FROM temp_visits v WHERE v.subject_id = p.subject_id) AS last_year
+FROM temp_people p"""
+
+@pytest.fixture
+def visits(engine):
+    engine.register("temp_people", PEOPLE)
+    engine.register("temp_visits", VISITS)
+    return engine
+
+# --- Automatic Indexes ---
+
+# A table scanned once per outer row gets an index on the lookup key; the rows are those of the plain statement
+def test_correlated_lookup_is_indexed_without_changing_rows(visits):
+    expected = plain_rows(visits, COUNTS)
+    messages, _, _ = run_step(f"CREATE TABLE temp_counts AS {COUNTS}", visits)
+    assert "📇 Index created on `temp_visits` (subject_id) for lookups by key." in messages
+    assert plain_rows(visits, "SELECT * FROM temp_counts") == expected
+    assert any("USING INDEX auto_temp_visits_subject_id" in line for line in visits.query_plan(COUNTS))
+    messages, _, _ = run_step(f"CREATE TABLE temp_counts AS {COUNTS}", visits)
+    assert not [message for message in messages if message.startswith("📇")]
+
+def test_small_tables_are_not_indexed(engine):
+    engine.register("temp_people", PEOPLE.head(50))
+    engine.register("temp_visits", VISITS.head(500))
+    messages, _, _ = run_step(f"CREATE TABLE temp_counts AS {COUNTS}", engine)
+    assert not [message for message in messages if message.startswith("📇")]
+
+# Base table indexes are built once in the shared store and used by every session
+def test_base_table_index_is_shared_by_sessions(store):
+    store.register("visits", VISITS)
+    store.register("people", PEOPLE)
+    lookup = COUNTS.replace("temp_visits", "visits").replace("temp_people", "people")
+    first, other = SQLEngine(base=store), SQLEngine(base=store)
+    expected = plain_rows(first, lookup)
+    messages, _, _ = run_step(f"CREATE TABLE temp_counts AS {lookup}", first)
+    assert "📇 Index created on `visits` (subject_id) for lookups by key." in messages
+    assert ("visits", ("subject_id",)) in store.key_indexes
+    messages, _, _ = run_step(f"CREATE TABLE temp_counts AS {lookup}", other)
+    assert not [message for message in messages if message.startswith("📇")]
+    assert plain_rows(first, "SELECT * FROM temp_counts") == plain_rows(other, "SELECT * FROM temp_counts") == expected
+    first.close()
+    other.close()
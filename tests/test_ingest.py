@@ -0,0 +1,40 @@
+import os
+import shutil
+import pyarrow as pa
+import pytest
+from conftest import example_steps, session_rows
+from mimic_sql.batch import open_engine
+from mimic_sql.data_store import open_arrow_table
+from mimic_sql.examples import DISEASE_DATA_DIR
+from mimic_sql.ingest import ingest_directory
+from mimic_sql.steps import run_step
+
+# The bundled disease tables ingested as the README describes (cleaned, typed, compact dtypes)
+@pytest.fixture(scope="module")
+def disease_arrow_dir(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp("diseases_data")
+    for path in os.listdir(DISEASE_DATA_DIR):
+        shutil.copy(f"{DISEASE_DATA_DIR}/{path}", data_dir)
+    written = ingest_directory(str(data_dir), prepare=True)
+    return str(data_dir), written
+
+# --- Compact Schema ---
+
+# Codes are dictionary-encoded and keys narrowed in the files; DataFrames shrink, not SQLite's tables
+def test_ingest_writes_compact_dtypes(disease_arrow_dir):
+    data_dir, written = disease_arrow_dir
+    schema = open_arrow_table(f"{data_dir}/mimiciv_hosp.diagnoses_icd.arrow").schema
+    assert schema.field("subject_id").type == pa.int32() and schema.field("icd_version").type == pa.int8()
+    assert pa.types.is_dictionary(schema.field("icd_code").type)
+    assert sum(entry[4] for entry in written) < sum(entry[3] for entry in written) / 2
+
+# The disease pipeline over the compact Arrow files builds the same tables as over the pickles
+def test_pipeline_rows_unchanged_by_compact_schema(disease_arrow_dir, disease_run):
+    engine, _ = open_engine("disease", disease_arrow_dir[0])
+    try:
+        assert engine.base.arrow_sources
+        for _, sql_query in example_steps("disease"):
+            run_step(sql_query, engine)
+        assert session_rows(engine) == session_rows(disease_run)
+    finally:
+        engine.close()
@@ -0,0 +1,66 @@
+import threading
+import time
+from conftest import plain_rows
+from mimic_sql.jobs import PipelineJob, submit_job
+from mimic_sql.steps import run_step
+
+STEPS = {
+    1: "CREATE TABLE temp_one AS SELECT subject_id, hadm_id FROM admissions",
+    2: "DELETE FROM temp_one WHERE subject_id = 1",
+    3: "SELECT COUNT(*) AS n FROM temp_one",
+}
+
+# A statement that runs until it is interrupted
+ENDLESS = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT MAX(i) FROM n"
+
+# --- Background Runs ---
+
+# Submitting returns at once; the page collects each step's output as it finishes, in step order
+def test_job_runs_steps_in_the_background(engine):
+    release = threading.Event()
+    def run_job_step(i, step_engine):
+        if i == 1:
+            release.wait(10)
+        return run_step(STEPS[i], step_engine)
+    job = submit_job(PipelineJob(list(STEPS), run_job_step, engine, {1: "Step 1"}))
+    assert job.is_active() and job.collect() == [] and job.progress() == 0
+    release.set()
+    job.future.result(10)
+    assert job.status == "finished" and job.progress() == 1.0
+    outputs = job.collect()
+    assert [i for i, _ in outputs] == [1, 2, 3]
+    assert outputs[2][1][1].page(0, 10)["n"].tolist() == [4]
+    assert job.collect() == []
+    assert job.describe().startswith("✅ Finished 3 of 3 steps")
+
+# Cancelling interrupts the running statement and skips the steps after it, leaving earlier tables in place
+def test_cancel_interrupts_the_running_step(engine):
+    started = threading.Event()
+    def run_job_step(i, step_engine):
+        if i == 2:
+            started.set()
+            with step_engine.lock:
+                step_engine.conn.execute(ENDLESS).fetchall()
+        return run_step(STEPS[i], step_engine)
+    job = submit_job(PipelineJob(list(STEPS), run_job_step, engine))
+    assert started.wait(10)
+    # An interrupt only stops a statement already under way, so cancel until the run ends
+    while job.is_active():
+        job.cancel()
+        time.sleep(0.05)
+    job.future.result(10)
+    assert job.status == "cancelled" and job.error is None
+    assert job.done == [1]
+    assert plain_rows(engine, "SELECT COUNT(*) FROM temp_one") == [(6,)]
+
+# A failing step ends the run with its label and error; later steps do not run
+def test_failed_step_stops_the_run(engine):
+    step_sql = {**STEPS, 2: "CREATE TABLE temp_two AS SELECT no_such_column FROM temp_one"}
+    def run_job_step(i, step_engine):
+        with step_engine.lock:
+            return step_engine.conn.execute(step_sql[i]).fetchall()
+    job = submit_job(PipelineJob(list(step_sql), run_job_step, engine, {2: "Step 2"}))
+    job.future.result(10)
+    assert job.status == "failed" and job.done == [1]
+    assert job.error == "Step 2 failed: no such column: no_such_column"
+    assert job.describe() == "❌ Step 2 failed: no such column: no_such_column (1 of 3 steps completed)."
@@ -0,0 +1,43 @@
+import pandas as pd
+from conftest import engine_rows, engine_sql, plain_rows
+
+DIAGNOSED_ADMISSIONS = "SELECT subject_id, hadm_id, icd_code FROM diagnoses_icd NATURAL JOIN admissions WHERE icd_code LIKE 'F%'"
+
+def test_natural_join_reads_stored_join(engine):
+    assert 'base."natural_diagnoses_icd__admissions"' in engine_sql(engine, DIAGNOSED_ADMISSIONS)
+    assert engine_rows(engine, DIAGNOSED_ADMISSIONS) == plain_rows(engine, DIAGNOSED_ADMISSIONS)
+    assert engine_rows(engine, DIAGNOSED_ADMISSIONS) == [(1, 10, "F20"), (2, 20, "F20"), (6, 60, "F25")]
+
+# The stored join holds only some columns, but keeps one row per joined pair even where those repeat
+def test_stored_join_keeps_duplicate_rows(engine):
+    q = "SELECT subject_id FROM diagnoses_icd NATURAL JOIN admissions WHERE hadm_id = 60"
+    assert "natural_" in engine_sql(engine, q)
+    assert engine_rows(engine, q) == plain_rows(engine, q) == [(6,), (6,)]
+
+# A NULL key joins no row, so the stored join must not pair NULL with NULL
+def test_null_join_keys_join_nothing(engine, store):
+    store.register("edstays", pd.DataFrame({"subject_id": [1, 2, 3, 5], "hadm_id": [10, None, 30, None], "stay_id": [100, 200, 300, 500]}))
+    store.register("triage", pd.DataFrame({"subject_id": [2, 5], "hadm_id": [None, None], "acuity": [3, 1]}))
+    q = "SELECT subject_id, stay_id FROM edstays NATURAL JOIN admissions"
+    assert "natural_" in engine_sql(engine, q)
+    assert engine_rows(engine, q) == plain_rows(engine, q) == [(1, 100), (3, 300)]
+    q = "SELECT stay_id, acuity FROM edstays NATURAL JOIN triage"
+    assert engine_rows(engine, q) == plain_rows(engine, q) == []
+
+# The stored join is built from the base tables, so it is not read when a session table replaces one
+def test_stored_join_is_not_read_for_session_table(engine):
+    engine.execute("CREATE TABLE admissions AS SELECT subject_id, hadm_id, 'session' AS note FROM base.admissions WHERE hadm_id <= 20")
+    assert "natural_" not in engine_sql(engine, DIAGNOSED_ADMISSIONS)
+    assert engine_rows(engine, DIAGNOSED_ADMISSIONS) == plain_rows(engine, DIAGNOSED_ADMISSIONS)
+    assert engine_rows(engine, DIAGNOSED_ADMISSIONS) == [(1, 10, "F20"), (2, 20, "F20")]
+
+# The stored join keeps the first statement's columns; a statement needing others joins as written
+def test_statement_needing_other_columns_joins_as_written(engine, store):
+    assert "natural_" in engine_sql(engine, DIAGNOSED_ADMISSIONS)
+    name = store.natural_tables[("diagnoses_icd", "admissions")]
+    wide = "SELECT hadm_id, note FROM diagnoses_icd NATURAL JOIN admissions WHERE icd_code = 'E11'"
+    assert "natural_" not in engine_sql(engine, wide)
+    assert engine_rows(engine, wide) == plain_rows(engine, wide) == [(30, "NATURAL JOIN")]
+    assert store.natural_tables[("diagnoses_icd", "admissions")] == name
+    assert "note" not in store.available_columns[name]
+    assert engine_rows(engine, DIAGNOSED_ADMISSIONS) == plain_rows(engine, DIAGNOSED_ADMISSIONS)
@@ -0,0 +1,108 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from conftest import plain_rows
+from mimic_sql import jobs
+from mimic_sql.engine import SQLEngine
+from mimic_sql.examples import EXAMPLE_PIPELINES
+from mimic_sql.jobs import PipelineJob
+from mimic_sql.pipeline import PipelineState, pipeline_tables, step_schedule, step_tables
+from mimic_sql.steps import run_step
+
+# Two independent extractions joined by a third step, which a fifth step trims in place;
+# the fourth step reads nothing the others touch
+STEPS = {
+    1: "CREATE TABLE temp_one AS SELECT subject_id, hadm_id FROM admissions",
+    2: "CREATE TABLE temp_two AS SELECT subject_id, icd_code FROM diagnoses_icd",
+    3: "CREATE TABLE temp_three AS SELECT o.subject_id, t.icd_code FROM temp_one o JOIN temp_two t ON t.subject_id = o.subject_id",
+    4: "CREATE TABLE temp_four AS SELECT subject_id, drug FROM prescriptions",
+    5: "DELETE FROM temp_three WHERE icd_code = 'Z00'",
+}
+
+# Run the steps the plan picks, recording each run as the pages do
+def run_planned(state, step_sql, engine):
+    planned = state.plan(step_sql, engine)
+    for i in planned:
+        run_step(step_sql[i], engine)
+        state.record_run(i, step_sql[i])
+    return planned
+
+@pytest.fixture
+def state(engine):
+    state = PipelineState()
+    assert run_planned(state, STEPS, engine) == [1, 2, 3, 4, 5]
+    return state
+
+# --- Incremental Re-execution ---
+
+def test_steps_are_up_to_date_after_a_run(state, engine):
+    assert state.plan(STEPS, engine) == []
+
+def test_edited_step_reruns_with_steps_reading_its_tables(state, engine):
+    edited = {**STEPS, 1: STEPS[1] + " WHERE subject_id <> 2"}
+    assert run_planned(state, edited, engine) == [1, 3, 5]
+    assert state.plan(edited, engine) == []
+    assert plain_rows(engine, "SELECT subject_id FROM temp_three") == [(1,), (1,), (1,), (1,), (3,), (4,), (6,)]
+
+# Re-running a DELETE on temp_three needs temp_three rebuilt first, or it would trim an already trimmed table
+def test_edited_in_place_change_rebuilds_the_table_it_changes(state, engine):
+    assert state.plan({**STEPS, 5: "DELETE FROM temp_three WHERE icd_code = 'E11'"}, engine) == [3, 5]
+
+def test_missing_output_reruns_its_step(state, engine):
+    engine.execute("DROP TABLE temp_four")
+    assert state.plan(STEPS, engine) == [4]
+
+# On the disease pipeline, editing Step 9 (which changes Step 8's temp_eight) re-runs Step 8 and
+# everything downstream of Step 9, but none of the ED or comorbidity extraction steps beside them
+def test_disease_plan_after_editing_a_step():
+    spec = EXAMPLE_PIPELINES["disease"]
+    step_sql = {i: spec["queries"][i] for i in spec["steps"]}
+    session = SQLEngine()
+    state = PipelineState()
+    for i, sql in step_sql.items():
+        for table in step_tables(sql)["outputs"]:
+            session.execute(f"CREATE TABLE IF NOT EXISTS {table} (x)")
+        state.record_run(i, sql)
+    names = {i: spec["names"][i] for i in step_sql}
+    edited = {**step_sql, 21: step_sql[21] + "\n"}
+    assert [names[i] for i in state.plan(edited, session)] == [
+        "Step 8", "Step 9", "Step 11", "Step 12", "Step 13", "Step 14", "Step 16",
+        "Step 17", "Step 18", "Step 19", "Step 20", "Step 22", "Step 23",
+    ]
+
+# --- Concurrent Scheduling ---
+
+def test_schedule_waits_only_for_steps_sharing_tables(engine):
+    schedule = step_schedule(STEPS, pipeline_tables(STEPS, engine))
+    assert {i: schedule[i]["after"] for i in STEPS} == {1: set(), 2: set(), 3: {1, 2}, 4: set(), 5: {3}}
+    assert schedule[3]["inputs"] == {"temp_one", "temp_two"}
+    assert schedule[5]["writes"] == {"temp_three"}
+
+# With several workers, independent steps overlap but a step never runs while one it waits for is running
+def test_dependent_steps_never_run_side_by_side(engine, monkeypatch):
+    monkeypatch.setattr(jobs, "step_worker_count", lambda: 4)
+    monkeypatch.setattr(jobs, "step_pool", ThreadPoolExecutor(max_workers=4))
+    schedule = step_schedule(STEPS, pipeline_tables(STEPS, engine))
+    spans, running, most_running = {}, set(), [0]
+    lock = threading.Lock()
+
+    def timed_step(i, step_engine):
+        with lock:
+            running.add(i)
+            most_running[0] = max(most_running[0], len(running))
+        start = time.perf_counter()
+        time.sleep(0.05)
+        run_step(STEPS[i], step_engine)
+        with lock:
+            running.discard(i)
+        spans[i] = (start, time.perf_counter())
+
+    job = PipelineJob(list(STEPS), timed_step, engine, schedule=schedule)
+    job.run()
+    assert job.status == "finished" and job.error is None
+    for j in STEPS:
+        for i in schedule[j]["after"]:
+            assert spans[i][1] <= spans[j][0]
+    assert most_running[0] > 1
+    assert plain_rows(engine, "SELECT subject_id FROM temp_three") == [(1,), (1,), (1,), (1,), (2,), (3,), (4,), (6,)]
@@ -0,0 +1,95 @@
+import sqlite3
+import threading
+import pandas as pd
+import pytest
+from conftest import engine_rows, engine_sql, plain_rows
+from mimic_sql.sql_parse import prefix_filter, sqlite_dialect
+
+# --- Prefix Searches ---
+
+# LIKE folds ASCII case only, and a % stored in a value is plain text
+def test_prefix_search_matches_like_case_folding(engine):
+    q = "SELECT subject_id, drug FROM prescriptions WHERE LOWER(drug) LIKE LOWER('OLAN%') OR drug LIKE 'halo%'"
+    assert "_prefix_matches" in engine_sql(engine, q)
+    assert engine_rows(engine, q) == plain_rows(engine, q)
+    assert engine_rows(engine, q) == [(1, "Olanzapine"), (2, "Haloperidol"), (2, "olanzapine 5mg"), (4, "Olanzapine%")]
+
+def test_prefix_search_does_not_fold_non_ascii_letters(engine, store):
+    store.register("emar", pd.DataFrame({"subject_id": [1, 2, 3, 4], "drug": ["Élavil", "élan", "ELAN", None]}))
+    store.build_prefix_index("emar", "drug")
+    for q in ("SELECT subject_id FROM emar WHERE drug LIKE 'él%'", "SELECT subject_id FROM emar WHERE drug LIKE 'El%'"):
+        assert "_prefix_matches" in engine_sql(engine, q)
+        assert engine_rows(engine, q) == plain_rows(engine, q)
+    assert engine_rows(engine, "SELECT subject_id FROM emar WHERE drug LIKE 'él%'") == [(2,)]
+
+# An OR inside the pattern is part of the text searched for, not a second prefix
+def test_or_inside_pattern_is_not_split(engine):
+    q = "SELECT subject_id FROM prescriptions WHERE drug LIKE 'olanzapine OR drug LIKE halo%'"
+    assert engine_rows(engine, q) == plain_rows(engine, q) == []
+
+# The index holds base rowids, so a session table of the same name is scanned instead
+def test_prefix_index_is_not_used_for_session_table(engine):
+    engine.execute("CREATE TABLE prescriptions AS SELECT 9 AS subject_id, 'Olanzapine' AS drug")
+    q = "SELECT subject_id FROM prescriptions WHERE drug LIKE 'olan%'"
+    assert "_prefix_matches" not in engine_sql(engine, q)
+    assert engine_rows(engine, q) == [(9,)]
+
+# The matched rowids are dropped once read, and a session table of the same name is left alone
+def test_prefix_matches_do_not_stay_in_session(engine):
+    engine.execute("CREATE TABLE _prefix_matches AS SELECT 1 AS row_id")
+    handle = engine.search_prefixes("prescriptions", "drug", ["halo"], ["subject_id"])
+    assert engine.query("SELECT subject_id FROM prescriptions WHERE drug LIKE 'olan%'")["subject_id"].tolist() == [1, 2, 4]
+    assert handle.num_rows == 1
+    assert engine.session_tables() == ["_prefix_matches"]
+    assert plain_rows(engine, "SELECT row_id FROM _prefix_matches") == [(1,)]
+
+# A statement failing once rewritten (here: planning it) still drops the matches loaded for it
+def test_prefix_matches_are_dropped_when_statement_fails(engine):
+    q = "CREATE TABLE temp_olan AS SELECT subject_id, no_such_column FROM prescriptions WHERE drug LIKE 'olan%'"
+    with pytest.raises(sqlite3.OperationalError):
+        engine.execute(q)
+    with pytest.raises(sqlite3.OperationalError):
+        engine.result(q.split(" AS ", 1)[1])
+    assert engine.session_tables() == []
+
+# --- Concurrent Calls ---
+
+def test_searches_on_other_threads_keep_this_threads_stats(engine):
+    engine.query("SELECT subject_id FROM patients")
+    stats = engine.last_stats
+    searches = [
+        threading.Thread(target=lambda: engine.search_prefixes("prescriptions", "drug", ["olan"]).num_rows)
+        for _ in range(4)
+    ]
+    for search in searches:
+        search.start()
+    for search in searches:
+        search.join()
+    assert engine.last_stats is stats
+    assert stats["rows_out"] == 6
+
+# --- Recognizing Prefix Filters ---
+
+# Clause words and ORs inside literals and comments are text, not part of the filter
+def test_prefix_filter_ignores_literals_and_comments():
+    assert prefix_filter("SELECT subject_id FROM prescriptions WHERE drug LIKE 'olan%' OR drug LIKE 'halo%'") == (
+        "prescriptions", "drug", ["olan", "halo"], 43
+    )
+    assert prefix_filter("SELECT 'FROM prescriptions WHERE drug LIKE ''olan%''' FROM patients") is None
+    assert prefix_filter("SELECT subject_id FROM patients WHERE gender = 'F' -- FROM prescriptions WHERE drug LIKE 'olan%'") is None
+    assert prefix_filter("SELECT subject_id FROM prescriptions WHERE drug LIKE 'olan%' -- OR drug LIKE 'halo%'") is None
+
+def test_commented_prefix_term_is_not_searched(engine):
+    q = "SELECT subject_id FROM prescriptions WHERE drug LIKE 'olan%' /* OR drug LIKE 'halo%' */"
+    assert "_prefix_matches" not in engine_sql(engine, q)
+    assert engine_rows(engine, q) == plain_rows(engine, q) == [(1,), (2,), (4,)]
+
+# Each statement reads matches of its own, so preparing a second search leaves the first one's intact
+def test_each_statement_has_its_own_prefix_matches(engine):
+    with engine.lock:
+        olan = engine.prepare(sqlite_dialect("SELECT subject_id FROM prescriptions WHERE drug LIKE 'olan%'"))
+        halo = engine.prepare(sqlite_dialect("SELECT subject_id FROM prescriptions WHERE drug LIKE 'halo%'"))
+        assert plain_rows(engine, olan) == [(1,), (2,), (4,)]
+        assert plain_rows(engine, halo) == [(2,)]
+        engine.drop_prefix_matches()
+    assert engine.session_tables() == []
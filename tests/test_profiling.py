@@ -0,0 +1,43 @@
+import json
+from mimic_sql.profiling import profile_json, profile_table
+from mimic_sql.steps import run_step
+
+STEP = """CREATE TABLE temp_one AS SELECT subject_id, hadm_id FROM admissions;
+DELETE FROM temp_one WHERE subject_id = 1;
+SELECT * FROM temp_one WHERE hadm_id > 20"""
+
+# rows_in comes from the counts recorded as tables are built and changed, without counting them again
+def test_rows_in_is_recorded_without_counting_inputs(engine):
+    traced = []
+    engine.conn.set_trace_callback(traced.append)
+    _, _, statements = run_step(STEP, engine)
+    engine.conn.set_trace_callback(None)
+    assert [entry["rows_in"] for entry in statements] == [6, 6, 4]
+    assert [entry["rows_out"] for entry in statements] == [6, 2, 3]
+    # Only CREATE counts its output, for rows_out
+    assert sum('COUNT(*) FROM "temp_one"' in q for q in traced) == 1
+
+# Each statement's entry says what ran and what it cost; times add up to the step's summary
+def test_profile_entries_describe_each_statement(engine):
+    messages, _, statements = run_step(STEP, engine)
+    assert [entry["kind"] for entry in statements] == ["CREATE", "DELETE", "SELECT"]
+    assert statements[1]["statement"] == "DELETE FROM temp_one WHERE subject_id = 1"
+    for entry in statements:
+        assert 0 <= entry["engine_seconds"] <= entry["wall_seconds"]
+        assert entry["from_cache"] is False and entry["query_plan"] == []
+    assert statements[0]["engine_bytes_delta"] > 0
+    assert messages[-1] == f"⏱️ Step took {sum(entry['wall_seconds'] for entry in statements):.2f} s: " \
+        f"{sum(entry['engine_seconds'] for entry in statements):.2f} s in the SQL engine, " \
+        f"{sum(entry['convert_seconds'] for entry in statements):.2f} s building results."
+    assert profile_table(statements)["rows_out"].tolist() == [6, 2, 3]
+    run = json.loads(profile_json({4: statements}, {4: "Step 4"}))
+    assert run["steps"][0]["label"] == "Step 4" and len(run["steps"][0]["statements"]) == 3
+
+# Query plans are only worked out and shown when asked for
+def test_query_plans_are_opt_in(engine, monkeypatch):
+    messages, _, _ = run_step(STEP, engine)
+    assert not any(message.startswith("🧭") for message in messages)
+    monkeypatch.setenv("MIMIC_SQL_QUERY_PLANS", "1")
+    messages, _, statements = run_step(STEP, engine)
+    assert statements[2]["query_plan"] == ["SCAN temp_one"]
+    assert sum(message.startswith("🧭 Query plan") for message in messages) == 3
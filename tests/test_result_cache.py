@@ -0,0 +1,44 @@
+from conftest import DIAGNOSES, plain_rows
+from mimic_sql.engine import SQLEngine
+from mimic_sql.result_cache import ResultCache
+
+BUILD_COHORT = "CREATE TABLE temp_two AS SELECT subject_id, icd_code FROM temp_one WHERE icd_code LIKE 'F%'"
+
+# --- LRU Budget ---
+
+def test_least_recently_used_entry_is_evicted_over_budget():
+    cache = ResultCache(max_bytes=100)
+    cache.put("a", "rows a", 40)
+    cache.put("b", "rows b", 40)
+    assert cache.get("a") == "rows a"
+    cache.put("c", "rows c", 40)
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.current_bytes == 80 and cache.evictions == 1
+    assert cache.get("b") is None
+
+def test_entry_larger_than_budget_is_not_kept():
+    cache = ResultCache(max_bytes=100)
+    cache.put("a", "rows a", 40)
+    cache.put("big", "rows", 101)
+    assert list(cache.entries) == ["a"] and cache.current_bytes == 40
+
+# --- Cache Keys ---
+
+# Sessions holding the same inputs share results; changing an input changes the key and misses
+def test_delete_on_input_table_changes_key_and_misses(engine, store):
+    cache = ResultCache(max_bytes=1 << 20)
+    other = SQLEngine(base=store)
+    for session in (engine, other):
+        session.register("temp_one", DIAGNOSES[["subject_id", "icd_code"]])
+    key = engine.statement_key(BUILD_COHORT)
+    engine.execute(BUILD_COHORT, cache)
+    assert not engine.last_from_cache
+    other.execute(BUILD_COHORT, cache)
+    assert other.last_from_cache
+    assert plain_rows(other, "SELECT * FROM temp_two") == plain_rows(engine, "SELECT * FROM temp_two")
+    engine.execute("DELETE FROM temp_one WHERE subject_id = 6")
+    engine.execute("DROP TABLE temp_two")
+    assert engine.statement_key(BUILD_COHORT) != key
+    engine.execute(BUILD_COHORT, cache)
+    assert not engine.last_from_cache
+    assert plain_rows(engine, "SELECT subject_id, icd_code FROM temp_two") == [(1, "F20"), (2, "F20")]
@@ -0,0 +1,69 @@
+import gc
+import pandas as pd
+from conftest import plain_rows
+from mimic_sql.engine import RESULTS_SCHEMA
+from mimic_sql.results import page_count, result_schema
+from mimic_sql.steps import run_step
+
+# --- Paged Result Views ---
+
+def test_page_count_keeps_one_page_for_empty_results():
+    assert [page_count(n, 25) for n in (0, 1, 25, 26, 100)] == [1, 1, 1, 2, 4]
+
+# Pages read in turn give the whole result, in order, numbered from 1 as st.dataframe shows them
+def test_pages_cover_the_result_in_order(engine):
+    engine.register("temp_rows", pd.DataFrame({"n": range(1, 251), "parity": [n % 2 for n in range(1, 251)]}))
+    handle = engine.result("SELECT n, parity FROM temp_rows")
+    pages = [handle.page(k, 100) for k in range(page_count(handle.num_rows, 100))]
+    assert [len(page) for page in pages] == [100, 100, 50]
+    assert pd.concat(pages)["n"].tolist() == list(range(1, 251))
+    assert pages[2].index[0] == 201
+    assert handle.page(5, 100).empty
+
+# Sorting is stable and puts missing values last in either direction
+def test_sorted_pages_keep_ties_in_order_and_nulls_last(engine):
+    handle = engine.result("SELECT subject_id, gender FROM patients")
+    assert handle.page(0, 10, sort_by="gender")["subject_id"].tolist() == [1, 3, 6, 2, 4, 5]
+    assert handle.page(0, 10, sort_by="gender", descending=True)["subject_id"].tolist() == [2, 4, 1, 3, 6, 5]
+    assert handle.page(1, 4, sort_by="gender")["subject_id"].tolist() == [4, 5]
+
+def test_result_schema_lists_columns_and_types(engine):
+    handle = engine.result("SELECT subject_id, gender FROM patients")
+    schema = result_schema(handle.first_page)
+    assert schema["Column"].tolist() == ["subject_id", "gender"] and schema["Type"][0] == "int64"
+
+# --- Result Handles ---
+
+# Tables holding step results, apart from the session's own tables
+def result_tables(engine):
+    return plain_rows(engine, f"SELECT name FROM {RESULTS_SCHEMA}.sqlite_master WHERE type = 'table'")
+
+# A SELECT picking columns of a session table reads that table; any other SELECT is kept in the engine
+def test_select_of_session_table_columns_is_not_copied(engine):
+    run_step("CREATE TABLE temp_one AS SELECT subject_id, hadm_id FROM admissions", engine)
+    handle = engine.result("SELECT hadm_id FROM temp_one")
+    assert (handle.schema, handle.table, handle.num_rows) == (None, "temp_one", 6)
+    assert result_tables(engine) == []
+    handle = engine.result("SELECT subject_id, COUNT(*) AS n FROM temp_one GROUP BY subject_id")
+    assert handle.schema == RESULTS_SCHEMA and result_tables(engine) == [(handle.table,)]
+    assert handle.to_frame().values.tolist() == [[1, 2], [2, 1], [3, 1], [4, 1], [6, 1]]
+
+# A handle keeps showing what its SELECT returned after the table it reads is changed or dropped
+def test_handle_keeps_its_rows_when_the_table_changes(engine):
+    _, shown, _ = run_step("CREATE TABLE temp_one AS SELECT subject_id, hadm_id FROM admissions; SELECT * FROM temp_one", engine)
+    assert shown.schema is None
+    run_step("DELETE FROM temp_one WHERE subject_id = 1", engine)
+    assert shown.schema == RESULTS_SCHEMA and shown.num_rows == 6
+    assert shown.page(0, 10)["hadm_id"].tolist() == [10, 11, 20, 30, 40, 60]
+    run_step("DROP TABLE IF EXISTS temp_one", engine)
+    assert shown.to_frame()["hadm_id"].tolist() == [10, 11, 20, 30, 40, 60]
+
+# Result tables go once no handle reads them
+def test_unread_results_are_dropped(engine):
+    handle = engine.result("SELECT subject_id FROM admissions WHERE hadm_id > 15")
+    kept = engine.result("SELECT subject_id FROM admissions WHERE hadm_id < 15")
+    assert len(result_tables(engine)) == 2
+    del handle
+    gc.collect()
+    engine.result("SELECT COUNT(*) FROM admissions")
+    assert (kept.table,) in result_tables(engine) and len(result_tables(engine)) == 2
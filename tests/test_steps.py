@@ -0,0 +1,27 @@
+from conftest import plain_rows, session_rows
+from mimic_sql.steps import run_step
+
+# --- Persistent Session Engine ---
+
+# Every table the disease steps build through Step 21 holds the same rows as running the statements
+# on whole copies of the bundled tables, as the original pages did for each statement
+def test_disease_steps_match_whole_table_copies(disease_run, disease_reference):
+    built = session_rows(disease_run)
+    expected = {name: rows for name, rows in session_rows(disease_reference).items() if name.startswith("temp_")}
+    assert len(expected) > 20
+    for name, rows in expected.items():
+        assert built[name] == rows, name
+
+# A table built by one step is read by the next from the same engine; the base tables are not copied in
+def test_step_tables_stay_in_the_engine_between_steps(engine):
+    messages, _, _ = run_step("CREATE TEMP TABLE temp_one AS SELECT subject_id, hadm_id FROM admissions WHERE hadm_id < 30", engine)
+    assert messages[0] == "✅ CREATE complete: Table temp_one created."
+    messages, result, _ = run_step("DELETE FROM temp_one WHERE hadm_id = 11; SELECT subject_id FROM temp_one", engine)
+    assert result.num_rows == 2
+    assert plain_rows(engine, "SELECT hadm_id FROM temp_one") == [(10,), (20,)]
+    assert engine.session_tables() == ["temp_one"]
+
+def test_dropping_a_base_table_is_refused(engine):
+    messages, _, _ = run_step("DROP TABLE IF EXISTS patients", engine)
+    assert messages[0] == "Warning: `patients` is a shared read-only base table and cannot be dropped."
+    assert plain_rows(engine, "SELECT COUNT(*) FROM patients") == [(6,)]
@@ -0,0 +1,64 @@
+import shutil
+import pyarrow as pa
+import pytest
+from conftest import plain_rows
+from mimic_sql.batch import open_engine
+from mimic_sql.engine import SQLEngine
+from mimic_sql.examples import DRUG_DATA_DIR, EXAMPLE_PIPELINES, PRESCRIPTIONS_TABLE
+from mimic_sql.ingest import ingest_directory
+from mimic_sql.sql_parse import apply_alias_map
+from mimic_sql.steps import run_step
+from mimic_sql.streaming import stream_steps, streaming_problem
+
+# The bundled prescriptions as an Arrow file, the form streaming reads
+@pytest.fixture(scope="module")
+def drug_dir(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp("drugs_data")
+    shutil.copy(f"{DRUG_DATA_DIR}/mimiciv_hosp.prescriptions.pkl", data_dir)
+    ingest_directory(str(data_dir))
+    return str(data_dir)
+
+# Streaming the drug steps over 7,000-row chunks builds the same tables as loading prescriptions whole
+def test_streamed_drug_steps_match_normal_run(drug_dir):
+    engine, alias_map = open_engine("drug", drug_dir)
+    streamed = SQLEngine(base=engine.base)
+    try:
+        spec = EXAMPLE_PIPELINES["drug"]
+        step_sql = {i: apply_alias_map(spec["queries"][i], alias_map) for i in spec["steps"]}
+        for sql_query in step_sql.values():
+            run_step(sql_query, engine)
+        outputs = stream_steps(step_sql, PRESCRIPTIONS_TABLE, engine.base.arrow_sources[PRESCRIPTIONS_TABLE], streamed, 7_000)
+        assert "in 8 chunks" in outputs[1][0][0]
+        assert sorted(streamed.session_tables()) == sorted(engine.session_tables())
+        for name in engine.session_tables():
+            assert plain_rows(streamed, f"SELECT * FROM {name}") == plain_rows(engine, f"SELECT * FROM {name}")
+        assert engine.row_count(spec["output"]) > 0
+    finally:
+        streamed.close()
+        engine.close()
+
+# Chunks are run on their own, so statements combining rows of different chunks are refused
+def test_steps_combining_rows_are_not_streamed():
+    extract = "CREATE TEMP TABLE temp_one AS SELECT subject_id, drug FROM rx WHERE drug LIKE 'a%'"
+    assert streaming_problem({1: extract, 2: "DELETE FROM temp_one WHERE drug IS NULL"}, "rx") is None
+    grouped = {1: extract, 2: "CREATE TEMP TABLE temp_two AS SELECT subject_id, COUNT(*) AS n FROM temp_one GROUP BY subject_id"}
+    assert streaming_problem(grouped, "rx").startswith("step 2 combines rows")
+    joined = {1: extract, 2: "CREATE TEMP TABLE temp_two AS SELECT a.subject_id FROM temp_one a JOIN temp_one b ON b.drug = a.drug"}
+    assert streaming_problem(joined, "rx").startswith("step 2 combines rows")
+    assert streaming_problem({1: "CREATE TEMP TABLE temp_one AS SELECT subject_id FROM patients"}, "rx") == "step 1 reads patients, which is not streamed"
+
+# A statement failing on the chunks is reported once with the step, as a normal run reports it
+def test_chunk_warnings_are_reported_with_the_step():
+    source = pa.table({"subject_id": [1, 2, 3, 4, 5], "drug": ["asp", "bcd", "ace", "abc", None]})
+    step_sql = {
+        1: "CREATE TABLE temp_one AS SELECT subject_id, drug FROM rx WHERE drug LIKE 'a%'",
+        2: "UPDATE temp_one SET no_such_column = 1",
+    }
+    engine = SQLEngine()
+    try:
+        outputs = stream_steps(step_sql, "rx", source, engine, 2)
+        warnings = [message for message in outputs[2][0] if message.startswith("Warning")]
+        assert warnings == ["Warning: UPDATE failed in the SQL engine: no such column: no_such_column (in 3 of 3 chunks)"]
+        assert plain_rows(engine, "SELECT subject_id FROM temp_one") == [(1,), (3,), (4,)]
+    finally:
+        engine.close()
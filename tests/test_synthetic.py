@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+from conftest import example_steps
+from mimic_sql.batch import open_engine
+from mimic_sql.benchmark import read_table_file
+from mimic_sql.data_store import discover_tables
+from mimic_sql.examples import DISEASE_DATA_DIR, DRUG_DATA_DIR, EXAMPLE_PIPELINES
+from mimic_sql.steps import run_step
+from mimic_sql.synthetic import PATIENTS_PER_SCALE, generate
+
+# 1,500 patients, generated in two chunks
+SCALE = 1_500 / PATIENTS_PER_SCALE
+
+@pytest.fixture(scope="module")
+def synthetic_dir(tmp_path_factory):
+    out_dir = tmp_path_factory.mktemp("synthetic")
+    written = generate(str(out_dir), SCALE, seed=7, chunk_patients=1_000)
+    return out_dir, written
+
+# pandas dtype of each column; text is "text" whether pandas reads it as object or as its string dtype
+def column_dtypes(df):
+    return {col: "text" if pd.api.types.is_string_dtype(dtype) else str(dtype) for col, dtype in df.dtypes.items()}
+
+# --- Generated Tables ---
+
+# Every generated table has the columns and pandas dtypes of the shipped table it stands in for
+def test_generated_tables_match_shipped_schemas(synthetic_dir):
+    out_dir, _ = synthetic_dir
+    for shipped_dir, generated_dir in ((DISEASE_DATA_DIR, out_dir / "diseases_data"), (DRUG_DATA_DIR, out_dir / "drugs_data")):
+        shipped = discover_tables(shipped_dir)
+        generated = discover_tables(str(generated_dir))
+        assert sorted(generated) == sorted(shipped)
+        for name, path in generated.items():
+            assert column_dtypes(read_table_file(path)) == column_dtypes(read_table_file(shipped[name])), name
+
+# Visits and prescriptions belong to generated patients, and the same seed gives the same rows
+def test_generated_rows_are_consistent_and_repeatable(synthetic_dir, tmp_path):
+    out_dir, written = synthetic_dir
+    tables = {name: read_table_file(path) for name, path in discover_tables(str(out_dir / "diseases_data")).items()}
+    patients = tables["mimiciv_hosp.patients"]["subject_id"]
+    assert len(patients) == 1_500 and patients.is_unique and patients.is_monotonic_increasing
+    for name in ("mimiciv_hosp.admissions", "mimiciv_hosp.diagnoses_icd", "mimic_ed.edstays", "mimic_ed.diagnosis"):
+        assert tables[name]["subject_id"].isin(patients).all(), name
+    again = generate(str(tmp_path), SCALE, seed=7, chunk_patients=1_000)
+    assert list(again.values()) == list(written.values())
+    for name, path in discover_tables(str(tmp_path / "diseases_data")).items():
+        assert read_table_file(path).equals(tables[name]), name
+
+# Both example pipelines run on the generated data and find a cohort
+@pytest.mark.parametrize("pipeline,data_dir", [("disease", "diseases_data"), ("drug", "drugs_data")])
+def test_example_pipelines_run_on_generated_data(synthetic_dir, pipeline, data_dir):
+    engine, _ = open_engine(pipeline, str(synthetic_dir[0] / data_dir))
+    try:
+        for label, sql_query in example_steps(pipeline):
+            messages, _, _ = run_step(sql_query, engine)
+            assert not [message for message in messages if message.startswith("Warning")], label
+        assert engine.row_count(EXAMPLE_PIPELINES[pipeline]["output"]) > 0
+    finally:
+        engine.close()
@@ -0,0 +1,53 @@
+import threading
+import time
+from conftest import engine_rows, engine_sql, plain_rows
+from test_code_sets import CODE_SET_QUERY
+
+# Worker engines read the shared store through a connection of their own, with the same results
+def test_forked_worker_reads_shared_store(engine, store):
+    worker = engine.fork(["diagnoses_icd", "psychosis_icd_codes", "ischemic_stroke_icd_codes", "prescriptions"])
+    try:
+        assert worker.base is store and worker.conn is not engine.conn
+        assert plain_rows(worker, "SELECT file FROM pragma_database_list WHERE name = 'base'") == [("",)]
+        assert "icd_category_mask" in engine_sql(worker, CODE_SET_QUERY)
+        assert engine_rows(worker, CODE_SET_QUERY) == engine_rows(engine, CODE_SET_QUERY)
+        q = "SELECT subject_id, drug FROM prescriptions WHERE drug LIKE 'olan%'"
+        assert "_prefix_matches" in engine_sql(worker, q)
+        assert engine_rows(worker, q) == engine_rows(engine, q)
+    finally:
+        worker.close()
+
+# A store write waits for a statement another session is part way through, then goes ahead
+def test_store_write_waits_for_a_running_read(engine, store):
+    worker = engine.fork(["diagnoses_icd"])
+    read_started = threading.Event()
+    rows = []
+
+    def slow_read():
+        with worker.lock:
+            cursor = worker.conn.execute("SELECT subject_id FROM base.diagnoses_icd")
+            rows.append(cursor.fetchone())
+            read_started.set()
+            time.sleep(0.3)
+            rows.extend(cursor.fetchall())
+
+    try:
+        reader = threading.Thread(target=slow_read)
+        reader.start()
+        read_started.wait()
+        name = store.natural_join("diagnoses_icd", "admissions", ["icd_code"])
+        reader.join()
+        assert rows == [(1,), (1,), (2,), (3,), (4,), (6,), (6,)]
+        assert plain_rows(worker, f'SELECT COUNT(*) FROM base."{name}"') == [(7,)]
+    finally:
+        worker.close()
+
+def test_worker_engine_adopted_tables_match_session_run(engine):
+    q = "CREATE TABLE temp_one AS SELECT a.subject_id, d.icd_code FROM admissions a NATURAL JOIN diagnoses_icd d"
+    worker = engine.fork(["admissions", "diagnoses_icd"])
+    worker.execute(q)
+    engine.adopt(worker, ["temp_one"])
+    worker.close()
+    assert engine.read_table("temp_one").sort_values(["subject_id", "icd_code"]).values.tolist() == [
+        [1, "F20"], [1, "I63"], [2, "F20"], [3, "E11"], [4, "I61"], [6, "F25"], [6, "Z00"]
+    ]